@@ -1,7 +1,8 @@
+import os
 from flask import Flask
 from flask_login import current_user
 from config import Config
-from flask_socketio import join_room
+from flask_socketio import join_room, leave_room
 
 # Import extensions from the new extensions.py file
 from extensions import db, socketio, login_manager, migrate
@@ -19,10 +20,25 @@ def create_app(config_class=Config):
     app.config.from_object(config_class)
 
     # Initialize Flask extensions here
+    from services.realtime import socketio_options
     db.init_app(app)
-    socketio.init_app(app)
+    socketio.init_app(app, **socketio_options(app.config))
     login_manager.init_app(app)
     migrate.init_app(app, db)
+
+    from services.response_cache import response_cache
+    response_cache.init_app(app)
+
+    from services.images import image_pipeline, variant_url
+    image_pipeline.init_app(app)
+    # {{ image.image_url|image_variant('card') }} serves a resized copy once the pipeline has made it
+    app.jinja_env.filters['image_variant'] = variant_url
+
+    from services.moderation import contact_scanner
+    contact_scanner.init_app(app)
+
+    from services.jobs import job_queue
+    job_queue.init_app(app)
     
     # Register blueprints here
     from routes import auth, main, auctions, admin, seller, request, dealer, rentals, tradein
@@ -61,28 +77,47 @@ def create_app(config_class=Config):
         if conversation_id:
             join_room(f'conversation_{conversation_id}')
 
+    @socketio.on('join_auction')
+    def handle_join_auction(data):
+        """Subscribe a client to live price updates for one or more auctions."""
+        from services.bidding import auction_room
+        auction_ids = data.get('auction_ids') or [data.get('auction_id')]
+        for auction_id in auction_ids:
+            if auction_id:
+                join_room(auction_room(auction_id))
+
+    @socketio.on('leave_auction')
+    def handle_leave_auction(data):
+        """Stop sending live price updates for an auction to this client."""
+        from services.bidding import auction_room
+        if auction_id := data.get('auction_id'):
+            leave_room(auction_room(auction_id))
+
+    # Register the flush listeners that keep denormalized counters, the search indexes, similar listings and upload references in step
+    import services.unread_counters
+    import services.request_feed
+    import services.search
+    import services.autocomplete
+    import services.similar_cars
+    import services.file_storage
+
     # Make 'now' available to all templates
     @app.context_processor
     def inject_now():
         from datetime import datetime
-        from models.notification import Notification
-        from models.conversation import Conversation
-        from models.chat_message import ChatMessage
-        from sqlalchemy import or_
         from flask_login import current_user
         unread_notifications = 0
         unread_messages_count = 0
         if current_user.is_authenticated:
-            unread_notifications = Notification.query.filter_by(user_id=current_user.id, is_read=False).count()
-            # Count unread messages where the current user is a participant but not the sender
-            unread_messages_count = db.session.query(ChatMessage.id).join(Conversation).filter(
-                or_(Conversation.buyer_id == current_user.id, Conversation.dealer_id == current_user.id),
-                ChatMessage.sender_id != current_user.id,
-                ChatMessage.is_read == False
-            ).count()
+            # Read from the already-loaded user, so rendering a page costs no extra queries
+            unread_notifications = current_user.unread_notification_count
+            unread_messages_count = current_user.unread_message_count
 
         return {'now': datetime.utcnow(), 'unread_notifications': unread_notifications, 'unread_messages_count': unread_messages_count}
 
+    from commands import register_commands
+    register_commands(app)
+
     # CLI command to create an admin user
     @app.cli.command("create-admin")
     def create_admin():
@@ -101,4 +136,8 @@ def create_app(config_class=Config):
 
 if __name__ == '__main__':
     app = create_app()
-    socketio.run(app, host='0.0.0.0', port=5000, debug=True)
+    # HOST/PORT let `flask run-workers` start one server per port; see README for running several behind a load balancer
+    socketio.run(
+        app, host=os.environ.get('HOST', '0.0.0.0'), port=int(os.environ.get('PORT', 5000)),
+        debug=app.config['FLASK_DEBUG'], allow_unsafe_werkzeug=True
+    )
@@ -0,0 +1,547 @@
+import os
+import click
+from flask import current_app, url_for
+from flask.cli import with_appcontext
+from sqlalchemy import case, event, func, select, update
+from extensions import db
+
+
+@click.command('repair-auction-stats')
+@with_appcontext
+def repair_auction_stats():
+    """Backfills/repairs the denormalized bid stats on every auction from the bid table."""
+    from models.auction import Auction
+    from models.bid import Bid
+
+    # Rank each auction's bids so the top one (highest amount, earliest on ties) is rank 1.
+    ranked_bids = select(
+        Bid.id, Bid.auction_id, Bid.user_id, Bid.amount,
+        func.count(Bid.id).over(partition_by=Bid.auction_id).label('bid_count'),
+        func.row_number().over(partition_by=Bid.auction_id, order_by=(Bid.amount.desc(), Bid.id.asc())).label('rank')
+    ).subquery()
+    top_bids = {
+        row.auction_id: row for row in db.session.execute(select(ranked_bids).where(ranked_bids.c.rank == 1))
+    }
+
+    repaired = 0
+    for auction in db.session.execute(select(Auction.id, Auction.current_price, Auction.bid_count, Auction.highest_bid_id, Auction.highest_bidder_id)):
+        top = top_bids.get(auction.id)
+        expected = {
+            'bid_count': top.bid_count if top else 0,
+            'highest_bid_id': top.id if top else None,
+            'highest_bidder_id': top.user_id if top else None,
+        }
+        if top:
+            expected['current_price'] = top.amount
+        if any(getattr(auction, column) != value for column, value in expected.items()):
+            db.session.execute(update(Auction).where(Auction.id == auction.id).values(**expected))
+            repaired += 1
+
+    db.session.commit()
+    click.echo(f"Repaired bid stats on {repaired} auction(s).")
+
+
+@click.command('repair-unread-counters')
+@with_appcontext
+def repair_unread_counters():
+    """Backfills/repairs every user's unread notification and message counters."""
+    from models.chat_message import ChatMessage
+    from models.conversation import Conversation
+    from models.notification import Notification
+    from models.user import User
+
+    notification_counts = dict(db.session.execute(
+        select(Notification.user_id, func.count(Notification.id))
+        .where(Notification.is_read == False)
+        .group_by(Notification.user_id)
+    ).all())
+    # An unread message counts against whichever participant did not send it.
+    recipient_id = case((ChatMessage.sender_id == Conversation.buyer_id, Conversation.dealer_id), else_=Conversation.buyer_id)
+    message_counts = dict(db.session.execute(
+        select(recipient_id, func.count(ChatMessage.id))
+        .join(Conversation, ChatMessage.conversation_id == Conversation.id)
+        .where(ChatMessage.is_read == False)
+        .group_by(recipient_id)
+    ).all())
+
+    repaired = 0
+    for user in db.session.execute(select(User.id, User.unread_notification_count, User.unread_message_count)):
+        expected = {
+            'unread_notification_count': notification_counts.get(user.id, 0),
+            'unread_message_count': message_counts.get(user.id, 0),
+        }
+        if any(getattr(user, column) != value for column, value in expected.items()):
+            db.session.execute(update(User).where(User.id == user.id).values(**expected))
+            repaired += 1
+
+    db.session.commit()
+    click.echo(f"Repaired unread counters on {repaired} user(s).")
+
+
+@click.command('repair-request-stats')
+@with_appcontext
+def repair_request_stats():
+    """Backfills/repairs the denormalized offer stats on every car request from the dealer bid table."""
+    from services.request_feed import refresh_request_stats
+
+    repaired = refresh_request_stats(db.session)
+    db.session.commit()
+    click.echo(f"Recomputed offer stats on {repaired} request(s).")
+
+
+@click.command('rebuild-search-index')
+@with_appcontext
+def rebuild_search_index_command():
+    """Creates the full-text search structures if needed and reindexes every car."""
+    from services.search import rebuild_search_index
+
+    indexed = rebuild_search_index(db.session)
+    db.session.commit()
+    click.echo(f"Indexed {indexed} car(s) for search.")
+
+
+@click.command('rebuild-similar-cars')
+@with_appcontext
+def rebuild_similar_cars_command():
+    """Recomputes the precomputed similar listings of every car."""
+    from services.similar_cars import rebuild_similar_cars
+
+    processed = rebuild_similar_cars(db.session)
+    db.session.commit()
+    click.echo(f"Computed similar listings for {processed} car(s).")
+
+
+# Statements each listing JSON endpoint may run, whatever the number of rows it returns.
+LISTING_QUERY_BUDGETS = {
+    'main.search_suggestions': 1,
+    'main.api_listings': 1,
+    'auctions.filter_auctions_api': 1,
+    'auctions.all_listings_api': 1,
+    'rentals.api_filter_rentals': 1,
+}
+
+
+def _add_listing_fixtures(owner_id, per_type):
+    """Adds per_type approved sale, auction and rental listings, each with an image and an owner, to check queries against."""
+    from datetime import datetime, timedelta
+    from models.auction import Auction
+    from models.car import Car
+    from models.car_image import CarImage
+    from models.rental_listing import RentalListing
+
+    makes = [('Toyota', 'Vitz'), ('Hyundai', 'Tucson'), ('Suzuki', 'Dzire')]
+    for index in range(per_type):
+        make, model = makes[index % len(makes)]
+        for listing_type in ('sale', 'auction', 'rental'):
+            car = Car(
+                make=make, model=model, year=2010 + index % 14, mileage=10000 * index, owner_id=owner_id,
+                listing_type=listing_type, fixed_price=500000 + index if listing_type == 'sale' else None,
+                is_approved=True, is_active=True, body_type='SUV'
+            )
+            car.images.append(CarImage(image_url=f'/static/uploads/check-{listing_type}-{index}.jpg'))
+            if listing_type == 'auction':
+                car.auction = Auction(start_price=100000, current_price=100000, end_time=datetime.utcnow() + timedelta(days=1))
+            elif listing_type == 'rental':
+                car.rental_listing = RentalListing(price_per_day=1500)
+            db.session.add(car)
+    db.session.commit()
+
+
+@click.command('check-query-counts')
+@click.option('--small', default=2, show_default=True, help='Listings of each type in the small fixture.')
+@click.option('--large', default=40, show_default=True, help='Listings of each type in the large fixture.')
+@with_appcontext
+def check_query_counts(small, large):
+    """
+    Fails if a listing JSON endpoint's query count grows with the rows it
+    returns (an N+1) or exceeds its budget. Each endpoint is requested against
+    a small and then a large fixture in a throwaway database, with the
+    response cache off, and must run the same number of statements for both.
+    """
+    from models.user import User
+    from services.scratch_app import scratch_app
+
+    if not 0 < small < large:
+        raise click.BadParameter("--small must be positive and below --large.")
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    failing = []
+    with scratch_app() as app:
+        owner = User(username='query-check', email='query-check@example.invalid', is_dealer=True)
+        db.session.add(owner)
+        db.session.commit()
+        owner_id, client = owner.id, app.test_client()
+        counts, added = {}, 0
+        for per_type in (small, large):
+            _add_listing_fixtures(owner_id, per_type - added)
+            added = per_type
+            db.session.remove()
+            event.listen(db.engine, 'before_cursor_execute', count_statement)
+            try:
+                for endpoint in LISTING_QUERY_BUDGETS:
+                    with app.test_request_context():
+                        path = url_for(endpoint)
+                    statements.clear()
+                    response = client.get(path)
+                    body = response.get_json(silent=True) or []
+                    rows = len(body['listings'] if isinstance(body, dict) else body)
+                    counts.setdefault(endpoint, []).append((len(statements), rows, response.status_code))
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', count_statement)
+
+    for endpoint, budget in LISTING_QUERY_BUDGETS.items():
+        (small_queries, small_rows, small_status), (large_queries, large_rows, large_status) = counts[endpoint]
+        click.echo(
+            f"{endpoint}: {small_queries} quer{'y' if small_queries == 1 else 'ies'} for {small_rows} row(s), "
+            f"{large_queries} for {large_rows} row(s) (budget {budget})"
+        )
+        if {small_status, large_status} != {200}:
+            failing.append(f"{endpoint} returned HTTP {small_status}/{large_status}")
+        elif not 0 < small_rows < large_rows:
+            failing.append(f"{endpoint} returned {small_rows} then {large_rows} row(s), so its query count wasn't tested against result size")
+        elif small_queries != large_queries:
+            failing.append(f"{endpoint} ran {small_queries} then {large_queries} queries as its results grew")
+        elif large_queries > budget:
+            failing.append(f"{endpoint} ran {large_queries} queries, over its budget of {budget}")
+
+    if failing:
+        raise click.ClickException("; ".join(failing))
+
+
+@click.command('check-query-plans')
+@with_appcontext
+def check_query_plans():
+    """Runs EXPLAIN over the app's canonical queries and fails if any of them scans a whole table."""
+    from services.query_plans import canonical_queries, full_scans
+
+    connection = db.session.connection()
+    scanning = []
+    for name, statement in canonical_queries():
+        try:
+            tables = full_scans(connection, statement)
+        except NotImplementedError as e:
+            raise click.ClickException(f"{e} Run this check against SQLite or PostgreSQL.")
+        click.echo(f"{name}: {'full scan of ' + ', '.join(tables) if tables else 'indexed'}")
+        if tables:
+            scanning.append(name)
+
+    if scanning:
+        raise click.ClickException(f"Full table scans: {', '.join(scanning)}")
+
+
+def _bid_concurrency_problems(app, threads, bids_per_thread):
+    """Runs the check-bid-concurrency bidders in app's database and returns the lost updates found."""
+    import secrets
+    import threading
+    from datetime import datetime, timedelta
+    from models.auction import Auction
+    from models.bid import Bid
+    from models.car import Car
+    from models.user import User
+    from services.bidding import bid_increment, place_bid
+
+    token = secrets.token_hex(4)
+    users = [User(username=f'bid-check-{token}-{index}', email=f'bid-check-{token}-{index}@example.invalid') for index in range(threads + 1)]
+    db.session.add_all(users)
+    db.session.flush()
+    start_price = 100000
+    car = Car(make='Bid check', model=token, year=2000, owner_id=users[-1].id, is_approved=False, is_active=False)
+    car.auction = Auction(start_price=start_price, current_price=start_price, end_time=datetime.utcnow() + timedelta(hours=1))
+    db.session.add(car)
+    db.session.commit()
+    auction_id, start_version = car.auction.id, car.auction.version
+    user_ids = [user.id for user in users]
+    increment = bid_increment()
+
+    accepted, observed_prices, errors = [], [], []
+    lock = threading.Lock()
+    ready = threading.Barrier(threads + 1)
+    finished = threading.Event()
+
+    def bidder(index):
+        with app.app_context():
+            ready.wait()
+            for round_number in range(bids_per_thread):
+                amount = start_price + increment * (round_number * threads + index + 1)
+                try:
+                    outcome = place_bid(auction_id, user_ids[index], amount)
+                except Exception as e:
+                    db.session.rollback()
+                    with lock:
+                        errors.append(repr(e))
+                    continue
+                if outcome.accepted:
+                    with lock:
+                        accepted.append(amount)
+
+    def observer():
+        with app.app_context():
+            ready.wait()
+            while not finished.is_set():
+                observed_prices.append(db.session.scalar(select(Auction.current_price).where(Auction.id == auction_id)))
+                db.session.rollback()
+
+    workers = [threading.Thread(target=bidder, args=(index,)) for index in range(threads)]
+    watcher = threading.Thread(target=observer)
+    for thread in (*workers, watcher):
+        thread.start()
+    for thread in workers:
+        thread.join()
+    finished.set()
+    watcher.join()
+
+    problems = [f"place_bid raised {error}" for error in sorted(set(errors))]
+    db.session.expire_all()
+    auction = db.session.get(Auction, auction_id)
+    bids = db.session.execute(
+        select(Bid.id, Bid.amount, Bid.user_id).where(Bid.auction_id == auction_id).order_by(Bid.id)
+    ).all()
+    if auction.bid_count != len(bids):
+        problems.append(f"bid_count is {auction.bid_count} but there are {len(bids)} bid rows")
+    if any(later.amount < earlier.amount for earlier, later in zip(bids, bids[1:])):
+        problems.append("a later bid row is lower than an earlier one")
+    if any(later < earlier for earlier, later in zip(observed_prices, observed_prices[1:])):
+        problems.append("current_price fell while bids were being placed")
+    top = bids[-1] if bids else None
+    if top and (auction.highest_bid_id, auction.highest_bidder_id, auction.current_price) != (top.id, top.user_id, top.amount):
+        problems.append(f"highest bid is #{auction.highest_bid_id} at {auction.current_price:,.2f} but the top bid row is #{top.id} at {top.amount:,.2f}")
+    if auction.version != start_version + len(accepted):
+        problems.append(f"version is {auction.version} after {len(accepted)} accepted bid(s) (started at {start_version})")
+    click.echo(
+        f"{len(accepted)} of {threads * bids_per_thread} bid(s) accepted from {threads} concurrent bidders; "
+        f"{len(bids)} bid row(s), final price {auction.current_price:,.2f} ETB, {len(observed_prices)} price reading(s)."
+    )
+    return problems
+
+
+@click.command('check-bid-concurrency')
+@click.option('--threads', default=8, show_default=True, help='Bidders bidding at the same time.')
+@click.option('--bids', 'bids_per_thread', default=25, show_default=True, help='Bids each bidder places.')
+@with_appcontext
+def check_bid_concurrency(threads, bids_per_thread):
+    """
+    Has several bidders bid on one auction at once and fails on any lost
+    update: bid_count must equal the bid rows, the price must only rise,
+    highest_bid_id must be the top bid and version must count the accepted
+    bids. Runs against a throwaway SQLite database, never the configured one.
+    """
+    from services.scratch_app import scratch_app
+
+    with scratch_app() as app:
+        problems = _bid_concurrency_problems(app, threads, bids_per_thread)
+    if problems:
+        raise click.ClickException("Lost updates under concurrent bidding: " + "; ".join(problems))
+
+
+@click.command('benchmark-contact-masking')
+@click.option('--messages', 'size', default=5000, show_default=True, help='Messages in the generated chat corpus.')
+@click.option('--rounds', default=3, show_default=True, help='Timed passes over the corpus; the best is reported.')
+@click.option('--min-rate', type=float, help='Fail if the scanner masks fewer messages per second than this.')
+@click.option('--max-false-positives', type=int, help='Fail if the scanner flags more clean messages than this.')
+@with_appcontext
+def benchmark_contact_masking(size, rounds, min_rate, max_false_positives):
+    """Measures chat contact-info masking in messages/second, and its false positives and misses, against a corpus of realistic chat text."""
+    from services.moderation import mask_contact_info
+    from services.moderation_benchmark import chat_corpus, detection_errors, messages_per_second, per_call_mask
+
+    samples = chat_corpus(size)
+    messages = [sample.text for sample in samples]
+    clean = sum(1 for sample in samples if not sample.has_contact)
+    results = {}
+    for name, mask in [('contact scanner', mask_contact_info), ('per-call regex (previous)', per_call_mask)]:
+        rate = messages_per_second(mask, messages, rounds)
+        errors = detection_errors(mask, samples)
+        results[name] = rate, errors
+        click.echo(
+            f"{name}: {rate:,.0f} messages/s, {len(errors.false_positives)} of {clean} clean messages flagged, "
+            f"{len(errors.missed)} of {size - clean} with contact info missed"
+        )
+    rate, errors = results['contact scanner']
+    for message in sorted(set(errors.false_positives))[:5]:
+        click.echo(f"  flagged: {message}")
+    if min_rate is not None and rate < min_rate:
+        raise click.ClickException(f"Contact masking ran at {rate:,.0f} messages/s, below {min_rate:,.0f}.")
+    if max_false_positives is not None and len(errors.false_positives) > max_false_positives:
+        raise click.ClickException(f"Contact masking flagged {len(errors.false_positives)} clean messages, more than {max_false_positives}.")
+
+
+@click.command('generate-image-variants')
+@click.option('--force', is_flag=True, help='Regenerate variants that already exist.')
+@with_appcontext
+def generate_image_variants(force):
+    """Generates the resized variants of every uploaded image that lacks them (and strips their EXIF)."""
+    from services.images import IMAGE_EXTENSIONS, VARIANTS_FOLDER, has_variants, image_pipeline
+
+    processed = failed = 0
+    for folder, subfolders, filenames in os.walk(os.path.join(current_app.static_folder, 'uploads')):
+        if VARIANTS_FOLDER in subfolders:
+            subfolders.remove(VARIANTS_FOLDER)
+        for filename in filenames:
+            path = os.path.join(folder, filename)
+            if not filename.lower().endswith(IMAGE_EXTENSIONS) or (has_variants(path) and not force):
+                continue
+            if image_pipeline.process(path):
+                processed += 1
+            else:
+                failed += 1
+    click.echo(f"Generated variants for {processed} image(s); {failed} could not be read.")
+
+
+@click.command('gc-uploads')
+@with_appcontext
+def gc_uploads():
+    """Expires abandoned trade-in uploads, recounts upload references and deletes the stored files nothing references any more."""
+    from services.file_storage import collect_garbage
+    from services.trade_in_uploads import expire_uploads
+
+    click.echo(f"Expired {expire_uploads()} unclaimed trade-in upload(s).")
+    rows_deleted, files_removed = collect_garbage(db.session)
+    click.echo(f"Deleted {rows_deleted} unreferenced upload record(s) and {files_removed} orphaned file(s).")
+
+
+@click.command('close-auctions')
+@click.option('--once', is_flag=True, help='Close the auctions that are already due and exit (for cron).')
+@with_appcontext
+def close_auctions_command(once):
+    """Runs the scheduler that closes auctions at their end_time and settles the winner."""
+    from services.auction_closing import AuctionCloseScheduler
+    from services.realtime import use_emit_only_client
+
+    use_emit_only_client(current_app)
+    if not current_app.config.get('RESPONSE_CACHE_URL'):
+        click.echo("Warning: RESPONSE_CACHE_URL is not set, so closing auctions here can't clear the web servers' response caches; they keep listing closed auctions until their cached pages expire.")
+    scheduler = AuctionCloseScheduler()
+    # url_for() needs a request context to build notification links outside of a request.
+    with current_app.test_request_context():
+        if once:
+            click.echo(f"Closed {scheduler.run_once()} auction(s).")
+            return
+        click.echo("Auction closing scheduler started. Press Ctrl+C to stop.")
+        scheduler.run_forever(on_closed=lambda count: click.echo(f"Closed {count} auction(s)."))
+
+
+@click.command('run-jobs')
+@with_appcontext
+def run_jobs():
+    """Runs queued background jobs (chat notifications, lead scoring) from JOB_QUEUE_URL until interrupted."""
+    from services.jobs import job_queue
+    from services.realtime import use_emit_only_client
+
+    if not current_app.config.get('JOB_QUEUE_URL'):
+        raise click.ClickException("Set JOB_QUEUE_URL to a shared broker; without one, jobs run in the process that queues them.")
+    if not use_emit_only_client(current_app):
+        click.echo("Warning: SOCKETIO_MESSAGE_QUEUE is not set, so socket events from jobs run here reach no browser.")
+    click.echo("Background job worker started. Press Ctrl+C to stop.")
+    job_queue.work()
+
+
+@click.command('run-workers')
+@click.option('--workers', default=2, show_default=True, help='Number of server processes.')
+@click.option('--host', default='127.0.0.1', show_default=True)
+@click.option('--port', default=5001, show_default=True, help='Port of the first worker; the others take the ports after it.')
+@with_appcontext
+def run_workers(workers, host, port):
+    """
+    Runs several app servers on consecutive ports, relaying Socket.IO events
+    between them through SOCKETIO_MESSAGE_QUEUE and sharing the response
+    cache at RESPONSE_CACHE_URL. Put them behind a load balancer with sticky
+    sessions (see README).
+    """
+    import time
+    from services.realtime import start_worker
+
+    if workers > 1 and not current_app.config.get('SOCKETIO_MESSAGE_QUEUE'):
+        raise click.ClickException("Set SOCKETIO_MESSAGE_QUEUE so events emitted by one worker reach clients connected to the others.")
+    if workers > 1 and not current_app.config.get('RESPONSE_CACHE_URL'):
+        click.echo("Warning: RESPONSE_CACHE_URL is not set, so each worker keeps its own response cache and serves stale listings after another worker changes them.")
+    processes = [start_worker(current_app.root_path, host, port + index) for index in range(workers)]
+    click.echo(f"Started {workers} worker(s) on {host}:{port}-{port + workers - 1}. Press Ctrl+C to stop.")
+    try:
+        while all(process.poll() is None for process in processes):
+            time.sleep(1)
+        click.echo("A worker exited; stopping the others.")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+
+@click.command('check-socketio-fanout')
+@click.option('--workers', default=2, show_default=True, help='Number of server processes to start.')
+@click.option('--timeout', default=15.0, show_default=True, help='Seconds to wait for each step.')
+@with_appcontext
+def check_socketio_fanout(workers, timeout):
+    """
+    Starts several workers on free ports sharing the message queue (a
+    temporary file spool unless SOCKETIO_MESSAGE_QUEUE is set), connects a
+    client to each and checks that one event emitted from this process, as
+    background jobs emit, reaches all of them.
+    """
+    import secrets
+    import shutil
+    import tempfile
+    from extensions import socketio
+    from services.realtime import start_worker, use_emit_only_client
+    from services.realtime_check import SocketIOProbe, free_port, wait_until_serving
+
+    spool_folder = None
+    if not current_app.config.get('SOCKETIO_MESSAGE_QUEUE'):
+        spool_folder = tempfile.mkdtemp(prefix='socketio-spool-')
+        current_app.config['SOCKETIO_MESSAGE_QUEUE'] = f'file://{spool_folder}'
+    environ = {key: current_app.config[key] for key in ('SOCKETIO_MESSAGE_QUEUE', 'SOCKETIO_CHANNEL')}
+    ports = [free_port() for _ in range(workers)]
+    processes = [start_worker(current_app.root_path, '127.0.0.1', port, **environ) for port in ports]
+    probes, rooms = [], []
+    try:
+        for port in ports:
+            if not wait_until_serving('127.0.0.1', port, timeout):
+                raise click.ClickException(f"The worker on port {port} did not start.")
+            probe = SocketIOProbe('127.0.0.1', port, timeout)
+            probes.append(probe)
+            token = secrets.token_hex(8)
+            if not probe.call('join_conversation', {'conversation_id': token}):
+                raise click.ClickException(f"The worker on port {port} did not acknowledge joining a room.")
+            rooms.append(f'conversation_{token}')
+
+        use_emit_only_client(current_app)
+        for room in rooms:
+            socketio.emit('fanout_check', {'room': room}, to=room)
+        failed = [port for port, probe, room in zip(ports, probes, rooms) if probe.wait_for('fanout_check') != {'room': room}]
+    finally:
+        for probe in probes:
+            probe.close()
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+        if spool_folder:
+            shutil.rmtree(spool_folder, ignore_errors=True)
+
+    if failed:
+        raise click.ClickException(f"Events emitted through the message queue did not reach the workers on port(s) {', '.join(map(str, failed))}.")
+    click.echo(f"Events emitted through {environ['SOCKETIO_MESSAGE_QUEUE']} reached clients on all {workers} worker(s).")
+
+
+def register_commands(app):
+    """Registers the project's maintenance CLI commands on the app."""
+    app.cli.add_command(repair_auction_stats)
+    app.cli.add_command(repair_unread_counters)
+    app.cli.add_command(repair_request_stats)
+    app.cli.add_command(rebuild_search_index_command)
+    app.cli.add_command(rebuild_similar_cars_command)
+    app.cli.add_command(check_query_counts)
+    app.cli.add_command(check_query_plans)
+    app.cli.add_command(check_bid_concurrency)
+    app.cli.add_command(benchmark_contact_masking)
+    app.cli.add_command(generate_image_variants)
+    app.cli.add_command(gc_uploads)
+    app.cli.add_command(close_auctions_command)
+    app.cli.add_command(run_jobs)
+    app.cli.add_command(run_workers)
+    app.cli.add_command(check_socketio_fanout)
@@ -21,3 +21,37 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
         'sqlite:///' + os.path.join(basedir, 'database.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Auctions
+    # Minimum step between consecutive bids once bidding has started, in ETB.
+    AUCTION_BID_INCREMENT = int(os.environ.get('AUCTION_BID_INCREMENT', 50000))
+    # A bid accepted this many seconds (or fewer) before end_time extends the auction (0 disables soft-close).
+    AUCTION_SOFT_CLOSE_SECONDS = int(os.environ.get('AUCTION_SOFT_CLOSE_SECONDS', 60))
+    # How far past the late bid the new end_time is set; defaults to the window itself.
+    AUCTION_SOFT_CLOSE_EXTENSION_SECONDS = int(os.environ.get('AUCTION_SOFT_CLOSE_EXTENSION_SECONDS', 0))
+
+    # Listing response cache
+    # Leave RESPONSE_CACHE_URL unset for a per-process in-memory cache, or set a redis:// URL to share it between workers.
+    RESPONSE_CACHE_URL = os.environ.get('RESPONSE_CACHE_URL')
+    RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL', 30))
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 1024))
+
+    # Uploaded images
+    # Worker threads generating thumbnail/card/full variants of uploads (0 processes them in the request).
+    IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', 2))
+
+    # Background jobs
+    # Worker threads running post-commit side effects such as chat notifications (0 with no JOB_QUEUE_URL runs them in the request).
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+    # Leave JOB_QUEUE_URL unset for a per-process queue, or set a redis:// URL to share jobs with `flask run-jobs` workers.
+    JOB_QUEUE_URL = os.environ.get('JOB_QUEUE_URL')
+
+    # Real-time updates (Socket.IO)
+    # Set to a redis:// (or other broker) URL when running several workers, so an emit from one reaches clients of all of them;
+    # file:///some/folder is a local stand-in for tests and development on one machine.
+    SOCKETIO_MESSAGE_QUEUE = os.environ.get('SOCKETIO_MESSAGE_QUEUE')
+    SOCKETIO_CHANNEL = os.environ.get('SOCKETIO_CHANNEL', 'mekina-socketio')
+
+    # Chat moderation
+    # Optional JSON file of {category: [regex]} replacing the built-in contact-info patterns; edits are picked up without a restart.
+    CONTACT_PATTERNS_FILE = os.environ.get('CONTACT_PATTERNS_FILE')
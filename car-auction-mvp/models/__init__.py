@@ -1,21 +1,26 @@
 from .user import User
 from .car import Car
+from .car_search import CarSearch
 from .auction import Auction
 from .bid import Bid
+from .proxy_bid import ProxyBid
 from .question import Question
 from .car_request import CarRequest
 from .dealer_bid import DealerBid
 from .dealer_bid_image import DealerBidImage
 from .deal import Deal
-from .trade_in import TradeInRequest, TradeInPhoto
+from .trade_in import TradeInRequest, TradeInPhoto, TradeInUpload
 from .car_image import CarImage
 from .chat_message import ChatMessage
 from .conversation import Conversation
 from .dealer_rating import DealerRating
 from .dealer_request_view import DealerRequestView
+from .dealer_interest import DealerInterest
 from .dealer_review import DealerReview
 from .equipment import Equipment
 from .lead_score import LeadScore
 from .notification import Notification
 from .rental_listing import RentalListing
+from .similar_car import SimilarCar
+from .stored_file import StoredFile
 from .request_question import RequestQuestion
\ No newline at end of file
@@ -8,14 +8,30 @@ class Auction(db.Model):
     end_time = db.Column(db.DateTime, nullable=False)
     start_price = db.Column(db.Float, nullable=False)
     current_price = db.Column(db.Float, nullable=False)
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0') # Bumped on every accepted bid (compare-and-set)
     
     car_id = db.Column(db.Integer, db.ForeignKey('car.id'), nullable=False, unique=True)
     winner_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    closed_at = db.Column(db.DateTime, nullable=True) # Set by services.auction_closing once the auction is settled
+
+    # Denormalized bid stats, maintained by services.bidding in the same transaction as each bid
+    bid_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    highest_bid_id = db.Column(db.Integer, db.ForeignKey('bid.id', use_alter=True, name='fk_auction_highest_bid_id'), nullable=True)
+    highest_bidder_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
 
     # Relationships
-    bids = db.relationship('Bid', backref='auction', lazy='dynamic', cascade="all, delete-orphan")
+    bids = db.relationship('Bid', foreign_keys='Bid.auction_id', backref='auction', lazy='dynamic', cascade="all, delete-orphan")
+    highest_bid = db.relationship('Bid', foreign_keys=[highest_bid_id], post_update=True)
+    highest_bidder = db.relationship('User', foreign_keys=[highest_bidder_id])
     questions = db.relationship('Question', back_populates='auction', lazy='dynamic', cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # Lets the closing scheduler find open (and overdue) auctions without scanning the table
+        db.Index('ix_auction_closed_at_end_time', 'closed_at', 'end_time'),
+        # The auction feed lists running auctions soonest-ending first
+        db.Index('ix_auction_end_time', 'end_time'),
+    )
+
 
     def __repr__(self):
         return f'<Auction for Car ID {self.car_id}>'
\ No newline at end of file
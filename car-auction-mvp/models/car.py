@@ -32,11 +32,33 @@ class Car(db.Model):
     listing_type = db.Column(db.String(50), default='auction', nullable=False) # 'auction', 'sale', 'rental'
     fixed_price = db.Column(db.Float, nullable=True) # For 'sale' listing_type
 
+    # Filled in by services.listing_loader so list endpoints get the first image without loading them all
+    listing_image_url = db.query_expression()
+
+    __table_args__ = (
+        # Lets services.dealer_matching find the dealers stocking a make without scanning the inventory
+        db.Index('ix_car_make_lower_owner_id', db.func.lower(make), owner_id),
+        # Listing feeds page newest first over approved, active cars; the partial indexes only hold those
+        db.Index('ix_car_listed_listing_type_id', listing_type, id,
+                 sqlite_where=db.and_(is_approved == True, is_active == True),
+                 postgresql_where=db.and_(is_approved == True, is_active == True)),
+        db.Index('ix_car_listed_body_type_id', body_type, id,
+                 sqlite_where=db.and_(is_approved == True, is_active == True),
+                 postgresql_where=db.and_(is_approved == True, is_active == True)),
+        db.Index('ix_car_featured_listed_id', id,
+                 sqlite_where=db.and_(is_featured == True, is_approved == True, is_active == True),
+                 postgresql_where=db.and_(is_featured == True, is_approved == True, is_active == True)),
+        # Seller and dealer inventories, the admin approval queue and per-type counts
+        db.Index('ix_car_owner_id_id', owner_id, id),
+        db.Index('ix_car_is_approved_listing_type_id', is_approved, listing_type, id),
+        db.Index('ix_car_make_model', make, model),
+    )
+
     # Relationship
     auction = db.relationship('Auction', backref='car', uselist=False, cascade="all, delete-orphan")
     rental_listing = db.relationship('RentalListing', backref='car', uselist=False, cascade="all, delete-orphan")
     images = db.relationship('CarImage', backref='car', lazy=True, cascade="all, delete-orphan") # One-to-many relationship with CarImage
-    equipment = db.relationship('Equipment', secondary=car_equipment_association, lazy='subquery', backref=db.backref('cars', lazy=True))
+    equipment = db.relationship('Equipment', secondary=car_equipment_association, lazy='select', backref=db.backref('cars', lazy=True))
 
     # Property to easily get the primary image for thumbnails
     @property
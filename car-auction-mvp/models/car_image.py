@@ -8,5 +8,13 @@ class CarImage(db.Model):
     image_url = db.Column(db.String(255), nullable=False)
     car_id = db.Column(db.Integer, db.ForeignKey('car.id'), nullable=False)
 
+    # The content-addressed upload behind image_url (None for images saved before uploads were deduplicated)
+    stored_file = db.relationship('StoredFile', primaryjoin='foreign(CarImage.image_url) == StoredFile.url', viewonly=True)
+
+    __table_args__ = (
+        # Serves the first-image lookup in services.listing_loader as one index probe per car
+        db.Index('ix_car_images_car_id_id', 'car_id', 'id'),
+    )
+
     def __repr__(self):
         return f'<CarImage {self.image_url}>'
\ No newline at end of file
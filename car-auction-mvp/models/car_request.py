@@ -14,6 +14,10 @@ class CarRequest(db.Model):
     notes = db.Column(db.Text, nullable=True)
     status = db.Column(db.String(20), default='active', nullable=False) # e.g., active, completed, expired
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # Denormalized offer stats, maintained by services.request_feed on every flush
+    bid_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    lowest_offer = db.Column(db.Float, nullable=True)
     
     # Foreign Key to the user who made the request
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -23,4 +27,11 @@ class CarRequest(db.Model):
 
     # Link to the winning bid
     accepted_bid_id = db.Column(db.Integer, db.ForeignKey('dealer_bid.id', use_alter=True, name='fk_car_requests_accepted_bid_id'), nullable=True)
-    accepted_bid = db.relationship('DealerBid', foreign_keys=[accepted_bid_id])
\ No newline at end of file
+    accepted_bid = db.relationship('DealerBid', foreign_keys=[accepted_bid_id])
+
+    __table_args__ = (
+        # Serves the dealer dashboard feed: active requests, newest first, paged by (created_at, id)
+        db.Index('ix_car_requests_status_created_at_id', 'status', 'created_at', 'id'),
+        # A customer's own requests, newest first
+        db.Index('ix_car_requests_user_id_created_at', 'user_id', 'created_at'),
+    )
@@ -0,0 +1,15 @@
+from extensions import db
+
+class CarSearch(db.Model):
+    """
+    The searchable text of a car, maintained by services.search. On SQLite it
+    feeds the car_search_fts FTS5 table through triggers; on PostgreSQL it is
+    covered by a GIN index over to_tsvector('simple', document).
+    """
+    __tablename__ = 'car_search'
+
+    car_id = db.Column(db.Integer, db.ForeignKey('car.id', ondelete='CASCADE'), primary_key=True)
+    document = db.Column(db.Text, nullable=False) # Lowercased make, model, year, body type, description and equipment
+
+    def __repr__(self):
+        return f'<CarSearch Car {self.car_id}>'
@@ -13,6 +13,13 @@ class ChatMessage(db.Model):
     conversation_id = db.Column(db.Integer, db.ForeignKey('conversations.id'), nullable=False)
     sender_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
 
+    __table_args__ = (
+        # Unread messages in a conversation sent by the other participant
+        db.Index('ix_chat_messages_conversation_id_is_read_sender_id', 'conversation_id', 'is_read', 'sender_id'),
+        # Keyset pages of a conversation's history and catch-up after a reconnect (services.chat_history)
+        db.Index('ix_chat_messages_conversation_id_id', 'conversation_id', 'id'),
+    )
+
     # Relationships
     conversation = db.relationship('Conversation', backref=db.backref('messages', lazy='dynamic', cascade="all, delete-orphan"))
     sender = db.relationship('User', backref='sent_chat_messages')
\ No newline at end of file
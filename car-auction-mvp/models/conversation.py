@@ -13,6 +13,13 @@ class Conversation(db.Model):
     buyer_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     dealer_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
 
+    __table_args__ = (
+        # A buyer's conversation about a car, and each side's inbox newest first
+        db.Index('ix_conversations_car_id_buyer_id', 'car_id', 'buyer_id'),
+        db.Index('ix_conversations_buyer_id_created_at', 'buyer_id', 'created_at'),
+        db.Index('ix_conversations_dealer_id_created_at', 'dealer_id', 'created_at'),
+    )
+
     # Relationships
     car = db.relationship('Car', backref='conversations')
     buyer = db.relationship('User', foreign_keys=[buyer_id])
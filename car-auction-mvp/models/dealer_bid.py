@@ -28,8 +28,11 @@ class DealerBid(db.Model):
     deal = db.relationship('Deal', backref='accepted_bid', uselist=False, foreign_keys='Deal.accepted_bid_id')
     images = db.relationship('DealerBidImage', backref='dealer_bid', lazy=True, cascade="all, delete-orphan")
 
-<<<<<<< HEAD
-=======
+    __table_args__ = (
+        # Lets services.request_feed recount a request's offers and lowest price from the index alone
+        db.Index('ix_dealer_bid_request_id_price', 'request_id', 'price'),
+    )
+
     def to_dict(self):
         """Serializes the DealerBid object to a dictionary."""
         return {
@@ -49,9 +52,8 @@ class DealerBid(db.Model):
             'message': self.message,
             'image_urls': [img.image_url for img in self.images],
             'request_id': self.request_id,
-            'dealer': self.dealer.to_dict() if self.dealer else None
+            'dealer': {'id': self.dealer.id, 'username': self.dealer.username, 'is_verified': self.dealer.is_verified} if self.dealer else None
         }
 
->>>>>>> b81efbb8 (feat(trade-in): Implement trade-in feature and fix model imports)
     def __repr__(self):
         return f'<DealerBid {self.price} for Request ID {self.request_id}>'
\ No newline at end of file
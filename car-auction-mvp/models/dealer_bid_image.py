@@ -6,5 +6,8 @@ class DealerBidImage(db.Model):
     image_url = db.Column(db.String(255), nullable=False)
     dealer_bid_id = db.Column(db.Integer, db.ForeignKey('dealer_bid.id'), nullable=False)
 
+    # The content-addressed upload behind image_url (None for images saved before uploads were deduplicated)
+    stored_file = db.relationship('StoredFile', primaryjoin='foreign(DealerBidImage.image_url) == StoredFile.url', viewonly=True)
+
     def __repr__(self):
         return f'<DealerBidImage {self.id}>'
\ No newline at end of file
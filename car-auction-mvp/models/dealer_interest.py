@@ -0,0 +1,25 @@
+from datetime import datetime
+from extensions import db
+
+class DealerInterest(db.Model):
+    """A kind of car a dealer wants to hear about when customers request it."""
+    __tablename__ = 'dealer_interest'
+
+    id = db.Column(db.Integer, primary_key=True)
+    dealer_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    make = db.Column(db.String(64), nullable=True) # Lowercased; None matches any make
+    model = db.Column(db.String(64), nullable=True) # Lowercased; None matches any model of the make
+    min_year = db.Column(db.Integer, nullable=True)
+    max_year = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # Relationships
+    dealer = db.relationship('User', backref=db.backref('interests', lazy='dynamic', cascade="all, delete-orphan"))
+
+    __table_args__ = (
+        # Serves request matching as index lookups on the requested make (and model)
+        db.Index('ix_dealer_interest_make_model', 'make', 'model'),
+    )
+
+    def __repr__(self):
+        return f'<DealerInterest Dealer {self.dealer_id} in {self.make or "any"} {self.model or ""}>'
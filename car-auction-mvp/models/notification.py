@@ -1,4 +1,5 @@
 from datetime import datetime
+from urllib.parse import urlsplit, urlunsplit
 from extensions import db
 
 class Notification(db.Model):
@@ -8,4 +9,24 @@ class Notification(db.Model):
     message = db.Column(db.Text, nullable=False)
     link = db.Column(db.String(255), nullable=True)
     is_read = db.Column(db.Boolean, default=False, nullable=False)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
\ No newline at end of file
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    __table_args__ = (
+        # A user's unread notifications, and their notification list newest first
+        db.Index('ix_notification_user_id_is_read', 'user_id', 'is_read'),
+        db.Index('ix_notification_user_id_timestamp', 'user_id', 'timestamp'),
+    )
+
+    @property
+    def url(self):
+        """The link with this notification's id added, so following it marks the notification as read."""
+        return notification_url(self.link, self.id)
+
+
+def notification_url(link, notification_id):
+    """Adds the notification_id query argument that mark_notification_as_read looks for to a link."""
+    if not link or 'notification_id=' in link:
+        return link
+    parts = urlsplit(link)
+    query = f"{parts.query}&notification_id={notification_id}" if parts.query else f"notification_id={notification_id}"
+    return urlunsplit(parts._replace(query=query))
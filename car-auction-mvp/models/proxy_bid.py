@@ -0,0 +1,25 @@
+from datetime import datetime
+from extensions import db
+
+class ProxyBid(db.Model):
+    """A bidder's hidden maximum on an auction; services.bidding bids on their behalf up to it."""
+    __tablename__ = 'proxy_bid'
+
+    id = db.Column(db.Integer, primary_key=True)
+    auction_id = db.Column(db.Integer, db.ForeignKey('auction.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    max_amount = db.Column(db.Float, nullable=False)
+    placed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow) # When max_amount was last set; earlier wins ties
+
+    # Relationships
+    auction = db.relationship('Auction', backref=db.backref('proxy_bids', lazy='dynamic', cascade="all, delete-orphan"))
+    bidder = db.relationship('User', backref=db.backref('proxy_bids', lazy='dynamic'))
+
+    __table_args__ = (
+        db.UniqueConstraint('auction_id', 'user_id', name='_auction_user_proxy_uc'),
+        # Serves the top-two lookup in bid resolution as an index range scan
+        db.Index('ix_proxy_bid_auction_max', 'auction_id', 'max_amount', 'placed_at'),
+    )
+
+    def __repr__(self):
+        return f'<ProxyBid max {self.max_amount} by User ID {self.user_id} on Auction ID {self.auction_id}>'
@@ -0,0 +1,21 @@
+from extensions import db
+
+class SimilarCar(db.Model):
+    """
+    One entry of a car's precomputed "similar listings": a listed car of the
+    same listing type and how closely it matches. Maintained by
+    services.similar_cars, which keeps the best SIMILAR_CARS_STORED per car.
+    """
+    __tablename__ = 'similar_cars'
+
+    car_id = db.Column(db.Integer, db.ForeignKey('car.id', ondelete='CASCADE'), primary_key=True)
+    similar_car_id = db.Column(db.Integer, db.ForeignKey('car.id', ondelete='CASCADE'), primary_key=True)
+    score = db.Column(db.Float, nullable=False) # Higher is more similar; see services.similar_cars.similarity
+
+    __table_args__ = (
+        # Detail pages read a car's neighbours best first with one range scan
+        db.Index('ix_similar_cars_car_id_score', 'car_id', 'score'),
+    )
+
+    def __repr__(self):
+        return f'<SimilarCar {self.car_id} -> {self.similar_car_id} ({self.score})>'
@@ -0,0 +1,21 @@
+from datetime import datetime
+from extensions import db
+
+class StoredFile(db.Model):
+    """
+    An uploaded file stored once under the SHA-256 of its content, however
+    many images point at it. ref_count is maintained by services.file_storage
+    from the CarImage, DealerBidImage and TradeInPhoto rows using its url;
+    the file is deleted once nothing references it.
+    """
+    __tablename__ = 'stored_files'
+
+    id = db.Column(db.Integer, primary_key=True)
+    digest = db.Column(db.String(64), nullable=False, index=True) # SHA-256 of the uploaded bytes
+    url = db.Column(db.String(255), nullable=False, unique=True)
+    size = db.Column(db.Integer, nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<StoredFile {self.url} ({self.ref_count} refs)>'
@@ -46,10 +46,44 @@ class TradeInPhoto(db.Model):
     image_url = db.Column(db.String(255), nullable=False)
     trade_in_request_id = db.Column(db.Integer, db.ForeignKey('trade_in_requests.id'), nullable=False)
 
+    # The content-addressed upload behind image_url (None for photos saved before uploads were deduplicated)
+    stored_file = db.relationship('StoredFile', primaryjoin='foreign(TradeInPhoto.image_url) == StoredFile.url', viewonly=True)
+
     def to_dict(self):
         """Serializes the object to a dictionary."""
         return {
             'id': self.id,
             'image_url': self.image_url,
             'trade_in_request_id': self.trade_in_request_id
-        }
\ No newline at end of file
+        }
+
+class TradeInUpload(db.Model):
+    """
+    A trade-in photo being uploaded in chunks ahead of the submission that
+    references it by token. image_url is set once every byte has arrived;
+    the row is removed when a submission claims it or once it expires.
+    """
+    __tablename__ = 'trade_in_uploads'
+
+    id = db.Column(db.Integer, primary_key=True)
+    token = db.Column(db.String(64), nullable=False, unique=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    size = db.Column(db.Integer, nullable=False) # Declared by the client up front
+    received = db.Column(db.Integer, nullable=False, default=0)
+    content_type = db.Column(db.String(50), nullable=True) # Sniffed from the first bytes received
+    image_url = db.Column(db.String(255), nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+    @property
+    def is_complete(self):
+        return self.image_url is not None
+
+    def to_dict(self):
+        """Serializes the upload's progress, so a client can resume from offset."""
+        return {
+            'token': self.token,
+            'size': self.size,
+            'offset': self.received,
+            'complete': self.is_complete,
+            'image_url': self.image_url
+        }
@@ -14,6 +14,10 @@ class User(UserMixin, db.Model):
     is_verified = db.Column(db.Boolean, default=False) # For verified dealers
     points = db.Column(db.Integer, nullable=False, default=5) # Points for dealers to bid
 
+    # Denormalized unread counters, maintained by services.unread_counters on every flush
+    unread_notification_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    unread_message_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
     # Relationships
     cars = db.relationship('Car', backref='owner', lazy='dynamic')
     bids = db.relationship('Bid', backref='bidder', lazy='dynamic')
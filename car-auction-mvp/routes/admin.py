@@ -1,6 +1,8 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, abort, request, jsonify
 from flask_login import login_required, current_user
-from extensions import db, socketio
+from extensions import db
+from services.notifications import NotificationItem, add_notifications, emit_notifications
+from services.search import car_search_filter
 from sqlalchemy import func, or_
 from models.rental_listing import RentalListing
 from models.user import User
@@ -249,16 +251,11 @@ def api_admin_list_rentals():
     cars_query = Car.query.filter_by(listing_type='rental').order_by(Car.id.desc())
 
     if query:
-        search_term = f"%{query}%"
-        # Join with User to search by owner username
-        cars_query = cars_query.join(User).filter(
-            or_(
-                Car.make.ilike(search_term),
-                Car.model.ilike(search_term),
-                Car.year.like(search_term),
-                User.username.ilike(search_term)
-            )
-        )
+        # Join with User to search by owner username as well as the car itself
+        cars_query = cars_query.join(User, Car.owner_id == User.id)
+        search_condition = car_search_filter(query)
+        username_condition = User.username.ilike(f"%{query}%")
+        cars_query = cars_query.filter(username_condition if search_condition is None else or_(search_condition, username_condition))
 
     paginated_cars = cars_query.paginate(page=page, per_page=15)
 
@@ -343,7 +340,7 @@ def edit_listing(car_id):
             # Listing type is the same, just update the values
             if car.listing_type == 'auction' and auction:
                 auction.start_price = form.start_price.data
-                if not auction.bids and form.start_price.data:
+                if not auction.bid_count and form.start_price.data:
                      auction.current_price = form.start_price.data
                 auction.end_time = form.end_time.data
             elif car.listing_type == 'sale':
@@ -360,7 +357,7 @@ def edit_listing(car_id):
 
         # If new images are uploaded, replace the old ones
         if form.images.data and form.images.data[0].filename:
-            CarImage.query.filter_by(car_id=car.id).delete()
+            car.images.clear() # Through the ORM, so the replaced files lose their references
             for image_file in form.images.data:
                 image_url = save_seller_document(image_file)
                 if image_url:
@@ -390,21 +387,11 @@ def approve_car(car_id):
     else:
         link = url_for('main.home')
     message = f"Congratulations! Your listing for the {car.year} {car.make} {car.model} has been approved and is now live."
-    new_notification = Notification(user_id=car.owner_id, message=message)
-    db.session.add(new_notification)
-    db.session.flush() # Get ID
-    new_notification.link = url_for('auctions.auction_detail', auction_id=car.auction.id, notification_id=new_notification.id) if car.auction else link
+    pending_notifications = add_notifications([NotificationItem(car.owner_id, message, link)])
     db.session.commit()
 
     # --- Real-time Notification ---
-    unread_count = Notification.query.filter_by(user_id=car.owner_id, is_read=False).count()
-    notification_data = {
-        'message': new_notification.message,
-        'link': new_notification.link,
-        'timestamp': new_notification.timestamp.isoformat() + 'Z',
-        'count': unread_count
-    }
-    socketio.emit('new_notification', notification_data, room=str(car.owner_id))
+    emit_notifications(pending_notifications)
 
     flash(f'Car {car.make} {car.model} has been approved.', 'success')
     return redirect(url_for('admin.dashboard'))
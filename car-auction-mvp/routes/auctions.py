@@ -1,13 +1,20 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
 from flask_login import login_required, current_user
-from sqlalchemy import or_, func
+from sqlalchemy import or_
 from models.auction import Auction
 from models.car import Car
 from models.bid import Bid
 from models.question import Question
+from models.proxy_bid import ProxyBid
 from extensions import db
 from datetime import datetime
 from routes.main import get_similar_cars, mark_notification_as_read
+from services.bidding import check_bid, place_bid
+from services.search import apply_car_search
+from services.response_cache import cached_response
+from services.random_listings import random_listings
+from services.images import variant_url
+from services.listing_loader import auction_listing_options, car_listing_options, estimate_count, listing_page, listing_page_size, listing_response, owner_role
 
 # Simple form for placing a bid
 from flask_wtf import FlaskForm
@@ -19,24 +26,14 @@ auctions_bp = Blueprint('auctions', __name__)
 def bid_increment_validator(form, field):
     """Custom validator to enforce bid increments."""
     auction = form.auction
+    user_id = current_user.id if current_user.is_authenticated else None
 
-    # Check if user is the current highest bidder
-    highest_bid = auction.bids.order_by(Bid.amount.desc()).first()
-    if highest_bid and highest_bid.user_id == current_user.id:
-        raise ValidationError("You are already the highest bidder.")
-
-    if auction.bids.first():
-        # There are existing bids, enforce increment
-        min_bid = auction.current_price + 50000
-        if field.data < min_bid:
-            raise ValidationError(f"Your bid must be at least {min_bid:,.2f} ETB (50,000 ETB increment).")
-    else:
-        # No bids yet, bid must be at least the start price
-        if field.data < auction.start_price:
-            raise ValidationError(f"The first bid must be at least the starting price of {auction.start_price:,.2f} ETB.")
+    # The authoritative check happens atomically in place_bid(); this only gives early form feedback.
+    if error := check_bid(auction, user_id, field.data):
+        raise ValidationError(error)
 
 class BidForm(FlaskForm):
-    amount = FloatField('Bid Amount (ETB)', validators=[DataRequired(), bid_increment_validator])
+    amount = FloatField('Your Maximum Bid (ETB)', validators=[DataRequired(), bid_increment_validator])
     submit = SubmitField('Place Bid')
 
     def __init__(self, *args, auction=None, **kwargs):
@@ -55,12 +52,7 @@ def list_auctions():
         cars_query = Car.query.order_by(Car.id.desc())
 
         if query:
-            search_term = f"%{query}%"
-            cars_query = cars_query.filter(or_(
-                Car.make.ilike(search_term),
-                Car.model.ilike(search_term),
-                Car.year.like(search_term)
-            ))
+            cars_query = apply_car_search(cars_query, query)
 
         cars = cars_query.paginate(page=page, per_page=10)
         return render_template(
@@ -91,14 +83,12 @@ def auction_detail(auction_id):
             flash('You must be logged in to place a bid.')
             return redirect(url_for('auth.login'))
 
-        new_bid = Bid(amount=bid_form.amount.data, user_id=current_user.id, auction_id=auction.id)
-        auction.current_price = bid_form.amount.data
-        db.session.add(new_bid)
-        db.session.commit()
-        flash('Your bid has been placed successfully!')
+        outcome = place_bid(auction.id, current_user.id, bid_form.amount.data)
+        flash(outcome.message)
         return redirect(url_for('auctions.auction_detail', auction_id=auction.id))
 
-    highest_bid = Bid.query.filter_by(auction_id=auction.id).order_by(Bid.amount.desc()).first()
+    highest_bid = auction.highest_bid
+    my_proxy_bid = ProxyBid.query.filter_by(auction_id=auction.id, user_id=current_user.id).first() if current_user.is_authenticated else None
 
     # Get all bids for the history, newest first
     all_bids = auction.bids.order_by(Bid.timestamp.desc()).all()
@@ -109,24 +99,19 @@ def auction_detail(auction_id):
     # We can get the associated auction from each car.
     similar_auctions = [car.auction for car in similar_cars if car.auction]
 
-    return render_template('auction_detail.html', auction=auction, bid_form=bid_form, highest_bid=highest_bid, all_bids=all_bids, similar_auctions=similar_auctions, similarity_reason=similarity_reason)
+    return render_template('auction_detail.html', auction=auction, bid_form=bid_form, highest_bid=highest_bid, my_proxy_bid=my_proxy_bid, all_bids=all_bids, similar_auctions=similar_auctions, similarity_reason=similarity_reason)
 
 @auctions_bp.route('/api/filter')
 def filter_auctions_api():
     """API endpoint to return filtered auction data as JSON."""
-    query = Auction.query.join(Car).filter(
+    query = Auction.query.join(Car).options(*auction_listing_options()).filter(
         Car.is_approved == True,
         Auction.end_time > datetime.utcnow()
     )
 
     # Apply filters from request arguments
     if q := request.args.get('q'):
-        search_term = f"%{q}%"
-        query = query.filter(or_(
-            Car.make.ilike(search_term),
-            Car.model.ilike(search_term),
-            Car.year.like(search_term)
-        ))
+        query = apply_car_search(query, q)
 
     if condition := request.args.get('condition'):
         query = query.filter(Car.condition == condition)
@@ -146,14 +131,19 @@ def filter_auctions_api():
         query = query.filter(Car.body_type == body_type)
 
     if request.args.get('random') == 'true':
-        query = query.order_by(func.random())
+        try:
+            auctions, next_cursor = random_listings(
+                query, Auction.id, 'auctions.filter_auctions_api', ('auctions',), request.args,
+                listing_page_size(request.args.get('limit', type=int)),
+                seed=request.args.get('seed'), cursor=request.args.get('cursor')
+            )
+        except ValueError:
+            return jsonify({'status': 'error', 'message': 'Invalid cursor.'}), 400
     else:
         query = query.order_by(Auction.end_time.asc())
-
-    if limit := request.args.get('limit', type=int):
-        query = query.limit(limit)
-
-    auctions = query.all()
+        if limit := request.args.get('limit', type=int):
+            query = query.limit(limit)
+        auctions, next_cursor = query.all(), None
 
     def format_timedelta(td):
         """Helper to format time left in a human-readable way."""
@@ -176,26 +166,22 @@ def filter_auctions_api():
             'make': auction.car.make,
             'model': auction.car.model,
             'current_price': auction.current_price,
-            'image_url': auction.car.primary_image_url or url_for('static', filename='img/default_car.png'),
+            'image_url': variant_url(auction.car.listing_image_url, 'card') or url_for('static', filename='img/default_car.png'),
             'detail_url': url_for('auctions.auction_detail', auction_id=auction.id),
             'time_left': format_timedelta(auction.end_time - datetime.utcnow()),
-            'bid_count': auction.bids.count(),
-            'owner_role': (
-                'Admin' if auction.car.owner.is_admin else
-                'Dealer' if auction.car.owner.is_dealer else
-                'Rental' if auction.car.owner.is_rental_company else
-                None
-            )
+            'bid_count': auction.bid_count,
+            'owner_role': owner_role(auction.car.owner)
         }
         for auction in auctions
     ]
 
-    return jsonify(results)
+    return jsonify(listing_response(results, next_cursor))
 
 @auctions_bp.route('/api/all_listings')
+@cached_response('sales', 'auctions', bypass=lambda: request.args.get('random') == 'true')
 def all_listings_api():
     """API endpoint to return all types of listings (auctions, rentals, etc.) as JSON."""
-    query = Car.query.options(db.joinedload(Car.auction), db.joinedload(Car.rental_listing)).filter(
+    query = Car.query.options(*car_listing_options()).filter(
         Car.listing_type != 'rental', # DEFINITIVE FIX: Exclude rentals by default.
         Car.is_approved == True,
         Car.is_active == True
@@ -203,16 +189,8 @@ def all_listings_api():
 
     # This is a simplified filter for the generic listings page.
     # It can be expanded later to include more car-specific attributes.
-    if q := request.args.get('q'): # Use the same forgiving logic for main search
-        search_terms = q.lower().split()
-        conditions = []
-        for term in search_terms:
-            conditions.append(Car.make.ilike(f"%{term}%"))
-            conditions.append(Car.model.ilike(f"%{term}%"))
-            if term.isdigit(): # Allow searching by year if it's a number
-                conditions.append(Car.year == int(term))
-        if conditions:
-            query = query.filter(or_(*conditions))
+    if q := request.args.get('q'): # Use the same prefix search as the main search box
+        query = apply_car_search(query, q)
     
     if condition := request.args.get('condition'):
         query = query.filter(Car.condition == condition)
@@ -232,15 +210,20 @@ def all_listings_api():
     if exclude_type := request.args.get('exclude_listing_type'):
         query = query.filter(Car.listing_type != exclude_type)
 
-    if request.args.get('random') == 'true':
-        query = query.order_by(func.random())
-    else:
-        query = query.order_by(Car.id.desc())
-
-    if limit := request.args.get('limit', type=int):
-        query = query.limit(limit)
-
-    cars = query.all()
+    # Random picks (the home page showcase) are drawn from a pooled id sample; pass ?seed= to page through them.
+    limit = listing_page_size(request.args.get('limit', type=int))
+    try:
+        if request.args.get('random') == 'true':
+            cars, next_cursor = random_listings(
+                query, Car.id, 'auctions.all_listings_api', ('sales', 'auctions'), request.args,
+                limit, seed=request.args.get('seed'), cursor=request.args.get('cursor')
+            )
+            total_estimate = None
+        else:
+            cars, next_cursor = listing_page(query, request.args.get('cursor'), limit)
+            total_estimate = estimate_count(query) if request.args.get('include_total') == 'true' else None
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'Invalid cursor.'}), 400
 
     def format_timedelta(td):
         days = td.days
@@ -259,13 +242,8 @@ def all_listings_api():
             'make': car.make,
             'model': car.model,
             'is_featured': car.is_featured,
-            'image_url': car.primary_image_url or url_for('static', filename='img/default_car.png'),
-            'owner_role': (
-                'Admin' if car.owner.is_admin else
-                'Dealer' if car.owner.is_dealer else
-                'Rental' if car.owner.is_rental_company else
-                None
-            ),
+            'image_url': variant_url(car.listing_image_url, 'card') or url_for('static', filename='img/default_car.png'),
+            'owner_role': owner_role(car.owner),
             'listing_type': 'For Sale', # Default
             'price_display': 'Contact Seller',
             'time_left': ''
@@ -289,7 +267,7 @@ def all_listings_api():
 
         results.append(listing_data)
 
-    return jsonify(results)
+    return jsonify(listing_response(results, next_cursor, total_estimate))
 
 @auctions_bp.route('/api/admin/listings')
 @login_required
@@ -305,12 +283,7 @@ def api_admin_list_cars():
     cars_query = Car.query.order_by(Car.id.desc())
 
     if query:
-        search_term = f"%{query}%"
-        cars_query = cars_query.filter(or_(
-            Car.make.ilike(search_term),
-            Car.model.ilike(search_term),
-            Car.year.like(search_term)
-        ))
+        cars_query = apply_car_search(cars_query, query)
 
     paginated_cars = cars_query.paginate(page=page, per_page=10)
 
@@ -1,7 +1,6 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, abort, current_app
+from flask import Blueprint, render_template, redirect, url_for, flash, request, abort, current_app, jsonify
 from flask_login import login_required, current_user, AnonymousUserMixin
 from models.car_request import CarRequest 
-from werkzeug.utils import secure_filename
 from models.dealer_bid import DealerBid
 from models.car import Car
 from models.dealer_bid_image import DealerBidImage
@@ -15,7 +14,14 @@ from models.chat_message import ChatMessage
 from models.notification import Notification 
 from models.dealer_review import DealerReview
 from models.dealer_request_view import DealerRequestView
+from models.dealer_interest import DealerInterest
 from extensions import db, socketio
+from services.notifications import NotificationItem, add_notifications, emit_notifications
+from services.dealer_matching import normalize
+from services.images import save_image
+from services.chat_history import history_page
+from services.request_feed import FEED_PAGE_SIZE, FEED_VIEWS, MAX_FEED_PAGE_SIZE, count_new_requests, feed_item, request_feed
+from services.unread_counters import mark_messages_read
 from sqlalchemy import func, or_
 from functools import wraps
 from datetime import datetime
@@ -26,9 +32,13 @@ from wtforms.validators import DataRequired, NumberRange, Optional, Length, Vali
 from wtforms import FileField
 from flask_wtf.file import FileAllowed
 from routes.main import mark_notification_as_read
+from routes.tradein import save_base64_image
 
 dealer_bp = Blueprint('dealer', __name__, url_prefix='/dealer')
 
+# How many listings/questions the dashboard shows; the request feed pages separately
+DASHBOARD_LIST_LIMIT = 50
+
 # Custom decorator to check for dealer privileges
 def dealer_required(f):
     @wraps(f)
@@ -69,7 +79,21 @@ class DealerBidForm(FlaskForm):
 
 # Define the grace period for free edits (e.g., 30 minutes)
 EDIT_GRACE_PERIOD_MINUTES = 30
-BID_PHOTO_UPLOAD_FOLDER = 'static/uploads/dealer_bids' # Define upload folder
+
+class DealerInterestForm(FlaskForm):
+    make = StringField('Make (leave empty for any make)', validators=[Optional(), Length(max=64)])
+    model = StringField('Model (leave empty for any model)', validators=[Optional(), Length(max=64)])
+    min_year = IntegerField('From Year', validators=[Optional(), NumberRange(min=1900, max=2100)])
+    max_year = IntegerField('To Year', validators=[Optional(), NumberRange(min=1900, max=2100)])
+    submit = SubmitField('Add Interest')
+
+    def validate_model(self, field):
+        if field.data and not self.make.data:
+            raise ValidationError('Enter the make for this model.')
+
+    def validate_max_year(self, field):
+        if field.data and self.min_year.data and field.data < self.min_year.data:
+            raise ValidationError('The end year must not be before the start year.')
 
 class RequestAnswerForm(FlaskForm):
     answer_text = TextAreaField('Your Answer', validators=[DataRequired(), Length(min=5)])
@@ -82,67 +106,90 @@ def dashboard():
     # Get filter from request args
     filter_new = request.args.get('filter_new', 'false').lower() == 'true'
 
-    # --- Dealer Functionality: Fetch customer requests ---
-    # OPTIMIZATION: Use a single query with subqueries to avoid the N+1 problem.
-    # This calculates bid counts and lowest offers in the database, not in a Python loop.
-    bid_count_subquery = db.session.query(
-        DealerBid.request_id,
-        func.count(DealerBid.id).label('bid_count')
-    ).group_by(DealerBid.request_id).subquery()
-
-    lowest_offer_subquery = db.session.query(
-        DealerBid.request_id,
-        func.min(DealerBid.price).label('lowest_offer')
-    ).group_by(DealerBid.request_id).subquery()
-
-    # Subquery to get all request IDs that the current dealer has already viewed.
-    viewed_requests_subquery = db.session.query(
-        DealerRequestView.request_id
-    ).filter(DealerRequestView.dealer_id == current_user.id).subquery()
-
-    query = db.session.query(
-        CarRequest, 
-        bid_count_subquery.c.bid_count, 
-        lowest_offer_subquery.c.lowest_offer,
-        # This will be True if the request has been viewed, otherwise False.
-        (CarRequest.id.in_(db.select(viewed_requests_subquery))).label('has_been_viewed')
-    ).\
-        outerjoin(bid_count_subquery, CarRequest.id == bid_count_subquery.c.request_id).\
-        outerjoin(lowest_offer_subquery, CarRequest.id == lowest_offer_subquery.c.request_id).\
-        filter(CarRequest.status == 'active')
-
-    # Apply the filter if requested
-    if filter_new:
-        query = query.filter(CarRequest.id.notin_(db.select(viewed_requests_subquery)))
-
-    active_requests = query.order_by(CarRequest.created_at.desc()).all()
-    # --- Seller Functionality: Fetch dealer's own listings and questions ---
-    my_cars = Car.query.filter_by(owner_id=current_user.id).order_by(Car.id.desc()).all()
-    my_car_ids = [car.id for car in my_cars]
-    my_auctions = Auction.query.filter(Auction.car_id.in_(my_car_ids)).all()
-    my_auction_ids = [auction.id for auction in my_auctions]
-    unanswered_questions = Question.query.filter(
-        Question.auction_id.in_(my_auction_ids),
-        Question.answer_text == None
-    ).order_by(Question.timestamp.desc()).all()
+    # --- Dealer Functionality: First page of the customer request feed ---
+    # Further pages are fetched from dealer.api_requests as the dealer scrolls.
+    active_requests, next_cursor = request_feed(current_user.id, view='new' if filter_new else 'all')
+    new_request_count = count_new_requests(current_user.id)
+
+    # --- Seller Functionality: Fetch dealer's most recent listings ---
+    my_cars = Car.query.filter_by(owner_id=current_user.id).order_by(Car.id.desc()).limit(DASHBOARD_LIST_LIMIT).all()
+    my_car_count = Car.query.filter_by(owner_id=current_user.id).count()
 
     # --- New: Fetch unanswered questions on dealer's offers ---
     unanswered_request_questions = RequestQuestion.query.join(DealerBid).filter(
         DealerBid.dealer_id == current_user.id,
         RequestQuestion.answer_text == None
-    ).order_by(RequestQuestion.timestamp.desc()).all()
+    ).order_by(RequestQuestion.timestamp.desc()).limit(DASHBOARD_LIST_LIMIT).all()
 
 
     return render_template(
         'dealer_dashboard.html', 
         requests=active_requests,
+        next_cursor=next_cursor,
+        new_request_count=new_request_count,
         my_cars=my_cars,
-        unanswered_questions=unanswered_questions,
+        my_car_count=my_car_count,
         unanswered_request_questions=unanswered_request_questions,
         now=datetime.utcnow(),
         filter_new=filter_new
     )
 
+@dealer_bp.route('/api/requests')
+@login_required
+@dealer_required
+def api_requests():
+    """
+    JSON feed of active customer requests, newest first, for the dashboard.
+    Pass the previous page's `next_cursor` as `cursor` to read the next page;
+    `view` is one of all, new or viewed.
+    """
+    view = request.args.get('view', 'all')
+    if view not in FEED_VIEWS:
+        return jsonify({'status': 'error', 'message': f"view must be one of: {', '.join(FEED_VIEWS)}."}), 400
+    limit = min(max(request.args.get('limit', FEED_PAGE_SIZE, type=int), 1), MAX_FEED_PAGE_SIZE)
+
+    try:
+        page, next_cursor = request_feed(current_user.id, cursor=request.args.get('cursor'), view=view, limit=limit)
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'Invalid cursor.'}), 400
+
+    return jsonify({
+        'requests': [feed_item(car_request, has_been_viewed) for car_request, has_been_viewed in page],
+        'next_cursor': next_cursor
+    })
+
+@dealer_bp.route('/interests', methods=['GET', 'POST'])
+@login_required
+@dealer_required
+def interests():
+    """Lets a dealer choose which customer requests they are notified about."""
+    form = DealerInterestForm()
+    if form.validate_on_submit():
+        interest = DealerInterest(
+            dealer_id=current_user.id,
+            make=normalize(form.make.data),
+            model=normalize(form.model.data),
+            min_year=form.min_year.data,
+            max_year=form.max_year.data
+        )
+        db.session.add(interest)
+        db.session.commit()
+        flash('You will now be notified about matching customer requests.', 'success')
+        return redirect(url_for('dealer.interests'))
+
+    my_interests = current_user.interests.order_by(DealerInterest.make, DealerInterest.model).all()
+    return render_template('dealer_interests.html', form=form, interests=my_interests)
+
+@dealer_bp.route('/interests/<int:interest_id>/delete', methods=['POST'])
+@login_required
+@dealer_required
+def delete_interest(interest_id):
+    interest = DealerInterest.query.filter_by(id=interest_id, dealer_id=current_user.id).first_or_404()
+    db.session.delete(interest)
+    db.session.commit()
+    flash('Interest removed.', 'success')
+    return redirect(url_for('dealer.interests'))
+
 @dealer_bp.route('/messages')
 @login_required
 @dealer_required
@@ -212,18 +259,15 @@ def view_conversation(conversation_id):
         abort(403)
 
     # Mark messages from buyer as read and emit a real-time update
-    unread_messages = conversation.messages.filter_by(sender_id=conversation.buyer_id, is_read=False).all()
-    if unread_messages:
-        for msg in unread_messages:
-            msg.is_read = True
+    if mark_messages_read(conversation, current_user.id):
         db.session.commit()
 
-        # Recalculate the total unread count and emit an update
-        from sqlalchemy import or_
-        total_unread = db.session.query(ChatMessage.id).join(Conversation, ChatMessage.conversation_id == Conversation.id).filter(Conversation.dealer_id == current_user.id, ChatMessage.sender_id != current_user.id, ChatMessage.is_read == False).count()
-        socketio.emit('message_count_update', {'count': total_unread}, room=str(current_user.id))
+        # Emit the updated total unread count
+        socketio.emit('message_count_update', {'count': current_user.unread_message_count}, room=str(current_user.id))
 
-    return render_template('dealer_conversation_detail.html', conversation=conversation, ChatMessage=ChatMessage)
+    # Only the newest page is rendered; older messages are loaded on demand from the history API.
+    messages, older_cursor = history_page(conversation.id)
+    return render_template('dealer_conversation_detail.html', conversation=conversation, messages=messages, older_cursor=older_cursor)
 
 @dealer_bp.route('/messages/<int:conversation_id>/unlock', methods=['POST'])
 @login_required
@@ -278,15 +322,8 @@ def place_bid(request_id):
         # Handle photo upload
         photo_filename = None
         if form.photo.data:
-            filename = secure_filename(form.photo.data.filename)
-            # Construct the absolute path to the upload directory
-            upload_dir_abs = os.path.join(current_app.root_path, BID_PHOTO_UPLOAD_FOLDER)
-            os.makedirs(upload_dir_abs, exist_ok=True) # Ensure the directory exists
-
-            # Construct the full absolute path to save the file
-            file_path_abs = os.path.join(upload_dir_abs, filename)
-            form.photo.data.save(file_path_abs)
-            photo_filename = os.path.join('/', BID_PHOTO_UPLOAD_FOLDER, filename).replace(os.sep, '/') # Store relative path for web access, ensure forward slashes
+            # Stores the photo content-addressed, queues the resized variants and returns the web path
+            photo_filename = save_image(form.photo.data)
         # Check if the dealer has enough points to place a bid.
         if current_user.points <= 0:
             flash('You do not have enough points to place an offer. Please purchase more points.', 'danger')
@@ -322,34 +359,19 @@ def place_bid(request_id):
         # --- Notify the customer who made the request ---
         request_description = f"'{car_request.make} {car_request.model}'" if car_request.make else f"request #{car_request.id}"
         notification_message = f"A dealer has placed an offer on your {request_description}."
-        notification = Notification(user_id=car_request.user_id, message=notification_message)
-        db.session.add(notification)
-        db.session.flush() # Flush to get the notification ID
-
-        # Now update the link with the notification ID
-        notification.link = url_for('request.request_detail', request_id=car_request.id, notification_id=notification.id)
+        pending_notifications = add_notifications([
+            NotificationItem(car_request.user_id, notification_message, url_for('request.request_detail', request_id=car_request.id))
+        ])
         db.session.commit()
 
         # --- Real-time Notification (send *after* commit) ---
-        # Get the new unread count for the customer
-        unread_count = Notification.query.filter_by(user_id=car_request.user_id, is_read=False).count()
-
-        # Create a dictionary with the notification data to send to the client
-        notification_data = {
-            'message': notification.message,
-            'link': notification.link,
-            'timestamp': notification.timestamp.isoformat() + 'Z', # Use ISO format for JavaScript
-            'count': unread_count
-        }
-        socketio.emit('new_notification', notification_data, room=str(car_request.user_id))
+        emit_notifications(pending_notifications)
 
         flash(f'Your offer of {form.price.data:,.2f} ETB has been sent to the customer!', 'success')
         return redirect(url_for('dealer.dashboard'))
 
     return render_template('place_dealer_bid.html', form=form, car_request=car_request, bids=existing_bids, now=datetime.utcnow())
 
-<<<<<<< HEAD
-=======
 @dealer_bp.route('/api/requests/<int:request_id>/bids', methods=['GET', 'POST'])
 @login_required
 @dealer_required
@@ -366,7 +388,7 @@ def api_place_dealer_bid(request_id):
 
     if request.method == 'GET':
         existing_bids = car_request.dealer_bids.order_by(DealerBid.price.asc()).all()
-        return jsonify(car_request=car_request.to_dict(), existing_bids=[bid.to_dict() for bid in existing_bids])
+        return jsonify(car_request=feed_item(car_request, True), existing_bids=[bid.to_dict() for bid in existing_bids])
 
     elif request.method == 'POST':
         data = request.get_json()
@@ -395,7 +417,7 @@ def api_place_dealer_bid(request_id):
 
         photo_filename = None
         if data.get('image_base64'):
-            photo_filename = save_base64_image(data['image_base64'], filename_prefix=f"dealer_bid_{car_request.id}")
+            photo_filename = save_base64_image(data['image_base64'])
         elif data.get('image_url'):
             photo_filename = data['image_url']
 
@@ -414,25 +436,20 @@ def api_place_dealer_bid(request_id):
             new_bid.images.append(new_image)
 
         current_user.points -= 1 # Deduct point
-        db.session.commit()
 
         # Notify the customer
         request_description = f"'{car_request.make} {car_request.model}'" if car_request.make else f"request #{car_request.id}"
         notification_message = f"A dealer has placed an offer on your {request_description}."
-        notification = Notification(user_id=car_request.user_id, message=notification_message)
-        db.session.add(notification)
-        db.session.flush()
-        notification.link = url_for('request.request_detail', request_id=car_request.id, notification_id=notification.id)
+        pending_notifications = add_notifications([
+            NotificationItem(car_request.user_id, notification_message, url_for('request.request_detail', request_id=car_request.id))
+        ])
         db.session.commit()
 
         # Real-time Notification
-        unread_count = Notification.query.filter_by(user_id=car_request.user_id, is_read=False).count()
-        notification_data = { 'message': notification.message, 'link': notification.link, 'timestamp': notification.timestamp.isoformat() + 'Z', 'count': unread_count }
-        socketio.emit('new_notification', notification_data, room=str(car_request.user_id))
+        emit_notifications(pending_notifications)
 
         return jsonify({'status': 'success', 'message': 'Your offer has been sent to the customer!', 'bid': new_bid.to_dict()}), 201
 
->>>>>>> de330f91 (fix(dealer): Correct dealer bid image handling and model relationships)
 @dealer_bp.route('/bid/<int:bid_id>/edit', methods=['GET', 'POST'])
 @login_required
 @dealer_required
@@ -452,17 +469,9 @@ def edit_bid(bid_id):
     form.submit.label.text = 'Update Offer' # Change button text
 
     if form.validate_on_submit():
-        # Handle photo upload on edit
-        photo_filename = bid.image_url # Keep existing photo if no new one is uploaded
+        # Handle photo upload on edit: a new photo replaces the existing ones (released through the ORM)
         if form.photo.data:
-            filename = secure_filename(form.photo.data.filename)            
-            upload_dir_abs = os.path.join(current_app.root_path, BID_PHOTO_UPLOAD_FOLDER)
-            os.makedirs(upload_dir_abs, exist_ok=True)
-
-            file_path_abs = os.path.join(upload_dir_abs, filename)
-            form.photo.data.save(file_path_abs)
-
-            photo_filename = os.path.join('/', BID_PHOTO_UPLOAD_FOLDER, filename).replace(os.sep, '/')
+            bid.images = [DealerBidImage(image_url=save_image(form.photo.data))]
 
         # Update the bid object with the new form data
         form.populate_obj(bid)
@@ -505,22 +514,13 @@ def answer_request_question(question_id):
 
         # Notify the buyer that their question was answered
         notification_message = f"The dealer has answered your question regarding their offer for request #{bid.car_request.id}."
-        notification = Notification(user_id=question.user_id, message=notification_message)
-        db.session.add(notification)
-        db.session.flush() # Get ID
-
-        notification.link = url_for('request.request_detail', request_id=bid.car_request.id, _anchor=f'qna-for-bid-{bid.id}', notification_id=notification.id)
+        pending_notifications = add_notifications([
+            NotificationItem(question.user_id, notification_message, url_for('request.request_detail', request_id=bid.car_request.id, _anchor=f'qna-for-bid-{bid.id}'))
+        ])
         db.session.commit()
 
         # --- Real-time Notification ---
-        unread_count = Notification.query.filter_by(user_id=question.user_id, is_read=False).count()
-        notification_data = {
-            'message': notification.message,
-            'link': notification.link,
-            'timestamp': notification.timestamp.isoformat() + 'Z',
-            'count': unread_count
-        }
-        socketio.emit('new_notification', notification_data, room=str(question.user_id))
+        emit_notifications(pending_notifications)
 
         flash("Your answer has been posted.", "success")
         # Redirect back to the dealer dashboard, which is a more logical flow.
@@ -1,14 +1,25 @@
-from flask import Blueprint, render_template, abort, jsonify, request, url_for
+from flask import Blueprint, render_template, abort, flash, jsonify, redirect, request, url_for
 from flask_login import current_user, login_required
 from functools import wraps
-import re
 from models.car import Car
+from models.auction import Auction
 from models.notification import Notification
 from models.conversation import Conversation
 from models.chat_message import ChatMessage
 from models.lead_score import LeadScore
 from extensions import db, socketio
-from sqlalchemy import or_, func
+from services.search import apply_car_search
+from services.autocomplete import suggest
+from services.listing_loader import car_listing_options, estimate_count, listing_page, listing_page_size, listing_response
+from services.response_cache import FEATURED_TAG, cached_response
+from services.similar_cars import similar_cars, similarity_reason
+from services.images import variant_url
+from services.moderation import contact_scanner
+from services.chat_history import chat_page_size, history_page, message_dict, messages_since
+from services.chat_jobs import chat_message_sent
+from services.jobs import job_queue
+from services.unread_counters import mark_messages_read, mark_notifications_read
+from sqlalchemy import or_
 
 def mark_notification_as_read(f):
     """
@@ -19,72 +30,44 @@ def mark_notification_as_read(f):
     def decorated_function(*args, **kwargs):
         notification_id = request.args.get('notification_id', type=int)
         if notification_id and current_user.is_authenticated:
-            notification = Notification.query.filter_by(id=notification_id, user_id=current_user.id).first()
-            if notification and not notification.is_read:
-                notification.is_read = True
+            if mark_notifications_read(current_user.id, [notification_id]):
                 db.session.commit()
         return f(*args, **kwargs)
     return decorated_function
 
 def get_similar_cars(car, listing_type_filter):
     """
-    Finds similar cars based on a hierarchy of criteria and returns them
-    along with a descriptive reason for the similarity.
+    Returns the car's most similar listings of the given type from the
+    precomputed similarity index, along with a descriptive reason for the similarity.
     """
-    similar_cars_dict = {}
-    base_query = Car.query.filter(
-        Car.id != car.id,
-        Car.is_approved == True,
-        Car.listing_type == listing_type_filter,
-        Car.is_active == True
-    )
-
-    def add_cars(cars_list):
-        for c in cars_list:
-            if len(similar_cars_dict) < 4 and c.id not in similar_cars_dict:
-                similar_cars_dict[c.id] = c
-
-    # 1. Same Make and Model
-    add_cars(base_query.filter(Car.make == car.make, Car.model == car.model).all())
-    if len(similar_cars_dict) > 0:
-        return list(similar_cars_dict.values())[:4], f"More {car.make} {car.model} Models"
-
-    # 2. Same Make and Body Type
-    add_cars(base_query.filter(Car.make == car.make, Car.body_type == car.body_type).all())
-    if len(similar_cars_dict) > 0:
-        return list(similar_cars_dict.values())[:4], f"More {car.make} {car.body_type}s"
-
-    # 3. Same Make
-    add_cars(base_query.filter(Car.make == car.make).all())
-    if len(similar_cars_dict) > 0:
-        return list(similar_cars_dict.values())[:4], f"More from {car.make}"
-
-    # 4. Fallback to any other random cars
-    add_cars(base_query.order_by(func.random()).limit(4).all())
-    return list(similar_cars_dict.values())[:4], "Other Available Listings"
-
-def mask_contact_info(message):
-    """
-    Detects and masks phone numbers in a message.
-    Returns the masked message and a boolean indicating if contact info was found.
-    """
-    # A list of patterns to detect various forms of contact information.
-    patterns = [
-        r'(?:\+251\s?|0)?9\d{2}\s?\d{3}\s?\d{3}',  # Ethiopian phone numbers with optional spaces
-        r'https?://\S+',                         # URLs (http, https)
-        r'\b(WhatsApp|Telegram|Instagram|Facebook|fb\.com|t\.me)\b' # Social media keywords
-    ]
-    
-    # Combine all patterns into a single regex, separated by '|' (OR)
-    combined_regex = '|'.join(patterns)
-    
-    # Use re.IGNORECASE to catch variations like 'whatsapp' or 'FACEBOOK'
-    masked_message, count = re.subn(combined_regex, '[Contact Info Hidden]', message, flags=re.IGNORECASE)
-    found_contact_info = count > 0
-    return masked_message, found_contact_info
+    similar = similar_cars(car, listing_type_filter)
+    return similar, similarity_reason(car, similar)
 
 main_bp = Blueprint('main', __name__)
 
+def _listing_card(car):
+    """Serializes a sale or auction car for the listing cards of the JSON APIs."""
+    # CRITICAL FIX: Calculate display_price before using it.
+    # This was missing and causing the endpoint to fail silently.
+    car.display_price = car.fixed_price if car.listing_type == 'sale' else (car.auction.current_price if car.auction else None)
+
+    detail_url = ''
+    if car.listing_type == 'auction' and car.auction:
+        detail_url = url_for('auctions.auction_detail', auction_id=car.auction.id)
+    elif car.listing_type == 'sale':
+        detail_url = url_for('main.car_detail', car_id=car.id)
+
+    return {
+        'id': car.id,
+        'year': car.year,
+        'make': car.make,
+        'model': car.model,
+        'price_display': f"{car.display_price:,.0f} ETB" if car.display_price else "N/A",
+        'image_url': variant_url(car.listing_image_url, 'card') or url_for('static', filename='img/default_car.png'),
+        'detail_url': detail_url,
+        'listing_type': car.listing_type
+    }
+
 def _get_featured_cars():
     """Helper function to fetch active, approved, featured cars."""
     return Car.query.filter_by(is_featured=True, is_approved=True, is_active=True).all()
@@ -94,24 +77,17 @@ def home():
     featured_cars = _get_featured_cars()
     return render_template('home.html', featured_cars=featured_cars)
 
-<<<<<<< HEAD
-=======
 @main_bp.route('/api/home')
+@cached_response(FEATURED_TAG)
 def api_home():
     """API endpoint for home screen data."""
-    return jsonify(featured_cars=[car.to_dict() for car in _get_featured_cars()])
+    return jsonify(featured_cars=[_listing_card(car) for car in _get_featured_cars()])
 
->>>>>>> ba0149e3 (fix(listings): Exclude rental cars from all listings page)
 @main_bp.route('/notifications')
 @login_required
 def notifications():
     """Displays a user's notifications and marks them as read."""
-    # Fetch the list of unread notifications first
-    unread = Notification.query.filter_by(user_id=current_user.id, is_read=False).all()
-    
-    # Mark only those specific notifications as read
-    for notification in unread:
-        notification.is_read = True
+    mark_notifications_read(current_user.id)
     db.session.commit()
 
     user_notifications = Notification.query.filter_by(user_id=current_user.id).order_by(Notification.timestamp.desc()).limit(50).all()
@@ -137,23 +113,21 @@ def view_buyer_conversation(conversation_id):
         abort(403)
 
     # Mark messages from dealer as read and emit a real-time update
-    unread_messages = conversation.messages.filter_by(sender_id=conversation.dealer_id, is_read=False).all()
-    if unread_messages:
-        for msg in unread_messages:
-            msg.is_read = True
+    if mark_messages_read(conversation, current_user.id):
         db.session.commit()
 
-        # Recalculate the total unread count and emit an update
-        total_unread = db.session.query(ChatMessage.id).join(Conversation, ChatMessage.conversation_id == Conversation.id).filter(Conversation.buyer_id == current_user.id, ChatMessage.sender_id != current_user.id, ChatMessage.is_read == False).count()
-        socketio.emit('message_count_update', {'count': total_unread}, room=str(current_user.id))
+        # Emit the updated total unread count
+        socketio.emit('message_count_update', {'count': current_user.unread_message_count}, room=str(current_user.id))
 
-    return render_template('buyer_conversation_detail.html', conversation=conversation)
+    # Only the newest page is rendered; older messages are loaded on demand from the history API.
+    messages, older_cursor = history_page(conversation.id)
+    return render_template('buyer_conversation_detail.html', conversation=conversation, messages=messages, older_cursor=older_cursor)
 
 @main_bp.route('/api/search_suggestions')
 def search_suggestions():
     """Provides search suggestions for makes and models."""
     # Base query to exclude rentals and only show active, approved cars
-    query = Car.query.filter(
+    query = Car.query.options(*car_listing_options()).filter(
         Car.listing_type != 'rental',
         Car.is_approved == True,
         Car.is_active == True
@@ -161,16 +135,7 @@ def search_suggestions():
 
     q = request.args.get('q', '').strip()
     if q and len(q) >= 2:
-        search_terms = q.lower().split()
-        conditions = []
-        for term in search_terms:
-            conditions.append(Car.make.ilike(f"%{term}%"))
-            conditions.append(Car.model.ilike(f"%{term}%"))
-            if term.isdigit():
-                conditions.append(Car.year == int(term))
-
-        if conditions:
-            query = query.filter(or_(*conditions))
+        query = apply_car_search(query, q)
 
     # Apply quick filters to the suggestions
     if condition := request.args.get('condition'):
@@ -181,12 +146,12 @@ def search_suggestions():
         query = query.filter(Car.body_type == body_type)
     if max_price := request.args.get('max_price', type=float):
         # This filter needs to check both fixed_price and auction price
-        query = query.outerjoin(Car.auction).filter(or_(Car.fixed_price <= max_price, Car.auction.current_price <= max_price))
+        query = query.outerjoin(Car.auction).filter(or_(Car.fixed_price <= max_price, Auction.current_price <= max_price))
 
     # Limit results for suggestions, but maybe fetch more for a full listing page
     # For now, we'll keep the limit consistent.
     # A more advanced implementation might use pagination here.
-    cars = query.order_by(Car.created_at.desc()).limit(50).all()
+    cars = query.order_by(Car.id.desc()).limit(50).all()
 
     results = []
     for car in cars:
@@ -205,7 +170,7 @@ def search_suggestions():
             'year': car.year,
             'make': car.make,
             'model': car.model,
-            'image_url': car.primary_image_url or url_for('static', filename='img/default_car.png'),
+            'image_url': variant_url(car.listing_image_url, 'thumb') or url_for('static', filename='img/default_car.png'),
             'detail_url': detail_url,
             'display_price': f"{display_price:,.0f} ETB" if display_price else "N/A",
             'listing_type': car.listing_type
@@ -213,6 +178,17 @@ def search_suggestions():
 
     return jsonify(results)
 
+@main_bp.route('/api/autocomplete')
+def autocomplete():
+    """Make/model completions for the search box, answered from the in-memory suggestion index."""
+    suggestions = suggest(request.args.get('q', '').strip())
+    return jsonify([{
+        'label': f"{make} {model}" if model else make,
+        'make': make,
+        'model': model,
+        'count': count
+    } for make, model, count in suggestions])
+
 @main_bp.route('/how-it-works')
 def how_it_works():
     """Displays the 'How It Works' informational page."""
@@ -242,20 +218,11 @@ def car_detail(car_id):
         similarity_reason=similarity_reason
     )
 
-@main_bp.route('/compare')
-def compare():
-    """Displays a side-by-side comparison of selected cars."""
-    car_ids_str = request.args.get('ids')
-    if not car_ids_str:
-        return redirect(url_for('main.all_listings'))
-
-    try:
-        # Sanitize input and convert to integers
-        car_ids = [int(id) for id in car_ids_str.split(',') if id.isdigit()]
-    except ValueError:
-        flash("Invalid comparison request.", "danger")
-        return redirect(url_for('main.all_listings'))
-
+def _get_comparison_data(car_ids):
+    """
+    Returns the cars with the given ids, in that order and each with a display_price,
+    along with the best price, mileage and year among them.
+    """
     # Fetch cars from the database, preserving the order of IDs
     cars = Car.query.filter(Car.id.in_(car_ids)).all()
     # Create a dictionary for quick lookups
@@ -300,8 +267,6 @@ def compare():
             elif year == best_values['year']['value']:
                 best_values['year']['ids'].append(car.id)
 
-<<<<<<< HEAD
-=======
     return sorted_cars, best_values
 
 @main_bp.route('/api/compare')
@@ -318,14 +283,15 @@ def api_compare():
     sorted_cars, best_values = _get_comparison_data(car_ids)
     
     return jsonify(
-        cars=[car.to_dict() for car in sorted_cars],
+        cars=[{**_listing_card(car), 'mileage': car.mileage} for car in sorted_cars],
         best_values=best_values
     )
 
 @main_bp.route('/api/listings')
+@cached_response('sales', 'auctions')
 def api_listings():
     """API endpoint to return filtered car data for sale/auction as JSON."""
-    query = Car.query.filter(
+    query = Car.query.options(*car_listing_options()).filter(
         Car.is_approved == True,
         Car.is_active == True,
         or_(Car.listing_type == 'sale', Car.listing_type == 'auction')
@@ -333,12 +299,7 @@ def api_listings():
 
     # Apply filters from request arguments
     if q := request.args.get('q'):
-        search_term = f"%{q}%"
-        query = query.filter(or_(
-            Car.make.ilike(search_term),
-            Car.model.ilike(search_term),
-            Car.year.like(search_term)
-        ))
+        query = apply_car_search(query, q)
 
     if condition := request.args.get('condition'):
         query = query.filter(Car.condition == condition)
@@ -351,35 +312,17 @@ def api_listings():
     if max_price := request.args.get('max_price', type=float):
         query = query.outerjoin(Car.auction).filter(or_(
             Car.fixed_price <= max_price,
-            Car.auction.current_price <= max_price
+            Auction.current_price <= max_price
         ))
 
-    query = query.order_by(Car.created_at.desc())
-    cars = query.all()
-
-    results = []
-    for car in cars:
-        # CRITICAL FIX: Calculate display_price before using it.
-        # This was missing and causing the endpoint to fail silently.
-        car.display_price = car.fixed_price if car.listing_type == 'sale' else (car.auction.current_price if car.auction else None)
-
-        detail_url = ''
-        if car.listing_type == 'auction' and car.auction:
-            detail_url = url_for('auctions.auction_detail', auction_id=car.auction.id)
-        elif car.listing_type == 'sale':
-            detail_url = url_for('main.car_detail', car_id=car.id)
+    try:
+        cars, next_cursor = listing_page(query, request.args.get('cursor'), listing_page_size(request.args.get('limit', type=int)))
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'Invalid cursor.'}), 400
+    total_estimate = estimate_count(query) if request.args.get('include_total') == 'true' else None
 
-        results.append({
-            'id': car.id,
-            'year': car.year,
-            'make': car.make,
-            'model': car.model,
-            'price_display': f"{car.display_price:,.0f} ETB" if car.display_price else "N/A",
-            'image_url': car.primary_image_url or url_for('static', filename='img/default_car.png'),
-            'detail_url': detail_url,
-            'listing_type': car.listing_type
-        })
-    return jsonify(results)
+    results = [_listing_card(car) for car in cars]
+    return jsonify(listing_response(results, next_cursor, total_estimate))
 
 @main_bp.route('/compare')
 def compare():
@@ -394,7 +337,6 @@ def compare():
         return redirect(url_for('main.all_listings'))
 
     sorted_cars, best_values = _get_comparison_data(car_ids)
->>>>>>> ba0149e3 (fix(listings): Exclude rental cars from all listings page)
     return render_template(
         'compare.html',
         cars=sorted_cars,
@@ -412,6 +354,9 @@ def send_chat_message():
     if not car_id or not message_body:
         return jsonify({'status': 'error', 'message': 'Missing car ID or message.'}), 400
 
+    # Scanned before any database work, so the transaction isn't held open for it
+    contact_scan = contact_scanner.mask(message_body)
+
     car = Car.query.get_or_404(car_id)
     dealer_id = car.owner_id
 
@@ -454,68 +399,39 @@ def send_chat_message():
     # Only mask if the conversation is not already unlocked
     if not conversation.is_unlocked:
         # Mask for both buyer and dealer before unlock
-        masked_body, is_serious = mask_contact_info(original_message)
-        message_body = masked_body
+        message_body = contact_scan.masked
+        is_serious = bool(contact_scan.matches)
         # Increment message count only for free messages
         conversation.message_count += 1
 
-    # --- Lead Scoring Logic ---
-    if is_serious:
-        # Buyer attempted to share contact info
-        conversation.lead_score.score += 30
-
     # Create and save the new message
     # We store the (potentially masked) body for display, and the original for when it's unlocked
     new_message = ChatMessage(body=message_body, original_body=original_message, sender_id=current_user.id)
     conversation.messages.append(new_message)
-    chat_message_data = {
-        'body': message_body, # Send the masked version to the UI
-        'sender_id': new_message.sender_id,
-        'sender_username': new_message.sender.username,
-        'timestamp': new_message.timestamp.isoformat() + 'Z'
-    }
+    db.session.flush() # Assigns the id clients resume their history sync from
+    # body is the masked version for the UI
+    chat_message_data = dict(message_dict(new_message), sender_username=current_user.username)
     conversation_room = f'conversation_{conversation.id}'
-
-    # --- Update Lead Score on Buyer Actions ---
-    if current_user.id == conversation.buyer_id:
-        # Check for message frequency to increase score
-        from datetime import datetime, timedelta
-        # Check if this is the 3rd message from the buyer in the last 24 hours
-        if conversation.messages.filter(ChatMessage.sender_id == current_user.id, ChatMessage.timestamp > datetime.utcnow() - timedelta(hours=24)).count() == 3:
-            conversation.lead_score.score += 20
+    from_buyer = current_user.id == conversation.buyer_id
+    # The other participant is notified with a link to their side of the conversation
+    if from_buyer:
+        link_url = url_for('dealer.view_conversation', conversation_id=conversation.id)
+    else:
+        link_url = url_for('main.view_buyer_conversation', conversation_id=conversation.id)
+    message_id = new_message.id
 
     db.session.commit()
 
     # --- Real-time Logic ---
-    # 1. Emit the new chat message to the conversation room
+    # The message reaches the conversation room now; lead scoring, the recipient's
+    # notification and unread count, and the serious-buyer alert follow in a background job.
     socketio.emit('new_chat_message', chat_message_data, room=conversation_room)
-
-    # 2. Send a traditional notification to the *other* person in the chat
-    if current_user.id == conversation.buyer_id: # Buyer is sending
-        recipient_id = conversation.dealer_id
-        notification_message = f"New message from {current_user.username} about your '{car.make} {car.model}'."
-        link_url = url_for('dealer.view_conversation', conversation_id=conversation.id)
-    else: # Dealer is sending
-        recipient_id = conversation.buyer_id
-        notification_message = f"New reply from {current_user.username} about the '{car.make} {car.model}'."
-        link_url = url_for('main.view_buyer_conversation', conversation_id=conversation.id)
-
-    if recipient_id:
-        # Emit a message count update to the recipient
-        unread_messages_count = db.session.query(ChatMessage.id).join(Conversation).filter(
-            or_(Conversation.buyer_id == recipient_id, Conversation.dealer_id == recipient_id),
-            ChatMessage.sender_id != recipient_id,
-            ChatMessage.is_read == False
-        ).count()
-        socketio.emit('message_count_update', {'count': unread_messages_count}, room=str(recipient_id))
-
-    # If contact info was found, emit a special event to the dealer's room
-    if is_serious:
-        socketio.emit('serious_buyer_detected', {'conversation_id': conversation.id}, room=str(dealer_id))
+    contact_types = sorted({match.category for match in contact_scan.matches}) if is_serious else []
+    job_queue.enqueue(chat_message_sent, message_id, contact_types, link_url)
 
     response_data = {'status': 'success', 'message': 'Message sent!'}
     # If the buyer's message was masked, add a flag to the response for the UI
-    if is_serious and current_user.id == conversation.buyer_id:
+    if is_serious and from_buyer:
         response_data['buyer_action_required'] = 'request_call'
 
     return jsonify(response_data)
@@ -541,18 +457,37 @@ def get_chat_history(car_id):
 
     if not conversation:
         # No history yet, return an empty list but indicate no conversation exists
-        return jsonify({'conversation_id': None, 'messages': []})
+        return jsonify({'conversation_id': None, 'messages': [], 'older_cursor': None})
 
-    messages = ChatMessage.query.filter_by(conversation_id=conversation.id).order_by(ChatMessage.timestamp.asc()).all()
+    return chat_history_response(conversation)
 
-    history = [
-        {
-            'body': msg.body,
-            'sender_id': msg.sender_id,
-            'timestamp': msg.timestamp.isoformat() + 'Z'
-        } for msg in messages
-    ]
+@main_bp.route('/chat/conversations/<int:conversation_id>/messages')
+@login_required
+def get_conversation_messages(conversation_id):
+    """API endpoint for one participant's view of a conversation's history (see chat_history_response)."""
+    conversation = Conversation.query.get_or_404(conversation_id)
+    if current_user.id not in (conversation.buyer_id, conversation.dealer_id):
+        abort(403)
+    return chat_history_response(conversation)
+
+def chat_history_response(conversation):
+    """
+    The newest page of a conversation's messages, or the page before ?cursor=
+    (the older_cursor of the previous response). With ?since=<message id>
+    only the messages after it are returned instead, so a reconnecting client
+    can fetch what it missed; 'complete' is false if it should ask again.
+    """
+    since = request.args.get('since', type=int)
+    if since is not None:
+        messages, complete = messages_since(conversation.id, since)
+        return jsonify({'conversation_id': conversation.id, 'messages': [message_dict(msg) for msg in messages], 'complete': complete})
+
+    try:
+        messages, older_cursor = history_page(conversation.id, request.args.get('cursor'), chat_page_size(request.args.get('limit', type=int)))
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'Invalid cursor.'}), 400
     return jsonify({
         'conversation_id': conversation.id,
-        'messages': history
-    })
\ No newline at end of file
+        'messages': [message_dict(msg) for msg in messages],
+        'older_cursor': older_cursor
+    })
@@ -1,6 +1,8 @@
 from flask import Blueprint, render_template, request, jsonify, url_for
-from sqlalchemy import or_
-from sqlalchemy.orm import joinedload
+from services.search import apply_car_search
+from services.response_cache import cached_response
+from services.images import variant_url
+from services.listing_loader import car_listing_options, estimate_count, listing_page, listing_page_size, listing_response
 from models.car import Car
 from extensions import db
 
@@ -24,6 +26,7 @@ def rental_detail(listing_id):
     return redirect(url_for('main.car_detail', car_id=listing_id))
 
 @rentals_bp.route('/api/filter')
+@cached_response('rentals')
 def api_filter_rentals():
     """API endpoint to return filtered rental car data as JSON."""
     query = Car.query.filter(
@@ -34,12 +37,7 @@ def api_filter_rentals():
 
     # Apply filters from request arguments
     if q := request.args.get('q'):
-        search_term = f"%{q}%"
-        query = query.filter(or_(
-            Car.make.ilike(search_term),
-            Car.model.ilike(search_term),
-            Car.year.like(search_term)
-        ))
+        query = apply_car_search(query, q)
 
     if condition := request.args.get('condition'):
         query = query.filter(Car.condition == condition)
@@ -54,13 +52,14 @@ def api_filter_rentals():
         from models.rental_listing import RentalListing
         query = query.join(RentalListing).filter(RentalListing.price_per_day <= max_price)
 
-    # Add sorting options if needed in the future
-    query = query.order_by(Car.id.desc()).options(
-        # Eager load the rental_listing to prevent N+1 queries
-        joinedload(Car.rental_listing)
-    )
+    # Eager load the rental listing, owner and first image to prevent N+1 queries
+    query = query.options(*car_listing_options())
 
-    cars = query.all()
+    try:
+        cars, next_cursor = listing_page(query, request.args.get('cursor'), listing_page_size(request.args.get('limit', type=int)))
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'Invalid cursor.'}), 400
+    total_estimate = estimate_count(query) if request.args.get('include_total') == 'true' else None
 
     results = [
         {
@@ -69,7 +68,7 @@ def api_filter_rentals():
             'make': car.make,
             'model': car.model,
             'price_display': f"{car.rental_listing.price_per_day:,.2f} ETB/day" if car.rental_listing else "N/A",
-            'image_url': car.primary_image_url or url_for('static', filename='img/default_car.png'),
+            'image_url': variant_url(car.listing_image_url, 'card') or url_for('static', filename='img/default_car.png'),
             'detail_url': url_for('rentals.rental_detail', listing_id=car.id),
             'is_featured': car.is_featured,
             'listing_type': 'Rental'
@@ -77,4 +76,4 @@ def api_filter_rentals():
         for car in cars
     ]
 
-    return jsonify(results)
\ No newline at end of file
+    return jsonify(listing_response(results, next_cursor, total_estimate))
\ No newline at end of file
@@ -3,7 +3,9 @@ from flask_login import login_required, current_user
 from models.car_request import CarRequest
 from models.dealer_bid import DealerBid
 from models.deal import Deal
-from extensions import db, socketio
+from extensions import db
+from services.notifications import NotificationItem, add_notifications, emit_notifications
+from services.dealer_matching import emit_new_request, notify_matching_dealers, split_makes
 from models.dealer_rating import DealerRating
 from models.notification import Notification
 from models.request_question import RequestQuestion
@@ -146,7 +148,10 @@ def step4_notes():
             user_id=current_user.id
         )
         db.session.add(new_req)
+        db.session.flush() # Get the request ID for the dealer notifications
+        pending_notifications = notify_matching_dealers(new_req)
         db.session.commit()
+        emit_new_request(new_req, pending_notifications)
         session.pop('car_request_data', None)
 
         # --- Check for matching cars and redirect ---
@@ -253,7 +258,10 @@ def step_guided_brand():
         )
         new_req = CarRequest(notes=notes, user_id=current_user.id)
         db.session.add(new_req)
+        db.session.flush() # Get the request ID for the dealer notifications
+        pending_notifications = notify_matching_dealers(new_req, makes=split_makes(form.brand.data))
         db.session.commit()
+        emit_new_request(new_req, pending_notifications)
         session.pop('car_request_data', None)
 
         # Redirect to the filtered "All Listings" page, not just auctions
@@ -324,26 +332,17 @@ def ask_dealer_question(bid_id):
             dealer_bid_id=bid.id
         )
         db.session.add(new_question)
-        db.session.commit()
+        db.session.flush() # Get the question ID for the notification link
 
         # Notify the dealer
         notification_message = f"A customer asked a question about your offer for request #{car_request.id}."
-        new_notification = Notification(user_id=bid.dealer_id, message=notification_message)
-        db.session.add(new_notification)
-        db.session.flush() # Get ID
-
-        new_notification.link = url_for('dealer.answer_request_question', question_id=new_question.id, notification_id=new_notification.id)
+        pending_notifications = add_notifications([
+            NotificationItem(bid.dealer_id, notification_message, url_for('dealer.answer_request_question', question_id=new_question.id))
+        ])
         db.session.commit()
 
         # --- Real-time Notification ---
-        unread_count = Notification.query.filter_by(user_id=bid.dealer_id, is_read=False).count()
-        notification_data = {
-            'message': new_notification.message,
-            'link': new_notification.link,
-            'timestamp': new_notification.timestamp.isoformat() + 'Z',
-            'count': unread_count
-        }
-        socketio.emit('new_notification', notification_data, room=str(bid.dealer_id))
+        emit_notifications(pending_notifications)
 
         return jsonify({'status': 'success', 'message': 'Your question has been sent to the dealer.'})
 
@@ -394,9 +393,7 @@ def accept_offer(bid_id):
             payment_method=payment_method
         )
         db.session.add(new_deal)
-
-        # We need to commit here to get the new_deal.id
-        db.session.commit()
+        db.session.flush() # Get the new_deal.id for the notification link
 
         # 5. Notify the dealer that their offer was accepted
         if car_request.make and car_request.model:
@@ -405,22 +402,14 @@ def accept_offer(bid_id):
             request_description = f"customer request #{car_request.id}"
 
         notification_message = f"Congratulations! Your offer for {request_description} was accepted by the customer."
-        deal_notification = Notification(user_id=bid_to_accept.dealer_id, message=notification_message)
-        db.session.add(deal_notification)
-        db.session.flush() # Get ID
-        deal_notification.link = url_for('request.deal_summary', deal_id=new_deal.id, notification_id=deal_notification.id)
+        pending_notifications = add_notifications([
+            NotificationItem(bid_to_accept.dealer_id, notification_message, url_for('request.deal_summary', deal_id=new_deal.id))
+        ])
 
-        db.session.commit() # Commit the notification
+        db.session.commit() # Commit the deal and the notification together
 
         # --- Real-time Notification ---
-        unread_count = Notification.query.filter_by(user_id=bid_to_accept.dealer_id, is_read=False).count()
-        notification_data = {
-            'message': deal_notification.message,
-            'link': deal_notification.link,
-            'timestamp': deal_notification.timestamp.isoformat() + 'Z',
-            'count': unread_count
-        }
-        socketio.emit('new_notification', notification_data, room=str(bid_to_accept.dealer_id))
+        emit_notifications(pending_notifications)
 
         flash('Offer accepted! The dealer has been notified and you can see the deal summary below.', 'success')
         return redirect(url_for('request.deal_summary', deal_id=new_deal.id))
@@ -1,5 +1,4 @@
-import os
-from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app
+from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import login_required, current_user
 from models.car import Car
 from models.question import Question
@@ -8,8 +7,8 @@ from models.rental_listing import RentalListing
 from models.equipment import Equipment
 from models.car_image import CarImage
 from extensions import db, socketio
+from services.images import save_image
 from datetime import datetime
-from werkzeug.utils import secure_filename
 
 from flask_wtf import FlaskForm
 from wtforms import (StringField, IntegerField, TextAreaField, SubmitField, FloatField, 
@@ -68,15 +67,10 @@ class AnswerForm(FlaskForm):
     submit = SubmitField('Post Answer')
 
 def save_seller_document(form_file_data):
-    """Helper function to save an uploaded document for sellers."""
+    """Helper function to save an uploaded car photo for sellers (its variants are generated in the background)."""
     if not form_file_data or not form_file_data.filename:
         return None
-    filename = secure_filename(form_file_data.filename)
-    upload_path = os.path.join(current_app.root_path, 'static/uploads')
-    os.makedirs(upload_path, exist_ok=True)
-    file_path = os.path.join(upload_path, filename)
-    form_file_data.save(file_path)
-    return url_for('static', filename=f'uploads/{filename}')
+    return save_image(form_file_data)
 
 
 @seller_bp.route('/dashboard')
@@ -238,7 +232,7 @@ def edit_car(car_id):
 
         # If new images are uploaded, replace the old ones.
         if form.images.data and form.images.data[0].filename:
-            CarImage.query.filter_by(car_id=car.id).delete()
+            car.images.clear() # Through the ORM, so the replaced files lose their references
             for image_file in form.images.data:
                 image_url = save_seller_document(image_file)
                 if image_url:
@@ -4,19 +4,19 @@ from flask_wtf import FlaskForm
 from wtforms import StringField, IntegerField, SelectField, TextAreaField, SubmitField, MultipleFileField
 from wtforms.validators import DataRequired, Length, NumberRange, Optional
 from flask_wtf.file import FileAllowed
-from werkzeug.utils import secure_filename
-import os
+from werkzeug.http import parse_content_range_header
 from datetime import datetime
-import base64
-import uuid
+import io
 
 from extensions import db
-from models.trade_in import TradeInRequest, TradeInPhoto
+from models.trade_in import TradeInRequest, TradeInPhoto, TradeInUpload
+from services.file_storage import Base64DecodingStream
+from services.images import save_image
+from services.trade_in_uploads import (MAX_CHUNK_BYTES, MAX_PHOTO_BYTES, TRADE_IN_MAX_PHOTOS, UploadError,
+                                       append_chunk, attach_uploads, start_upload)
 
 tradein_bp = Blueprint('tradein', __name__, url_prefix='/trade-in')
 
-TRADE_IN_UPLOAD_FOLDER = 'static/uploads/trade_ins'
-
 class TradeInForm(FlaskForm):
     """Form for users to submit their car for a trade-in valuation."""
     make = StringField('Car Make', validators=[DataRequired(), Length(max=50)])
@@ -41,20 +41,9 @@ def save_trade_in_photo(file):
     """Saves an uploaded photo for a trade-in and returns its web-accessible path."""
     if not file or file.filename == '':
         return None
-    
-    filename = secure_filename(file.filename)
-    upload_dir = os.path.join(current_app.root_path, TRADE_IN_UPLOAD_FOLDER)
-    os.makedirs(upload_dir, exist_ok=True)
-    
-    # Create a unique filename to avoid overwrites
-    unique_filename = f"{datetime.utcnow().strftime('%Y%m%d%H%M%S%f')}_{filename}"
-    file_path = os.path.join(upload_dir, unique_filename)
-    file.save(file_path)
-    
-    # Return the relative path for web access
-    return os.path.join('/', TRADE_IN_UPLOAD_FOLDER, unique_filename).replace(os.sep, '/')
+    return save_image(file)
 
-def save_base64_image(base64_string, filename_prefix="trade_in"):
+def save_base64_image(base64_string):
     """Decodes a base64 string and saves it as an image file, returning its web path."""
     if not base64_string:
         return None
@@ -62,16 +51,8 @@ def save_base64_image(base64_string, filename_prefix="trade_in"):
     try:
         # Split the header from the data (e.g., "data:image/jpeg;base64,")
         header, encoded = base64_string.split(",", 1)
-        image_data = base64.b64decode(encoded)
-        
-        # Create a unique filename
-        unique_filename = f"{filename_prefix}_{uuid.uuid4().hex}.jpeg"
-        upload_dir = os.path.join(current_app.root_path, TRADE_IN_UPLOAD_FOLDER)
-        os.makedirs(upload_dir, exist_ok=True)
-        file_path = os.path.join(upload_dir, unique_filename)
-        with open(file_path, "wb") as f:
-            f.write(image_data)
-        return os.path.join('/', TRADE_IN_UPLOAD_FOLDER, unique_filename).replace(os.sep, '/')
+        # Decoded a chunk at a time while it is written, rather than into one more copy in memory
+        return save_image(Base64DecodingStream(io.StringIO(encoded)), '.jpg')
     except Exception as e:
         current_app.logger.error(f"Could not save base64 image: {e}")
         return None
@@ -112,21 +93,99 @@ def submit_trade_in():
 
     return render_template('trade_in_form.html', form=form, title="Trade-in Your Car")
 
+@tradein_bp.route('/api/uploads', methods=['POST'])
+@login_required
+def api_start_photo_upload():
+    """
+    Opens a resumable upload for one trade-in photo (for mobile apps). The JSON
+    body gives the photo's size in bytes; the response's token is used to send
+    the photo in chunks and then to reference it from the trade-in submission.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        upload = start_upload(current_user.id, data.get('size'))
+    except UploadError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), e.status
+    db.session.commit()
+    return jsonify({
+        'status': 'success',
+        'upload': upload.to_dict(),
+        'upload_url': url_for('tradein.api_upload_photo_chunk', token=upload.token),
+        'max_chunk_bytes': MAX_CHUNK_BYTES
+    }), 201
+
+@tradein_bp.route('/api/uploads/<token>', methods=['GET'])
+@login_required
+def api_photo_upload_status(token):
+    """Reports how much of an upload has arrived, so an interrupted client knows where to resume."""
+    upload = TradeInUpload.query.filter_by(token=token, user_id=current_user.id).first()
+    if upload is None:
+        return jsonify({'status': 'error', 'message': 'Upload not found.'}), 404
+    return jsonify({'status': 'success', 'upload': upload.to_dict()})
+
+@tradein_bp.route('/api/uploads/<token>', methods=['PUT'])
+@login_required
+def api_upload_photo_chunk(token):
+    """
+    Receives one chunk of a photo as the raw request body, at the offset given
+    by a Content-Range header (or appended if there is none). Bodies sent with
+    Content-Transfer-Encoding: base64 are decoded as they stream in, and their
+    ranges count decoded bytes. The body is never read whole into memory.
+    """
+    upload = TradeInUpload.query.filter_by(token=token, user_id=current_user.id).first()
+    if upload is None:
+        return jsonify({'status': 'error', 'message': 'Upload not found.'}), 404
+
+    base64_encoded = request.headers.get('Content-Transfer-Encoding', '').lower() == 'base64'
+    max_body_bytes = MAX_CHUNK_BYTES * 4 // 3 + 4 if base64_encoded else MAX_CHUNK_BYTES
+    # Checked before reading anything, so an oversized body is refused without being received.
+    if request.content_length is None:
+        return jsonify({'status': 'error', 'message': 'Content-Length is required.'}), 411
+    if request.content_length > max_body_bytes:
+        return jsonify({'status': 'error', 'message': f'Chunks can be at most {MAX_CHUNK_BYTES} bytes.'}), 413
+
+    offset = upload.received
+    if 'Content-Range' in request.headers:
+        content_range = parse_content_range_header(request.headers['Content-Range'])
+        if content_range is None or content_range.units != 'bytes' or content_range.length not in (None, upload.size):
+            return jsonify({'status': 'error', 'message': 'Invalid Content-Range header.'}), 400
+        offset = content_range.start
+
+    try:
+        append_chunk(upload, request.stream, offset, base64_encoded=base64_encoded)
+    except UploadError as e:
+        db.session.commit() # Keep the progress made (or the discarded upload) for the client to resume from
+        return jsonify({'status': 'error', 'message': str(e), 'upload': upload.to_dict()}), e.status
+    db.session.commit()
+    return jsonify({'status': 'success', 'upload': upload.to_dict()})
+
 @tradein_bp.route('/api', methods=['POST'])
 @login_required
 def api_submit_trade_in():
-    """API endpoint for submitting a trade-in request (for mobile apps)."""
+    """
+    API endpoint for submitting a trade-in request (for mobile apps). Photos are
+    referenced by the tokens of completed uploads in 'photos'; the older
+    'images' list of base64 strings is still accepted for small submissions.
+    """
+    # Refuse oversized bodies before the JSON parser reads them into memory.
+    max_body_bytes = TRADE_IN_MAX_PHOTOS * MAX_PHOTO_BYTES * 4 // 3 + 64 * 1024
+    if request.content_length is not None and request.content_length > max_body_bytes:
+        return jsonify({'status': 'error', 'message': 'Upload photos through /trade-in/api/uploads and submit their tokens.'}), 413
+
     data = request.get_json()
     if not data:
         return jsonify({'status': 'error', 'message': 'Invalid JSON payload.'}), 400
 
     # --- Validation similar to the web form ---
-    required_fields = ['make', 'model', 'year', 'mileage', 'condition', 'images']
+    required_fields = ['make', 'model', 'year', 'mileage', 'condition']
     if not all(field in data for field in required_fields):
         return jsonify({'status': 'error', 'message': 'Missing required fields.'}), 400
-    
-    if not isinstance(data['images'], list) or not data['images']:
+
+    photos, images = data.get('photos'), data.get('images')
+    if not photos and (not isinstance(images, list) or not images):
         return jsonify({'status': 'error', 'message': 'At least one image is required.'}), 400
+    if images and len(images) > TRADE_IN_MAX_PHOTOS:
+        return jsonify({'status': 'error', 'message': f'At most {TRADE_IN_MAX_PHOTOS} photos can be submitted.'}), 400
 
     # NOTE: The following lines are commented out as the models do not exist yet.
     new_request = TradeInRequest(
@@ -141,14 +200,20 @@ def api_submit_trade_in():
         status='pending'
     )
     db.session.add(new_request)
-    db.session.flush()
-
-    # In a real API, you'd decode base64 images and save them.
-    for image_data in data['images']:
-        image_url = save_base64_image(image_data) # A helper function to handle base64
-        if image_url:
-            new_photo = TradeInPhoto(image_url=image_url, trade_in_request_id=new_request.id)
-            db.session.add(new_photo)
+
+    if photos:
+        try:
+            attach_uploads(new_request, current_user.id, photos)
+        except UploadError as e:
+            db.session.rollback()
+            return jsonify({'status': 'error', 'message': str(e)}), e.status
+    else:
+        db.session.flush()
+        for image_data in images:
+            image_url = save_base64_image(image_data) # A helper function to handle base64
+            if image_url:
+                new_photo = TradeInPhoto(image_url=image_url, trade_in_request_id=new_request.id)
+                db.session.add(new_photo)
     
     db.session.commit()
 
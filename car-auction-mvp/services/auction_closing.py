@@ -0,0 +1,199 @@
+import heapq
+import time
+from datetime import datetime
+from flask import url_for
+from sqlalchemy import select, update
+from extensions import db, socketio
+from models.auction import Auction
+from models.car import Car
+from services.autocomplete import mark_suggestions_stale
+from services.bidding import auction_room
+from services.notifications import NotificationItem, add_notifications, emit_notifications
+from services.response_cache import FEATURED_TAG, mark_listings_changed
+from services.similar_cars import refresh_similar_cars
+
+# Upper bound on how long the scheduler sleeps, so new and edited auctions are picked up promptly:
+# an auction whose end_time is moved earlier closes at most this late. Both refresh queries are indexed.
+REFRESH_INTERVAL = 1.0
+# Auctions closed (and notified) per transaction when many deadlines fall due together.
+CLOSE_BATCH_SIZE = 500
+
+
+def close_auctions(auction_ids, now=None):
+    """
+    Closes the given auctions whose end_time has passed, in one transaction.
+
+    Each auction is settled with a single UPDATE that copies highest_bidder_id
+    into winner_id and bumps the version, so a bid racing the close loses its
+    compare-and-set and is rejected on retry. The cars of closed auctions are
+    marked inactive and swapped out of the similar-car lists. Returns (closed_rows, rescheduled) where rescheduled maps
+    the id of every still-open auction whose end_time moved into the future
+    (e.g. a soft-close extension) to its new end_time.
+    """
+    now = now or datetime.utcnow()
+    rows = db.session.execute(
+        select(
+            Auction.id, Auction.end_time, Auction.current_price, Auction.bid_count,
+            Auction.highest_bidder_id, Car.id.label('car_id'), Car.owner_id, Car.year, Car.make, Car.model
+        )
+        .join(Car, Car.id == Auction.car_id)
+        .where(Auction.id.in_(auction_ids), Auction.closed_at.is_(None))
+        .with_for_update(of=Auction)
+    ).all()
+
+    closed = [row for row in rows if row.end_time <= now]
+    rescheduled = {row.id: row.end_time for row in rows if row.end_time > now}
+    if closed:
+        result = db.session.execute(
+            update(Auction)
+            .where(Auction.id.in_([row.id for row in closed]), Auction.closed_at.is_(None), Auction.end_time <= now)
+            .values(closed_at=now, winner_id=Auction.highest_bidder_id, version=Auction.version + 1)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount != len(closed):
+            # A soft-close bid extended some of these between the read and the update
+            # (possible where rows can't be locked); keep those open at their new end_time.
+            still_open = dict(db.session.execute(
+                select(Auction.id, Auction.end_time)
+                .where(Auction.id.in_([row.id for row in closed]), Auction.closed_at.is_(None))
+            ).all())
+            rescheduled.update(still_open)
+            closed = [row for row in closed if row.id not in still_open]
+        db.session.execute(
+            update(Car)
+            .where(Car.id.in_([row.car_id for row in closed]))
+            .values(is_active=False)
+            .execution_options(synchronize_session=False)
+        )
+        # The bulk UPDATE bypasses the flush listeners, so the closed cars are taken out of
+        # the similarity lists (and replaced there) explicitly.
+        refresh_similar_cars(db.session, [row.car_id for row in closed])
+        pending_notifications = add_notifications(_close_notification_items(closed))
+        mark_listings_changed(db.session, ('auctions', FEATURED_TAG))
+        mark_suggestions_stale(db.session)
+    else:
+        pending_notifications = []
+    db.session.commit()
+
+    # Only announce the results once they are durably committed.
+    broadcast_auction_closed(closed)
+    emit_notifications(pending_notifications)
+    return closed, rescheduled
+
+
+def _close_notification_items(closed):
+    """Winner and seller notifications for a batch of closed auctions."""
+    items = []
+    for row in closed:
+        car_name = f"{row.year} {row.make} {row.model}"
+        link = url_for('auctions.auction_detail', auction_id=row.id)
+        if row.highest_bidder_id is not None:
+            items.append(NotificationItem(
+                row.highest_bidder_id,
+                f"Congratulations! You won the auction for the {car_name} with a bid of {row.current_price:,.2f} ETB.",
+                link
+            ))
+            items.append(NotificationItem(row.owner_id, f"Your auction for the {car_name} has ended with a winning bid of {row.current_price:,.2f} ETB.", link))
+        else:
+            items.append(NotificationItem(row.owner_id, f"Your auction for the {car_name} has ended without any bids.", link))
+    return items
+
+
+def broadcast_auction_closed(closed):
+    """Emits auction_closed to the room of each closed auction."""
+    for row in closed:
+        socketio.emit('auction_closed', {
+            'auction_id': row.id,
+            'final_price': row.current_price,
+            'bid_count': row.bid_count,
+            'winner_id': row.highest_bidder_id
+        }, room=auction_room(row.id))
+
+
+class AuctionCloseScheduler:
+    """
+    Closes auctions at their deadlines from a min-heap of (end_time, auction_id).
+
+    The heap is loaded once from the open auctions and then kept current
+    incrementally: each refresh only reads auctions created since the last one
+    (by id) and open auctions that are already overdue (e.g. an end_time that
+    was edited to an earlier time, which is closed at most one refresh
+    interval late), both served by indexes. Entries whose
+    end_time changed since they were pushed are skipped when popped, and
+    auctions extended past their deadline are pushed again with the new time.
+    """
+
+    def __init__(self, refresh_interval=REFRESH_INTERVAL, batch_size=CLOSE_BATCH_SIZE):
+        self.refresh_interval = refresh_interval
+        self.batch_size = batch_size
+        self._heap = []
+        self._deadlines = {} # auction_id -> end_time of its live heap entry
+        self._last_seen_id = 0
+        self._last_refresh = None
+
+    def schedule(self, auction_id, end_time):
+        if self._deadlines.get(auction_id) == end_time:
+            return
+        self._deadlines[auction_id] = end_time
+        heapq.heappush(self._heap, (end_time, auction_id))
+
+    def refresh(self, now=None):
+        """Pushes newly created and overdue open auctions onto the heap."""
+        now = now or datetime.utcnow()
+        new_auctions = db.session.execute(
+            select(Auction.id, Auction.end_time)
+            .where(Auction.id > self._last_seen_id, Auction.closed_at.is_(None))
+            .order_by(Auction.id)
+        ).all()
+        overdue = db.session.execute(
+            select(Auction.id, Auction.end_time)
+            .where(Auction.closed_at.is_(None), Auction.end_time <= now)
+        ).all()
+        db.session.rollback() # Don't hold a read snapshot open while sleeping
+
+        for auction_id, end_time in new_auctions + overdue:
+            self.schedule(auction_id, end_time)
+        if new_auctions:
+            self._last_seen_id = max(self._last_seen_id, new_auctions[-1].id)
+        self._last_refresh = time.monotonic()
+
+    def pop_due(self, now):
+        """Removes and returns the ids of every heap entry whose deadline has passed."""
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            end_time, auction_id = heapq.heappop(self._heap)
+            if self._deadlines.get(auction_id) != end_time:
+                continue # Stale entry; the auction was rescheduled since
+            del self._deadlines[auction_id]
+            due.append(auction_id)
+        return due
+
+    def run_once(self, now=None):
+        """Closes every auction that is due now. Returns the number of auctions closed."""
+        now = now or datetime.utcnow()
+        if self._last_refresh is None or time.monotonic() - self._last_refresh >= self.refresh_interval:
+            self.refresh(now)
+
+        due = self.pop_due(now)
+        closed_count = 0
+        for start in range(0, len(due), self.batch_size):
+            closed, rescheduled = close_auctions(due[start:start + self.batch_size], now)
+            closed_count += len(closed)
+            for auction_id, end_time in rescheduled.items():
+                self.schedule(auction_id, end_time)
+        return closed_count
+
+    def seconds_until_next(self, now=None):
+        """How long to sleep before the next deadline or refresh, whichever comes first."""
+        now = now or datetime.utcnow()
+        wait = self.refresh_interval - (time.monotonic() - self._last_refresh)
+        if self._heap:
+            wait = min(wait, (self._heap[0][0] - now).total_seconds())
+        return max(wait, 0)
+
+    def run_forever(self, on_closed=None):
+        while True:
+            closed_count = self.run_once()
+            if closed_count and on_closed:
+                on_closed(closed_count)
+            time.sleep(self.seconds_until_next())
@@ -0,0 +1,293 @@
+import heapq
+import re
+import threading
+import time
+from collections import Counter
+from sqlalchemy import event, func, inspect, select
+from sqlalchemy.orm import Session
+from extensions import db
+from models.car import Car
+from services.response_cache import ALL_TAGS, response_cache
+
+MAX_SUGGESTIONS = 10
+# Queries shorter than this only match exactly; one typo in two letters matches nearly everything.
+FUZZY_MIN_LENGTH = 3
+MAX_EDIT_DISTANCE = 1
+# The index is rebuilt from the database at least this often (seconds), so changes committed by
+# other processes are picked up even when nothing signals them.
+REBUILD_INTERVAL = 300
+# How often (seconds) the listing cache tags are compared with the versions the index was built at;
+# with a shared RESPONSE_CACHE_URL that catches other workers' listing changes within this time.
+VERSION_CHECK_INTERVAL = 5
+
+# Spellings common in the Ethiopian market that are more than one edit away from
+# the canonical name (spacing differences such as "Landcruiser" need no entry,
+# since keys ignore spaces and punctuation).
+MARKET_SPELLINGS = {
+    'vitz': ('viz', 'vits', 'vitts'),
+    'landcruiser': ('lc', 'landcrusier', 'landcurser'),
+    'hilux': ('hilex', 'hailux'),
+    'corolla': ('carola', 'corola', 'karola'),
+    'mercedesbenz': ('benz', 'mercedes', 'mersedes'),
+    'volkswagen': ('vw', 'volks'),
+}
+
+
+def suggestion_key(text):
+    """Lowercase letters and digits only, so "Land Cruiser", "land-cruiser" and "Landcruiser" share a key."""
+    return re.sub(r'[^\w]|_', '', (text or '').lower())
+
+
+class _Node:
+    __slots__ = ('children', 'entries')
+
+    def __init__(self):
+        self.children = {}
+        self.entries = set()
+
+
+class SuggestionIndex:
+    """
+    A trie of make and make+model keys, each leading to (make, model) entries
+    with the number of listed cars behind them. Lookups are prefix walks that
+    tolerate MAX_EDIT_DISTANCE typos; counts are adjusted in place as this
+    process lists and unlists cars, and the whole index is rebuilt when it
+    may have missed changes (see suggest()).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._root = _Node()
+        self._counts = Counter() # (make_key, model_key or None) -> listed cars
+        self._labels = {}        # (make_key, model_key or None) -> (make, model) as first listed
+        self.is_built = False
+        self.built_at = 0
+        self.tag_versions = None # Listing cache tag versions read just before the last build
+        self.next_version_check = 0
+
+    def _insert(self, key, entry):
+        node = self._root
+        for char in key:
+            node = node.children.setdefault(char, _Node())
+        node.entries.add(entry)
+
+    def _add_keys(self, entry):
+        make_key, model_key = entry
+        keys = [make_key] if model_key is None else [make_key + model_key, model_key]
+        for canonical, spellings in MARKET_SPELLINGS.items():
+            if canonical in (make_key, model_key):
+                keys += [key.replace(canonical, spelling, 1) for key in keys for spelling in spellings]
+        for key in keys:
+            self._insert(key, entry)
+
+    def _adjust(self, make, model, delta):
+        make_key, model_key = suggestion_key(make), suggestion_key(model)
+        if not make_key:
+            return
+        entries = [((make_key, None), (make, None))]
+        if model_key:
+            entries.append(((make_key, model_key), (make, model)))
+        for entry, label in entries:
+            if entry not in self._labels:
+                self._labels[entry] = label
+                self._add_keys(entry)
+            self._counts[entry] += delta
+            if self._counts[entry] <= 0:
+                del self._counts[entry]
+
+    def build(self, rows, tag_versions=None):
+        """Replaces the index with [(make, model, count), ...], read when the listing tags were at tag_versions."""
+        with self._lock:
+            self._root, self._counts, self._labels = _Node(), Counter(), {}
+            for make, model, count in rows:
+                self._adjust(make, model, count)
+            self.is_built = True
+            self.built_at = time.monotonic()
+            self.tag_versions = tag_versions
+            self.next_version_check = self.built_at + VERSION_CHECK_INTERVAL
+
+    def invalidate(self):
+        """Has the next lookup rebuild the index, after changes it can't apply as deltas."""
+        self.is_built = False
+
+    def apply(self, deltas):
+        """Applies {(make, model): delta} from committed listing changes."""
+        with self._lock:
+            for (make, model), delta in deltas.items():
+                if delta:
+                    self._adjust(make, model, delta)
+
+    def _matching_nodes(self, key, max_distance):
+        """
+        Yields (edits, node) for trie nodes whose path spells key with at most
+        max_distance deletions, substitutions, insertions or adjacent swaps.
+        Edits branch out only while budget remains, so a lookup touches a few
+        hundred nodes at most instead of the whole trie.
+        """
+        stack = [(self._root, 0, 0)]
+        while stack:
+            node, i, edits = stack.pop()
+            if i == len(key):
+                yield edits, node
+                continue
+            if child := node.children.get(key[i]):
+                stack.append((child, i + 1, edits))
+            if edits >= max_distance:
+                continue
+            stack.append((node, i + 1, edits + 1)) # a typed character too many
+            for char, child in node.children.items():
+                stack.append((child, i, edits + 1)) # a character left out
+                if char != key[i]:
+                    stack.append((child, i + 1, edits + 1)) # a wrong character
+            if i + 1 < len(key) and (swapped := node.children.get(key[i + 1])):
+                if child := swapped.children.get(key[i]):
+                    stack.append((child, i + 2, edits + 1)) # two characters swapped
+
+    def suggest(self, query, limit=MAX_SUGGESTIONS):
+        """Returns up to `limit` [(make, model, count)] completing query, closest and most listed first."""
+        key = suggestion_key(query)
+        if not key:
+            return []
+        max_distance = MAX_EDIT_DISTANCE if len(key) >= FUZZY_MIN_LENGTH else 0
+
+        with self._lock:
+            # Closest matches are expanded first, so every subtree is walked once at its best distance,
+            # and typo matches are only looked at if the exact ones do not fill the page.
+            distances, visited, listed = {}, set(), 0
+            for distance, node in sorted(self._matching_nodes(key, max_distance), key=lambda match: match[0]):
+                if distance and listed >= limit:
+                    break
+                stack = [node]
+                while stack:
+                    current = stack.pop()
+                    if id(current) in visited:
+                        continue
+                    visited.add(id(current))
+                    for entry in current.entries:
+                        if entry not in distances:
+                            distances[entry] = distance
+                            listed += self._counts[entry] > 0
+                    stack.extend(current.children.values())
+            ranked = heapq.nsmallest(
+                limit,
+                (entry for entry in distances if self._counts[entry] > 0),
+                key=lambda entry: (distances[entry], entry[1] is not None, -self._counts[entry], entry)
+            )
+            return [(*self._labels[entry], self._counts[entry]) for entry in ranked]
+
+
+suggestion_index = SuggestionIndex()
+
+
+def is_listed(make, model, is_approved, is_active, listing_type):
+    """Whether a car with these values counts towards autocomplete (same scope as the search box)."""
+    return bool(is_approved and is_active and listing_type != 'rental')
+
+
+def listed_car_counts():
+    """[(make, model, count)] of every listed car, read once to build the index."""
+    return db.session.execute(
+        select(Car.make, Car.model, func.count(Car.id))
+        .where(Car.is_approved == True, Car.is_active == True, Car.listing_type != 'rental')
+        .group_by(Car.make, Car.model)
+    ).all()
+
+
+def _listing_tag_versions():
+    return response_cache.backend.tag_versions(ALL_TAGS) if response_cache.backend is not None else None
+
+
+def _index_is_current():
+    """
+    False once the index is invalidated, older than REBUILD_INTERVAL, or the
+    listing cache tags have moved since it was built (checked at most every
+    VERSION_CHECK_INTERVAL), e.g. because another process changed listings.
+    """
+    if not suggestion_index.is_built:
+        return False
+    now = time.monotonic()
+    if now >= suggestion_index.built_at + REBUILD_INTERVAL:
+        return False
+    if now < suggestion_index.next_version_check:
+        return True
+    suggestion_index.next_version_check = now + VERSION_CHECK_INTERVAL
+    return _listing_tag_versions() == suggestion_index.tag_versions
+
+
+def suggest(query, limit=MAX_SUGGESTIONS):
+    """Make/model suggestions for a partially typed query, (re)building the index when it may be out of date."""
+    if not _index_is_current():
+        # Versions first: a change landing during the read moves them again and triggers another rebuild.
+        tag_versions = _listing_tag_versions()
+        suggestion_index.build(listed_car_counts(), tag_versions)
+    return suggestion_index.suggest(query, limit)
+
+
+def mark_suggestions_stale(session):
+    """Rebuilds the index once the session commits; for listing changes made with bulk UPDATEs the ORM can't see."""
+    session.info['autocomplete_stale'] = True
+
+
+_LISTING_ATTRIBUTES = ('make', 'model', 'is_approved', 'is_active', 'listing_type')
+
+
+def _listing_before(car):
+    """The listing values a car had before this flush (its current values if they did not change)."""
+    state = inspect(car)
+    values = []
+    for name in _LISTING_ATTRIBUTES:
+        history = state.attrs[name].load_history()
+        values.append(history.deleted[0] if history.deleted else getattr(car, name))
+    return values
+
+
+def _listing_now(car):
+    """The listing values a car will have once flushed (column defaults fill in for unset values)."""
+    values = []
+    for name in _LISTING_ATTRIBUTES:
+        value = getattr(car, name)
+        default = Car.__table__.c[name].default
+        if value is None and default is not None and default.is_scalar:
+            value = default.arg
+        values.append(value)
+    return values
+
+
+@event.listens_for(Session, 'before_flush')
+def _collect_listing_changes(session, flush_context, instances):
+    """
+    Records how each flush changes the listed (make, model) counts. They are
+    applied to the in-memory index only once the transaction commits.
+    """
+    if not suggestion_index.is_built:
+        return
+    deltas = session.info.setdefault('autocomplete_deltas', Counter())
+    for obj in session.new:
+        if isinstance(obj, Car):
+            now = _listing_now(obj)
+            deltas[tuple(now[:2])] += is_listed(*now)
+    for obj in session.dirty:
+        if isinstance(obj, Car):
+            before, now = _listing_before(obj), _listing_now(obj)
+            if before != now:
+                deltas[tuple(before[:2])] -= is_listed(*before)
+                deltas[tuple(now[:2])] += is_listed(*now)
+    for obj in session.deleted:
+        if isinstance(obj, Car):
+            before = _listing_before(obj)
+            deltas[tuple(before[:2])] -= is_listed(*before)
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_listing_changes(session):
+    deltas = session.info.pop('autocomplete_deltas', None)
+    if session.info.pop('autocomplete_stale', False):
+        suggestion_index.invalidate()
+    elif deltas:
+        suggestion_index.apply(deltas)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_listing_changes(session):
+    session.info.pop('autocomplete_deltas', None)
+    session.info.pop('autocomplete_stale', None)
@@ -0,0 +1,207 @@
+from collections import namedtuple
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError, OperationalError
+from extensions import db, socketio
+from models.auction import Auction
+from models.bid import Bid
+from models.proxy_bid import ProxyBid
+
+# How many times a bid is re-validated after losing a race with a concurrent bid.
+MAX_BID_ATTEMPTS = 10
+
+BidOutcome = namedtuple('BidOutcome', ['accepted', 'message', 'bid'])
+
+
+def auction_room(auction_id):
+    """Name of the Socket.IO room that watchers of an auction are joined to."""
+    return f'auction_{auction_id}'
+
+
+def bid_increment():
+    """Minimum amount a new bid must beat the current price by once bidding has started."""
+    return current_app.config.get('AUCTION_BID_INCREMENT', 50000)
+
+
+def check_bid(auction_snapshot, user_id, amount, leader_max=None):
+    """
+    Validates a maximum bid against a point-in-time view of an auction.
+    leader_max is the current hidden maximum of the bidder, if they are leading.
+    Returns an error message, or None if the bid is acceptable.
+    """
+    if auction_snapshot.closed_at is not None or auction_snapshot.end_time <= datetime.utcnow():
+        return "This auction has ended."
+
+    if auction_snapshot.highest_bidder_id is not None and auction_snapshot.highest_bidder_id == user_id:
+        # The leader can only raise their hidden maximum.
+        if leader_max is not None and amount <= leader_max:
+            return f"Your maximum bid is already {leader_max:,.2f} ETB. Enter a higher amount to raise it."
+        if amount <= auction_snapshot.current_price:
+            return "You are already the highest bidder."
+        return None
+
+    increment = bid_increment()
+    if auction_snapshot.bid_count:
+        min_bid = auction_snapshot.current_price + increment
+        if amount < min_bid:
+            return f"Your bid must be at least {min_bid:,.2f} ETB ({increment:,} ETB increment)."
+    elif amount < auction_snapshot.start_price:
+        return f"The first bid must be at least the starting price of {auction_snapshot.start_price:,.2f} ETB."
+    return None
+
+
+def resolve_bids(auction_snapshot, top_proxies, increment):
+    """
+    Computes an auction's leader and price from its two highest proxy bids
+    (highest maximum first, earliest on ties). The leader pays one increment
+    over the runner-up's maximum, capped at their own maximum, and never less
+    than the price they would have had to bid by hand.
+    Returns (leader_id, price).
+    """
+    leader = top_proxies[0]
+    if not auction_snapshot.bid_count:
+        price = auction_snapshot.start_price
+    elif leader.user_id == auction_snapshot.highest_bidder_id:
+        price = auction_snapshot.current_price
+    else:
+        price = auction_snapshot.current_price + increment
+
+    if len(top_proxies) > 1:
+        price = max(price, top_proxies[1].max_amount + increment)
+    return leader.user_id, min(leader.max_amount, price)
+
+
+def soft_close_end_time(end_time, bid_time):
+    """
+    Returns the end_time an auction should have after a bid accepted at bid_time.
+    A bid inside the soft-close window pushes the end out so late bidders can respond.
+    """
+    window = timedelta(seconds=current_app.config.get('AUCTION_SOFT_CLOSE_SECONDS', 0))
+    if not window or end_time - bid_time > window:
+        return end_time
+    extension = timedelta(seconds=current_app.config.get('AUCTION_SOFT_CLOSE_EXTENSION_SECONDS') or window.total_seconds())
+    return max(end_time, bid_time + extension)
+
+
+def place_bid(auction_id, user_id, amount):
+    """
+    Atomically records a maximum (proxy) bid on an auction and resolves it.
+
+    The auction row is read (and locked, on databases that support it) together
+    with its version, the bid is validated against that snapshot, the bidder's
+    ProxyBid is upserted and the new leader and price are resolved from the two
+    highest proxies (an index range scan). A single Bid row is written for the
+    resulting price, and the auction is updated with a compare-and-set on the
+    version. If another bid was accepted in between, the update matches no row,
+    everything is rolled back and the bid is re-validated against the fresh
+    state, so a lower bid can never overwrite a higher one.
+    The denormalized bid_count/highest_bid_id/highest_bidder_id columns are
+    written by the same UPDATE, so they can never drift from the bid table.
+    A bid in the soft-close window extends end_time in that same UPDATE, so the
+    extension is always computed from the end_time the bid was validated against.
+    """
+    for _ in range(MAX_BID_ATTEMPTS):
+        try:
+            snapshot = db.session.execute(
+                select(
+                    Auction.id, Auction.start_price, Auction.current_price, Auction.end_time,
+                    Auction.version, Auction.bid_count, Auction.highest_bidder_id, Auction.closed_at
+                )
+                .where(Auction.id == auction_id)
+                .with_for_update()
+            ).one_or_none()
+            if snapshot is None:
+                db.session.rollback()
+                return BidOutcome(False, "This auction does not exist.", None)
+
+            proxy = ProxyBid.query.filter_by(auction_id=auction_id, user_id=user_id).first()
+            leader_max = proxy.max_amount if proxy and snapshot.highest_bidder_id == user_id else None
+            error = check_bid(snapshot, user_id, amount, leader_max=leader_max)
+            if error:
+                db.session.rollback()
+                return BidOutcome(False, error, None)
+
+            if proxy is None:
+                proxy = ProxyBid(auction_id=auction_id, user_id=user_id)
+                db.session.add(proxy)
+            proxy.max_amount = amount
+            proxy.placed_at = datetime.utcnow()
+            db.session.flush()
+
+            top_proxies = db.session.execute(
+                select(ProxyBid.user_id, ProxyBid.max_amount)
+                .where(ProxyBid.auction_id == auction_id)
+                .order_by(ProxyBid.max_amount.desc(), ProxyBid.placed_at.asc(), ProxyBid.id.asc())
+                .limit(2)
+            ).all()
+            leader_id, price = resolve_bids(snapshot, top_proxies, bid_increment())
+
+            values = {'version': Auction.version + 1}
+            new_bid = None
+            new_end_time = snapshot.end_time
+            if not (snapshot.bid_count and leader_id == snapshot.highest_bidder_id and price == snapshot.current_price):
+                # The price or leader moved: record one bid for this resolution step.
+                new_bid = Bid(amount=price, user_id=leader_id, auction_id=auction_id)
+                db.session.add(new_bid)
+                db.session.flush() # Get the bid ID for highest_bid_id
+                new_end_time = soft_close_end_time(snapshot.end_time, new_bid.timestamp)
+                values.update(
+                    current_price=price,
+                    bid_count=Auction.bid_count + 1,
+                    highest_bid_id=new_bid.id,
+                    highest_bidder_id=leader_id,
+                    end_time=new_end_time
+                )
+
+            result = db.session.execute(
+                update(Auction)
+                .where(Auction.id == auction_id, Auction.version == snapshot.version)
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount != 1:
+                # Lost the race to a concurrent bid; retry against the new price.
+                db.session.rollback()
+                continue
+
+            db.session.commit()
+            break
+        except OperationalError:
+            # SQLite reports write contention as "database is locked"; treat it like a lost race.
+            db.session.rollback()
+        except IntegrityError:
+            # A concurrent first bid by the same user (e.g. a double submit) created their ProxyBid
+            # first; the retry finds that row and updates it instead.
+            db.session.rollback()
+    else:
+        return BidOutcome(False, "The auction is very busy right now. Please try your bid again.", None)
+
+    if new_bid is None:
+        return BidOutcome(True, f"Your maximum bid has been raised to {amount:,.2f} ETB.", None)
+
+    # Only announce the bid once it is durably committed.
+    extended = new_end_time > snapshot.end_time
+    broadcast_auction_update(auction_id, extended=extended)
+    if leader_id == user_id:
+        message = f"You are the highest bidder at {price:,.2f} ETB. We'll bid for you up to your maximum of {amount:,.2f} ETB."
+    else:
+        message = f"You have been outbid by another bidder's maximum bid. The current price is {price:,.2f} ETB."
+    if extended:
+        message += " The auction has been extended to give other bidders a chance to respond."
+    return BidOutcome(True, message, new_bid)
+
+
+def broadcast_auction_update(auction_id, extended=False):
+    """Pushes a compact price/leader delta (and any soft-close extension) for an auction to everyone watching it."""
+    auction = db.session.get(Auction, auction_id)
+    leader = auction.highest_bidder
+    socketio.emit('auction_update', {
+        'auction_id': auction.id,
+        'current_price': auction.current_price,
+        'bid_count': auction.bid_count,
+        'leader_id': leader.id if leader else None,
+        'leader_username': leader.username if leader else None,
+        'end_time': auction.end_time.isoformat() + 'Z',
+        'extended': extended
+    }, room=auction_room(auction.id))
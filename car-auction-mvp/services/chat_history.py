@@ -0,0 +1,59 @@
+from sqlalchemy import select
+from extensions import db
+from models.chat_message import ChatMessage
+from services.pagination import decode_cursor, encode_cursor
+
+CHAT_PAGE_SIZE = 30
+MAX_CHAT_PAGE_SIZE = 100
+# Most messages one catch-up returns; a client further behind asks again from the last one it got.
+MAX_SYNC_MESSAGES = 200
+
+
+def chat_page_size(requested):
+    """Clamps a client-requested page size to 1..MAX_CHAT_PAGE_SIZE, defaulting to CHAT_PAGE_SIZE."""
+    if not requested or requested < 1:
+        return CHAT_PAGE_SIZE
+    return min(requested, MAX_CHAT_PAGE_SIZE)
+
+
+def message_dict(message):
+    """The JSON shape of a chat message, shared by the history API and the new_chat_message event."""
+    return {
+        'id': message.id,
+        'body': message.body,
+        'sender_id': message.sender_id,
+        'timestamp': message.timestamp.isoformat() + 'Z'
+    }
+
+
+def history_page(conversation_id, cursor=None, limit=CHAT_PAGE_SIZE):
+    """
+    One page of a conversation's history, walking back from the newest
+    message: the first page without a cursor, then the page before each
+    returned older_cursor. Messages come oldest first for display.
+
+    Each page is a range read of the (conversation_id, id) index.
+    Returns (messages, older_cursor); older_cursor is None on the first
+    message. Raises ValueError for a malformed cursor.
+    """
+    query = select(ChatMessage).where(ChatMessage.conversation_id == conversation_id)
+    if cursor:
+        query = query.where(ChatMessage.id < decode_cursor(cursor, int))
+    messages = db.session.scalars(query.order_by(ChatMessage.id.desc()).limit(limit + 1)).all()
+    older_cursor = encode_cursor(messages[limit - 1].id) if len(messages) > limit else None
+    return messages[:limit][::-1], older_cursor
+
+
+def messages_since(conversation_id, since_id, limit=MAX_SYNC_MESSAGES):
+    """
+    The messages posted after since_id, oldest first, for a client catching up
+    after a reconnect. Returns (messages, complete); complete is False when
+    more than limit were missed and the client should ask again from the last.
+    """
+    messages = db.session.scalars(
+        select(ChatMessage)
+        .where(ChatMessage.conversation_id == conversation_id, ChatMessage.id > since_id)
+        .order_by(ChatMessage.id)
+        .limit(limit + 1)
+    ).all()
+    return messages[:limit], len(messages) <= limit
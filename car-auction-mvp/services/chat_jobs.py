@@ -0,0 +1,71 @@
+from datetime import timedelta
+from sqlalchemy import func, select, update
+from extensions import db, socketio
+from models.chat_message import ChatMessage
+from models.lead_score import LeadScore
+from services.jobs import background_job
+from services.notifications import NotificationItem, add_notifications, emit_notifications
+from services.unread_counters import get_unread_counts
+
+# Lead score a conversation gains when a message tries to share contact details before the conversation is unlocked.
+CONTACT_ATTEMPT_SCORE = 30
+# ...and when the buyer sends their FREQUENT_BUYER_MESSAGES-th message within FREQUENT_BUYER_WINDOW.
+FREQUENT_BUYER_SCORE = 20
+FREQUENT_BUYER_MESSAGES = 3
+FREQUENT_BUYER_WINDOW = timedelta(hours=24)
+
+
+def _lead_score_gain(message, conversation, contact_types):
+    gain = CONTACT_ATTEMPT_SCORE if contact_types else 0
+    if message.sender_id == conversation.buyer_id:
+        # Counted up to this message, so the result doesn't depend on how soon the job runs.
+        recent_messages = db.session.scalar(
+            select(func.count(ChatMessage.id)).where(
+                ChatMessage.conversation_id == conversation.id,
+                ChatMessage.sender_id == message.sender_id,
+                ChatMessage.id <= message.id,
+                ChatMessage.timestamp > message.timestamp - FREQUENT_BUYER_WINDOW,
+            )
+        )
+        if recent_messages == FREQUENT_BUYER_MESSAGES:
+            gain += FREQUENT_BUYER_SCORE
+    return gain
+
+
+@background_job
+def chat_message_sent(message_id, contact_types, link):
+    """
+    The follow-up to a committed chat message: updates the conversation's lead
+    score, notifies the other participant (linking to link), pushes their new
+    unread-message count and, if contact details were masked (contact_types),
+    tells the dealer a serious buyer was detected.
+    """
+    message = db.session.get(ChatMessage, message_id)
+    if message is None:
+        return
+    conversation = message.conversation
+    from_buyer = message.sender_id == conversation.buyer_id
+    conversation_id, dealer_id = conversation.id, conversation.dealer_id
+    recipient_id = dealer_id if from_buyer else conversation.buyer_id
+
+    if gain := _lead_score_gain(message, conversation, contact_types):
+        # Added in SQL, as jobs for the same conversation may run concurrently.
+        db.session.execute(
+            update(LeadScore)
+            .where(LeadScore.conversation_id == conversation_id)
+            .values(score=LeadScore.score + gain)
+            .execution_options(synchronize_session=False)
+        )
+    car = conversation.car
+    if from_buyer:
+        notification_message = f"New message from {message.sender.username} about your '{car.make} {car.model}'."
+    else:
+        notification_message = f"New reply from {message.sender.username} about the '{car.make} {car.model}'."
+    pending_notifications = add_notifications([NotificationItem(recipient_id, notification_message, link)])
+    db.session.commit()
+
+    emit_notifications(pending_notifications)
+    _, unread_messages_count = get_unread_counts(recipient_id)
+    socketio.emit('message_count_update', {'count': unread_messages_count}, room=str(recipient_id))
+    if contact_types:
+        socketio.emit('serious_buyer_detected', {'conversation_id': conversation_id, 'contact_types': contact_types}, room=str(dealer_id))
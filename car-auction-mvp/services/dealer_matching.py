@@ -0,0 +1,76 @@
+import re
+from flask import url_for
+from sqlalchemy import func, or_, select, true, union
+from extensions import db, socketio
+from models.car import Car
+from models.dealer_interest import DealerInterest
+from models.user import User
+from services.notifications import NotificationItem, add_notifications, emit_notifications
+
+
+def normalize(value):
+    """Canonical form of a make/model for matching: trimmed, single-spaced, lowercase."""
+    return re.sub(r'\s+', ' ', value).strip().lower() if value else None
+
+
+def split_makes(text):
+    """Splits free-text brand preferences such as 'Toyota, Hyundai or Kia' into normalized makes."""
+    if not text:
+        return []
+    return [make for make in (normalize(part) for part in re.split(r',|/|;|\bor\b|\band\b', text, flags=re.IGNORECASE)) if make]
+
+
+def find_matching_dealers(makes, model=None, min_year=None):
+    """
+    Returns the ids of dealers interested in a request for one of `makes`.
+
+    A dealer matches if they declared an interest in the make (for any model
+    or this model, with a year range reaching min_year), declared interest in
+    any make, or stock that make in their inventory. Each branch is an index
+    lookup on the requested makes, so the cost grows with the number of
+    matches rather than with the number of dealers or cars.
+    """
+    makes = [normalize(make) for make in makes if normalize(make)]
+    model = normalize(model)
+
+    year_overlaps = true() if min_year is None else or_(DealerInterest.max_year.is_(None), DealerInterest.max_year >= min_year)
+    queries = [select(DealerInterest.dealer_id).where(DealerInterest.make.is_(None), year_overlaps)]
+    if makes:
+        model_matches = DealerInterest.model.is_(None) if model is None else or_(DealerInterest.model.is_(None), DealerInterest.model == model)
+        queries.append(select(DealerInterest.dealer_id).where(DealerInterest.make.in_(makes), model_matches, year_overlaps))
+        queries.append(select(Car.owner_id).where(func.lower(Car.make).in_(makes)))
+
+    candidates = union(*queries).subquery()
+    return set(db.session.execute(
+        select(User.id).join(candidates, User.id == candidates.c[0]).where(User.is_dealer == True)
+    ).scalars())
+
+
+def notify_matching_dealers(car_request, makes=None):
+    """
+    Notifies every matching dealer about a new CarRequest in the current transaction.
+    Returns the pending notifications to pass to emit_new_request() after commit.
+    """
+    if makes is None:
+        makes = [car_request.make] if car_request.make else []
+    dealer_ids = find_matching_dealers(makes, car_request.model, car_request.min_year)
+    dealer_ids.discard(car_request.user_id)
+
+    description = f"{car_request.make} {car_request.model}" if car_request.make and car_request.model else "a car"
+    message = f"A new customer request for {description} matches your interests."
+    link = url_for('dealer.place_bid', request_id=car_request.id)
+    return add_notifications([NotificationItem(dealer_id, message, link) for dealer_id in sorted(dealer_ids)])
+
+
+def emit_new_request(car_request, pending):
+    """Pushes the request to the matched dealers' dashboards and emits their notifications."""
+    emit_notifications(pending)
+    payload = {
+        'request_id': car_request.id,
+        'make': car_request.make,
+        'model': car_request.model,
+        'min_year': car_request.min_year,
+        'link': url_for('dealer.place_bid', request_id=car_request.id)
+    }
+    for notification in pending:
+        socketio.emit('new_car_request', payload, room=str(notification.user_id))
@@ -0,0 +1,261 @@
+import base64
+import hashlib
+import os
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from flask import current_app, url_for
+from sqlalchemy import bindparam, delete, event, func, inspect, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, object_session
+from werkzeug.utils import secure_filename
+from extensions import db
+from models.car_image import CarImage
+from models.dealer_bid_image import DealerBidImage
+from models.stored_file import StoredFile
+from models.trade_in import TradeInPhoto, TradeInUpload
+
+# Uploads are stored as static/<BLOBS_FOLDER>/<first two digest characters>/<digest><extension>.
+BLOBS_FOLDER = 'uploads/blobs'
+CHUNK_SIZE = 64 * 1024
+# Files younger than this are never removed, as the request that wrote them may not have committed yet.
+ORPHAN_GRACE_PERIOD = timedelta(minutes=5)
+# Models whose image_url references a StoredFile.
+REFERENCING_MODELS = (CarImage, DealerBidImage, TradeInPhoto, TradeInUpload)
+
+
+def normalized_extension(filename):
+    """The lower-cased extension of an uploaded filename ('' if it has none), with .jpeg spelled .jpg."""
+    extension = os.path.splitext(secure_filename(filename or ''))[1].lower()
+    return '.jpg' if extension == '.jpeg' else extension
+
+
+def blob_relpath(digest, extension):
+    """Where the blob with this digest is stored, relative to the static folder."""
+    return f'{BLOBS_FOLDER}/{digest[:2]}/{digest}{extension}'
+
+
+def blob_path(relpath):
+    return os.path.join(current_app.static_folder, *relpath.split('/'))
+
+
+def _url_relpath(url):
+    """The static-folder path behind a stored file's url."""
+    return url[len(current_app.static_url_path) + 1:]
+
+
+def _register(session, digest, url, size):
+    """Creates the StoredFile row for url unless it exists, tolerating a concurrent upload of the same content."""
+    values = {'digest': digest, 'url': url, 'size': size, 'ref_count': 0, 'created_at': datetime.utcnow()}
+    dialect = session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        dialect_insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+        session.execute(dialect_insert(StoredFile).values(**values).on_conflict_do_nothing(index_elements=['url']))
+    elif not session.execute(select(StoredFile.id).where(StoredFile.url == url)).first():
+        session.execute(insert(StoredFile).values(**values))
+
+
+class Base64DecodingStream:
+    """
+    A read-only binary stream of the bytes a base64 stream (bytes or text)
+    encodes, decoded a chunk at a time. Whitespace is ignored; malformed input
+    raises binascii.Error.
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._pending = b''
+
+    def read(self, size=CHUNK_SIZE):
+        if size is None or size < 0:
+            size = CHUNK_SIZE
+        encoded_size = max(4, (size + 2) // 3 * 4)
+        while True:
+            chunk = self._stream.read(encoded_size)
+            if isinstance(chunk, str):
+                chunk = chunk.encode('ascii')
+            data = self._pending + chunk.translate(None, b' \t\r\n')
+            if not chunk:
+                self._pending = b''
+                return base64.b64decode(data, validate=True) if data else b''
+            usable = len(data) - len(data) % 4
+            self._pending = data[usable:]
+            if usable:
+                return base64.b64decode(data[:usable], validate=True)
+
+
+def store_upload(stream, extension):
+    """
+    Streams an upload to disk while hashing it and stores it under its SHA-256,
+    so identical uploads share one file. The content is never held in memory
+    as a whole.
+
+    Returns (path, url, written): written is False when the file was already
+    stored. The StoredFile row starts with no references; saving an image row
+    with the url takes one, and the file is removed once none are left.
+    """
+    temporary_folder = os.path.join(current_app.static_folder, BLOBS_FOLDER)
+    os.makedirs(temporary_folder, exist_ok=True)
+    digest, size = hashlib.sha256(), 0
+    descriptor, temporary_path = tempfile.mkstemp(dir=temporary_folder, suffix='.part')
+    try:
+        with os.fdopen(descriptor, 'wb') as temporary_file:
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+                temporary_file.write(chunk)
+                size += len(chunk)
+
+        relpath = blob_relpath(digest.hexdigest(), extension)
+        path = blob_path(relpath)
+        url = url_for('static', filename=relpath)
+        _register(db.session, digest.hexdigest(), url, size)
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            # Refreshing the mtime keeps the existing copy out of reach of a concurrent cleanup.
+            os.utime(path)
+            written = False
+        except FileNotFoundError:
+            os.replace(temporary_path, path)
+            written = True
+        return path, url, written
+    finally:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+
+
+def remove_blob(path):
+    """Deletes a stored file together with its image variants."""
+    from services.images import IMAGE_VARIANTS, variant_relpath
+
+    folder, name = os.path.split(path)
+    for candidate in [path] + [os.path.join(folder, variant_relpath(name, variant)) for variant in IMAGE_VARIANTS]:
+        try:
+            os.remove(candidate)
+        except FileNotFoundError:
+            pass
+
+
+def _reference_changes(target):
+    """{url: change in the number of image rows referencing it} for the flush in progress."""
+    return object_session(target).info.setdefault('upload_reference_changes', Counter())
+
+
+def _reference_inserted(mapper, connection, target):
+    _reference_changes(target)[target.image_url] += 1
+
+
+def _reference_updated(mapper, connection, target):
+    history = inspect(target).attrs.image_url.history
+    if not history.added:
+        return
+    if history.deleted:
+        previous_url = history.deleted[0]
+    else:
+        # The old value was never loaded (e.g. expired by a commit); the row still holds it.
+        table = mapper.local_table
+        previous_url = connection.scalar(select(table.c.image_url).where(table.c.id == target.id))
+    if history.added[0] != previous_url:
+        _reference_changes(target)[history.added[0]] += 1
+        _reference_changes(target)[previous_url] -= 1
+
+
+def _reference_deleted(mapper, connection, target):
+    history = inspect(target).attrs.image_url.history
+    _reference_changes(target)[history.deleted[0] if history.deleted else target.image_url] -= 1
+
+
+# Mapper events rather than session.new/deleted, so rows removed as delete-orphans are counted too.
+for model in REFERENCING_MODELS:
+    event.listen(model, 'before_insert', _reference_inserted)
+    event.listen(model, 'before_update', _reference_updated)
+    event.listen(model, 'before_delete', _reference_deleted)
+
+
+@event.listens_for(Session, 'after_flush')
+def _maintain_reference_counts(session, flush_context):
+    """
+    Keeps StoredFile.ref_count in step with the image rows inserted, deleted
+    or repointed in each flush. Only ORM deletes are seen, so image rows must
+    not be removed with bulk Query.delete(). Rows that lose their last
+    reference are deleted and their files removed once the transaction commits.
+    """
+    changes = {url: change for url, change in session.info.pop('upload_reference_changes', {}).items() if url and change}
+    if not changes:
+        return
+
+    connection = session.connection()
+    connection.execute(
+        update(StoredFile).where(StoredFile.url == bindparam('file_url'))
+        .values(ref_count=StoredFile.ref_count + bindparam('change')),
+        [{'file_url': url, 'change': change} for url, change in changes.items()],
+    )
+    released = [url for url, change in changes.items() if change < 0]
+    if released:
+        orphaned = connection.execute(
+            delete(StoredFile).where(StoredFile.url.in_(released), StoredFile.ref_count <= 0).returning(StoredFile.url)
+        ).scalars().all()
+        session.info.setdefault('orphaned_uploads', set()).update(orphaned)
+
+
+@event.listens_for(Session, 'after_commit')
+def _remove_orphaned_uploads(session):
+    orphaned = session.info.pop('orphaned_uploads', None)
+    if not orphaned:
+        return
+    # An upload of the same content may have registered the url again since.
+    with db.engine.connect() as connection:
+        registered = set(connection.execute(select(StoredFile.url).where(StoredFile.url.in_(orphaned))).scalars())
+    cutoff = time.time() - ORPHAN_GRACE_PERIOD.total_seconds()
+    for url in orphaned - registered:
+        path = blob_path(_url_relpath(url))
+        try:
+            if os.path.getmtime(path) < cutoff:
+                remove_blob(path)
+        except FileNotFoundError:
+            pass
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_orphaned_uploads(session):
+    session.info.pop('upload_reference_changes', None)
+    session.info.pop('orphaned_uploads', None)
+
+
+def collect_garbage(session):
+    """
+    Recounts every StoredFile's references from the image tables, deletes the
+    rows nothing references and removes the files that have no row (both only
+    once older than ORPHAN_GRACE_PERIOD). Catches up after bulk deletes, uploads
+    whose request failed and files left inside the grace period.
+
+    Returns (rows_deleted, files_removed).
+    """
+    from services.images import VARIANTS_FOLDER
+
+    references = sum(
+        (select(func.count()).where(model.image_url == StoredFile.url).scalar_subquery() for model in REFERENCING_MODELS)
+    )
+    session.execute(update(StoredFile).values(ref_count=references).execution_options(synchronize_session=False))
+    cutoff = datetime.utcnow() - ORPHAN_GRACE_PERIOD
+    rows_deleted = session.execute(
+        delete(StoredFile).where(StoredFile.ref_count <= 0, StoredFile.created_at < cutoff)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    session.commit()
+
+    registered = {_url_relpath(url) for url in session.execute(select(StoredFile.url)).scalars()}
+    file_cutoff = time.time() - ORPHAN_GRACE_PERIOD.total_seconds()
+    files_removed = 0
+    root = blob_path(BLOBS_FOLDER)
+    for folder, subfolders, filenames in os.walk(root):
+        if VARIANTS_FOLDER in subfolders:
+            subfolders.remove(VARIANTS_FOLDER)
+        for filename in filenames:
+            path = os.path.join(folder, filename)
+            relpath = os.path.relpath(path, current_app.static_folder).replace(os.sep, '/')
+            if relpath not in registered and os.path.getmtime(path) < file_cutoff:
+                remove_blob(path)
+                files_removed += 1
+    return rows_deleted, files_removed
@@ -0,0 +1,123 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app, url_for
+from PIL import Image, ImageOps, UnidentifiedImageError, features
+from services.file_storage import normalized_extension, store_upload
+
+# Longest edge, in pixels, of each variant: thumbnails strips, listing cards and detail pages.
+IMAGE_VARIANTS = {'thumb': 160, 'card': 640, 'full': 1600}
+IMAGE_QUALITY = 80
+# Variants live in a folder next to their original, as <name>.<variant>.<ext>.
+VARIANTS_FOLDER = 'variants'
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.gif')
+VARIANT_FORMAT, VARIANT_EXTENSION = ('WEBP', '.webp') if features.check('webp') else ('JPEG', '.jpg')
+
+
+def variant_relpath(relpath, variant):
+    """Where a variant of the image at relpath (relative to a common root) is stored."""
+    folder, name = os.path.split(relpath)
+    return os.path.join(folder, VARIANTS_FOLDER, f"{os.path.splitext(name)[0]}.{variant}{VARIANT_EXTENSION}")
+
+
+def variant_url(image_url, variant):
+    """
+    The URL of an uploaded image's variant, or image_url itself until the
+    pipeline has written that variant (or for images outside /static).
+    """
+    static_prefix = current_app.static_url_path + '/'
+    if not image_url or variant not in IMAGE_VARIANTS or not image_url.startswith(static_prefix):
+        return image_url
+    relpath = variant_relpath(image_url[len(static_prefix):], variant)
+    if not os.path.exists(os.path.join(current_app.static_folder, relpath)):
+        return image_url
+    return url_for('static', filename=relpath.replace(os.sep, '/'))
+
+
+def _save_atomically(image, path, image_format, **options):
+    temporary_path = f"{path}.tmp"
+    image.save(temporary_path, image_format, **options)
+    os.replace(temporary_path, path)
+
+
+def generate_variants(path):
+    """
+    Writes every variant of the image at path, upright and without metadata,
+    then strips the EXIF block (camera details, GPS position) from the original.
+    Raises OSError if the file is not a readable image.
+    """
+    with Image.open(path) as original:
+        original_format, has_exif = original.format, bool(original.getexif())
+        image = ImageOps.exif_transpose(original)
+        has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+        image = image.convert('RGBA' if has_alpha and VARIANT_FORMAT == 'WEBP' else 'RGB')
+
+    folder = os.path.join(os.path.dirname(path), VARIANTS_FOLDER)
+    os.makedirs(folder, exist_ok=True)
+    options = {'quality': IMAGE_QUALITY, 'method': 6} if VARIANT_FORMAT == 'WEBP' else {'quality': IMAGE_QUALITY, 'optimize': True, 'progressive': True}
+    for variant, size in IMAGE_VARIANTS.items():
+        resized = image.copy()
+        resized.thumbnail((size, size), Image.LANCZOS)
+        _save_atomically(resized, os.path.join(os.path.dirname(path), variant_relpath(os.path.basename(path), variant)), VARIANT_FORMAT, **options)
+
+    if has_exif and original_format in ('JPEG', 'WEBP', 'PNG'):
+        if original_format == 'JPEG' and image.mode == 'RGBA':
+            image = image.convert('RGB')
+        _save_atomically(image, path, original_format, **({'quality': 95} if original_format != 'PNG' else {}))
+
+
+def has_variants(path):
+    folder, name = os.path.split(path)
+    return all(os.path.exists(os.path.join(folder, variant_relpath(name, variant))) for variant in IMAGE_VARIANTS)
+
+
+class ImagePipeline:
+    """
+    Generates image variants on a pool of worker threads, so an upload request
+    returns as soon as the original is on disk. With IMAGE_WORKERS = 0 images
+    are processed inline instead.
+    """
+
+    def __init__(self, app=None):
+        self._executor = None
+        self._logger = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        workers = app.config.get('IMAGE_WORKERS', 2)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='image-pipeline') if workers else None
+        self._logger = app.logger
+        app.extensions['image_pipeline'] = self
+
+    def process(self, path):
+        """Generates the variants of one image now; returns False (and logs) if it can't be read."""
+        try:
+            generate_variants(path)
+            return True
+        except (OSError, UnidentifiedImageError, Image.DecompressionBombError) as e:
+            if self._logger:
+                self._logger.warning(f"Could not generate image variants for {path}: {e}")
+            return False
+
+    def submit(self, path):
+        """Queues an image for variant generation."""
+        if self._executor is None:
+            return self.process(path)
+        return self._executor.submit(self.process, path)
+
+
+image_pipeline = ImagePipeline()
+
+
+def save_image(file, extension=None):
+    """
+    Stores an uploaded image (a FileStorage, or a binary stream with its
+    extension) content-addressed, queues its variants unless that content was
+    already processed, and returns its web path.
+    """
+    if extension is None:
+        extension = normalized_extension(file.filename)
+    path, url, written = store_upload(getattr(file, 'stream', file), extension)
+    if written or not has_variants(path):
+        image_pipeline.submit(path)
+    return url
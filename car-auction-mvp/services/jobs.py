@@ -0,0 +1,120 @@
+import json
+import queue
+import threading
+from extensions import db
+
+# name -> function, filled in by @background_job; a broker only carries the name and the arguments.
+JOBS = {}
+# Longest a worker blocks waiting on the broker, in seconds, so it notices when it is asked to stop.
+POLL_TIMEOUT = 5
+
+
+def background_job(function):
+    """Registers a function as a job. Its arguments must be JSON-serializable (ids rather than models)."""
+    function.job_name = f'{function.__module__}.{function.__name__}'
+    JOBS[function.job_name] = function
+    return function
+
+
+class LocalJobBroker:
+    """In-process stand-in for a broker: jobs queued here are lost if the process exits before they run."""
+
+    def __init__(self):
+        self._queue = queue.Queue()
+
+    def push(self, payload):
+        self._queue.put(payload)
+
+    def pop(self, timeout):
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class RedisJobBroker:
+    """A Redis list shared by every process, so jobs survive a restart and any worker can run them."""
+
+    def __init__(self, url, key='mekina:jobs'):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("JOB_QUEUE_URL points at Redis but the 'redis' package is not installed.") from e
+        self._redis = redis.Redis.from_url(url)
+        self._key = key
+
+    def push(self, payload):
+        self._redis.lpush(self._key, payload)
+
+    def pop(self, timeout):
+        item = self._redis.brpop(self._key, timeout=timeout)
+        return item[1] if item else None
+
+
+class JobQueue:
+    """
+    Runs side effects of a request (scoring, notifications, socket emits) on a
+    pool of worker threads once the request's transaction has committed, so
+    the response doesn't wait for them.
+
+    Jobs go through a broker: a per-process queue by default, or Redis when
+    JOB_QUEUE_URL is set, in which case `flask run-jobs` can work through them
+    in a separate process. Workers start with the first job a process queues.
+    With JOB_WORKERS = 0 and no broker URL jobs run inline instead.
+    """
+
+    def __init__(self, app=None):
+        self.broker = None
+        self._app = None
+        self._workers = 0
+        self._threads = []
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        url = app.config.get('JOB_QUEUE_URL')
+        self._workers = app.config.get('JOB_WORKERS', 2)
+        self.broker = RedisJobBroker(url) if url else (LocalJobBroker() if self._workers else None)
+        self._app = app
+        app.extensions['job_queue'] = self
+
+    def enqueue(self, function, *args):
+        """Queues function(*args); call it only after committing whatever the job reads."""
+        if self.broker is None:
+            return self.run(function.job_name, args)
+        self.broker.push(json.dumps({'job': function.job_name, 'args': args}))
+        self._start_workers()
+
+    def run(self, name, args):
+        """Runs one job now. A failure is logged rather than raised, and its transaction rolled back."""
+        try:
+            JOBS[name](*args)
+        except Exception:
+            db.session.rollback()
+            self._app.logger.exception(f"Background job {name} failed")
+
+    def work(self, stop=None):
+        """Runs queued jobs, each in its own app context, until stop (a threading.Event) is set."""
+        while stop is None or not stop.is_set():
+            payload = self.broker.pop(POLL_TIMEOUT)
+            if payload is None:
+                continue
+            job = json.loads(payload)
+            with self._app.app_context():
+                self.run(job['job'], job['args'])
+
+    def _start_workers(self):
+        if self._threads or not self._workers:
+            return
+        with self._lock:
+            if not self._threads:
+                self._threads = [
+                    threading.Thread(target=self.work, name=f'job-worker-{index}', daemon=True)
+                    for index in range(self._workers)
+                ]
+                for thread in self._threads:
+                    thread.start()
+
+
+job_queue = JobQueue()
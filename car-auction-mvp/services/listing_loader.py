@@ -0,0 +1,105 @@
+import json
+from sqlalchemy import func, select
+from sqlalchemy.orm import contains_eager, joinedload, with_expression
+from extensions import db
+from models.auction import Auction
+from models.car import Car
+from models.car_image import CarImage
+from services.pagination import decode_cursor, encode_cursor
+
+LISTING_PAGE_SIZE = 24
+MAX_LISTING_PAGE_SIZE = 100
+# Above this many matches, count estimates on backends without planner statistics stop counting.
+COUNT_ESTIMATE_CAP = 1000
+
+
+def primary_image_url():
+    """Correlated subquery for the URL of a car's first uploaded image (what Car.primary_image_url shows)."""
+    return (
+        select(CarImage.image_url)
+        .where(CarImage.car_id == Car.id)
+        .order_by(CarImage.id)
+        .limit(1)
+        .correlate(Car)
+        .scalar_subquery()
+    )
+
+
+def car_listing_options():
+    """
+    Loader options for Car queries behind listing cards: the auction, rental
+    listing and owner come in the same SELECT and the first image as a column
+    (Car.listing_image_url), so a page of cars is one query however long it is.
+    """
+    return (
+        joinedload(Car.auction),
+        joinedload(Car.rental_listing),
+        joinedload(Car.owner),
+        with_expression(Car.listing_image_url, primary_image_url()),
+    )
+
+
+def auction_listing_options():
+    """The same as car_listing_options() for Auction queries that already join Car."""
+    return (
+        contains_eager(Auction.car).options(
+            joinedload(Car.owner),
+            with_expression(Car.listing_image_url, primary_image_url()),
+        ),
+    )
+
+
+def owner_role(owner):
+    """The badge shown on a listing card for the kind of account that listed it."""
+    if owner.is_admin:
+        return 'Admin'
+    if owner.is_dealer:
+        return 'Dealer'
+    if owner.is_rental_company:
+        return 'Rental'
+    return None
+
+
+def listing_page_size(requested):
+    """The page size to serve for a requested ?limit=, clamped to 1..MAX_LISTING_PAGE_SIZE."""
+    return min(max(requested or LISTING_PAGE_SIZE, 1), MAX_LISTING_PAGE_SIZE)
+
+
+def listing_page(query, cursor=None, limit=LISTING_PAGE_SIZE):
+    """
+    One page of a Car query, newest first, keyed on Car.id.
+
+    Returns (cars, next_cursor); next_cursor is None on the last page. Each page
+    seeks past the cursor on the primary key rather than OFFSET-ing, so page 500
+    costs the same as page 1 and rows inserted meanwhile are neither skipped nor
+    repeated. Raises ValueError for a malformed cursor.
+    """
+    if cursor:
+        query = query.filter(Car.id < decode_cursor(cursor, int))
+    cars = query.order_by(Car.id.desc()).limit(limit + 1).all()
+    next_cursor = encode_cursor(cars[limit - 1].id) if len(cars) > limit else None
+    return cars[:limit], next_cursor
+
+
+def estimate_count(query):
+    """
+    A cheap estimate of how many rows a query matches: the planner's row
+    estimate on PostgreSQL, elsewhere an exact count that stops at
+    COUNT_ESTIMATE_CAP. Good enough for "about N results", never for paging.
+    """
+    statement = query.statement.with_only_columns(Car.id).order_by(None)
+    if db.engine.dialect.name == 'postgresql':
+        compiled = statement.compile(dialect=db.engine.dialect)
+        plan = db.session.connection().exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params).scalar()
+        plan = json.loads(plan) if isinstance(plan, str) else plan
+        return int(plan[0]['Plan']['Plan Rows'])
+    capped = statement.limit(COUNT_ESTIMATE_CAP).subquery()
+    return db.session.execute(select(func.count()).select_from(capped)).scalar()
+
+
+def listing_response(listings, next_cursor=None, total_estimate=None):
+    """The JSON body shared by the paginated listing endpoints."""
+    body = {'listings': listings, 'next_cursor': next_cursor}
+    if total_estimate is not None:
+        body['total_estimate'] = total_estimate
+    return body
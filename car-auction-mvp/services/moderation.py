@@ -0,0 +1,158 @@
+import json
+import os
+import re
+import time
+from collections import namedtuple
+
+# What a masked piece of contact information is replaced with.
+CONTACT_PLACEHOLDER = '[Contact Info Hidden]'
+# How often, in seconds, CONTACT_PATTERNS_FILE is checked for changes.
+RELOAD_CHECK_INTERVAL = 5
+
+# Between the digits of a phone number: spaces, dots, dashes, slashes and brackets, a few at a time.
+_GAP = r'[\s.\-_/()]{0,3}'
+
+# {category: [regex]}, matched case-insensitively against the normalized message, and only
+# from the start of a token. A CONTACT_PATTERNS_FILE holding JSON of the same shape replaces these.
+DEFAULT_CONTACT_PATTERNS = {
+    'phone': [
+        # Ethiopian mobile numbers, 09/07 or +251 9/7 followed by eight digits, however they are spaced
+        rf'(?:(?:\+|00)?2{_GAP}5{_GAP}1{_GAP}|0{_GAP})?[79](?:{_GAP}\d){{8}}(?!\d)',
+    ],
+    'email': [
+        r'[\w.+-]+\s*(?:@|\(at\)|\[at\])\s*[\w-]+(?:\.[\w-]+)+',
+    ],
+    'url': [
+        r'(?:https?://|www\.)\S+',
+        # Bare or spelled-out domains: example.com, example dot com, example(dot)com, t.me/handle.
+        # A literal dot must not have spaces around it, or "negotiable. Me" would read as a domain.
+        r'[\w-]+(?:\.|\s*(?:\(dot\)|\[dot\])\s*|\s+dot\s+)(?:com|net|org|et|me|io|co|info|biz)\b(?:/\S*)?',
+    ],
+    'social': [
+        r'(?:whats\s*app|telegram|instagram|facebook|tik\s*tok|viber|fb\.com|t\.me|wa\.me)\b',
+        r'@[A-Za-z0-9_]{3,32}\b',
+    ],
+}
+
+# Something every match of DEFAULT_CONTACT_PATTERNS contains: eight digits, an '@' or '/', a dot
+# before a letter, "dot", "(at)" or a platform name. Most chat messages have none of these and
+# skip the full scan; keep it in step with the patterns above.
+DEFAULT_CONTACT_HINTS = r'\d(?:[\s.\-_/()]{0,3}\d){7}|[@/]|\.\w|dot|\(at\)|\[at\]|whats|telegram|instagram|facebook|tik\s*tok|viber'
+
+# Ethiopic numerals (፩-፱) read as the digits they stand for, and zero-width characters used
+# to split numbers as spaces. Every replacement is one character, so match spans line up
+# with the original message.
+_NORMALIZATION = str.maketrans({
+    **{chr(0x1369 + value - 1): str(value) for value in range(1, 10)},
+    **{character: ' ' for character in '\u200b\u200c\u200d\u2060\ufeff'},
+})
+
+ContactMatch = namedtuple('ContactMatch', ['category', 'start', 'end', 'text'])
+ContactScan = namedtuple('ContactScan', ['masked', 'matches'])
+
+
+def compile_contact_patterns(patterns):
+    """
+    Compiles {category: [regex]} into one alternation with a named group per
+    pattern, so a message is scanned once for every category, and the
+    alternation is only tried where a token starts. Raises re.error for an
+    invalid pattern and ValueError for a malformed pattern set.
+    """
+    if not isinstance(patterns, dict) or not patterns:
+        raise ValueError("Contact patterns must map categories to lists of regular expressions.")
+    alternatives = []
+    for category, category_patterns in patterns.items():
+        if not re.fullmatch(r'[a-z]+', category) or not isinstance(category_patterns, list):
+            raise ValueError(f"Invalid contact pattern category: {category!r}")
+        alternatives += [f'(?P<{category}_{index}>{pattern})' for index, pattern in enumerate(category_patterns)]
+    return re.compile(rf"(?<![\w.+-])(?:{'|'.join(alternatives)})", re.IGNORECASE)
+
+
+class ContactScanner:
+    """
+    Finds contact information (phone numbers, emails, URLs, social handles) in
+    chat messages with patterns compiled once. When the app sets
+    CONTACT_PATTERNS_FILE, the patterns are read from it and recompiled
+    whenever the file changes; a file that fails to load leaves the current
+    patterns in place.
+
+    A message that doesn't match hints (a cheap regex) is not scanned at
+    all. The default hints only hold for the default patterns, so patterns
+    loaded later are scanned without them, at the full cost of every
+    alternative at every token.
+    """
+
+    def __init__(self, patterns=DEFAULT_CONTACT_PATTERNS, hints=DEFAULT_CONTACT_HINTS):
+        self.load(patterns, hints)
+        self._path = None
+        self._mtime = None
+        self._next_check = 0
+        self._logger = None
+
+    def init_app(self, app):
+        self._logger = app.logger
+        if path := app.config.get('CONTACT_PATTERNS_FILE'):
+            self.load_file(path)
+        app.extensions['contact_scanner'] = self
+
+    def load(self, patterns, hints=None):
+        """Swaps in a new pattern set, and its hints if any; scans already running finish with the old one."""
+        # Swapped as one attribute, so a scan never pairs one set's patterns with another's hints.
+        self._compiled = (compile_contact_patterns(patterns), re.compile(hints, re.IGNORECASE) if hints else None)
+
+    def load_file(self, path):
+        """Loads the pattern set from a JSON file and watches it for changes."""
+        mtime = os.path.getmtime(path)
+        with open(path, encoding='utf-8') as f:
+            self.load(json.load(f))
+        self._path, self._mtime = path, mtime
+        self._next_check = time.monotonic() + RELOAD_CHECK_INTERVAL
+
+    def _reload_if_changed(self):
+        if self._path is None or time.monotonic() < self._next_check:
+            return
+        self._next_check = time.monotonic() + RELOAD_CHECK_INTERVAL
+        try:
+            if os.path.getmtime(self._path) != self._mtime:
+                self.load_file(self._path)
+                if self._logger:
+                    self._logger.info(f"Reloaded contact patterns from {self._path}")
+        except (OSError, ValueError, re.error) as e:
+            if self._logger:
+                self._logger.warning(f"Keeping the current contact patterns; could not reload {self._path}: {e}")
+
+    def scan(self, text):
+        """Every piece of contact information in text, in order, as ContactMatch(category, start, end, text)."""
+        self._reload_if_changed()
+        regex, hints = self._compiled
+        normalized = text if text.isascii() else text.translate(_NORMALIZATION)
+        if hints is not None and not hints.search(normalized):
+            return []
+        return [
+            ContactMatch(match.lastgroup.rsplit('_', 1)[0], match.start(), match.end(), text[match.start():match.end()])
+            for match in regex.finditer(normalized)
+        ]
+
+    def mask(self, text, placeholder=CONTACT_PLACEHOLDER):
+        """ContactScan(masked, matches): text with every match replaced by placeholder, and the matches."""
+        matches = self.scan(text)
+        if not matches:
+            return ContactScan(text, matches)
+        pieces, position = [], 0
+        for match in matches:
+            pieces += [text[position:match.start], placeholder]
+            position = match.end
+        pieces.append(text[position:])
+        return ContactScan(''.join(pieces), matches)
+
+
+contact_scanner = ContactScanner()
+
+
+def mask_contact_info(message):
+    """
+    Detects and masks contact information in a message.
+    Returns the masked message and a boolean indicating if contact info was found.
+    """
+    masked, matches = contact_scanner.mask(message)
+    return masked, bool(matches)
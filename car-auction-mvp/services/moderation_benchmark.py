@@ -0,0 +1,107 @@
+import random
+import re
+import time
+from collections import namedtuple
+
+# Chat lines modelled on buyer-dealer conversations: mostly questions about the car, prices and
+# mileage (which must not be masked), some sharing contact details in the ways people get round filters.
+CLEAN_MESSAGES = [
+    "Hi, is the {make} still available?",
+    "What is your last price for the {year} {make} {model}?",
+    "Can you do {price} birr? I can pay cash this week.",
+    "How many km has it done? The ad says {km} km.",
+    "Has it been in any accident? Any paint work?",
+    "Is the price negotiable? {price} is a bit high for me.",
+    "I saw the car near Bole yesterday, it looks clean.",
+    "Does it have the original documents (libre) and is the bolo up to date?",
+    "Can I bring my mechanic to check the engine on Saturday at {hour}:00?",
+    "The tyres look worn in picture {photo}, were they replaced?",
+    "Is it automatic or manual? Petrol or diesel?",
+    "I'm comparing it with a {year} Vitz for {price} birr.",
+    "ሰላም፣ መኪናው አሁንም አለ?",
+    "ዋጋው ስንት ነው? የመጨረሻ ዋጋ ንገረኝ።",
+    "ስንት ኪሎ ሜትር ሄዷል? {km} ነው?",
+    "Selam, dagem ewedalehu, bemin yahl new yemitekeneshew?",
+    "Thanks, I'll think about it and come back tomorrow.",
+    "OK, deal at {price} if you include the service history.",
+    "The model is {year}, right? Not {other_year}?",
+    "Can you send more pictures of the interior and the trunk?",
+    # Look like spelled-out domains or app names to a careless pattern
+    "The price is negotiable. Me and my brother can come see it on Saturday.",
+    "imo this is a fair deal for a {year}",
+    "Yes. Co-owner is my wife, she will sign the transfer too.",
+]
+CONTACT_MESSAGES = [
+    "Call me on {phone}, easier to talk",
+    "my number {spaced_phone} call after 6",
+    "+251 {phone_rest} whatsapp me the pictures",
+    "Send it on telegram @{handle}",
+    "Check my other cars at www.{handle}cars.com",
+    "email {handle}@gmail.com for the documents",
+    "ስልኬ {phone} ደውልልኝ",
+    "ቁጥሬ {ethiopic_phone} ነው",
+    "find me on facebook, {handle} dot com",
+    "text {phone} or t.me/{handle}",
+]
+MAKES = [('Toyota', 'Corolla'), ('Toyota', 'Vitz'), ('Hyundai', 'Tucson'), ('Suzuki', 'Dzire'), ('Isuzu', 'D-Max')]
+HANDLES = ['abebe', 'selam_cars', 'tigist21', 'dawit_motors', 'hanna.k']
+_ETHIOPIC_DIGITS = {str(value): chr(0x1369 + value - 1) for value in range(1, 10)}
+
+ChatSample = namedtuple('ChatSample', ['text', 'has_contact'])
+DetectionErrors = namedtuple('DetectionErrors', ['false_positives', 'missed'])
+
+
+def chat_corpus(size=5000, contact_share=0.3, seed=0):
+    """
+    size ChatSample(text, has_contact), a contact_share of them containing
+    contact details, the same for a given seed.
+    """
+    rng = random.Random(seed)
+    samples = []
+    for _ in range(size):
+        make, model = rng.choice(MAKES)
+        phone = f"09{rng.randrange(10**8):08d}"
+        year = rng.randrange(2005, 2024)
+        values = {
+            'make': make, 'model': model, 'year': year, 'other_year': year + 1,
+            'price': f"{rng.randrange(8, 60) * 50_000:,}", 'km': f"{rng.randrange(20, 300) * 1000:,}",
+            'hour': rng.randrange(8, 18), 'photo': rng.randrange(1, 8),
+            'phone': phone, 'spaced_phone': ' '.join(phone), 'phone_rest': f"{phone[1:4]} {phone[4:7]} {phone[7:]}",
+            'ethiopic_phone': '0' + ''.join(_ETHIOPIC_DIGITS.get(digit, digit) for digit in phone[1:]),
+            'handle': rng.choice(HANDLES),
+        }
+        has_contact = rng.random() < contact_share
+        template = rng.choice(CONTACT_MESSAGES if has_contact else CLEAN_MESSAGES)
+        samples.append(ChatSample(template.format(**values), has_contact))
+    return samples
+
+
+def per_call_mask(message):
+    """The previous masking code, which joined and compiled its patterns on every call, as a baseline."""
+    patterns = [
+        r'(?:\+251\s?|0)?9\d{2}\s?\d{3}\s?\d{3}',
+        r'https?://\S+',
+        r'\b(WhatsApp|Telegram|Instagram|Facebook|fb\.com|t\.me)\b'
+    ]
+    masked_message, count = re.subn('|'.join(patterns), '[Contact Info Hidden]', message, flags=re.IGNORECASE)
+    return masked_message, count > 0
+
+
+def messages_per_second(mask, messages, rounds=3):
+    """The best of rounds timings of mask() over every message, as messages per second."""
+    best = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for message in messages:
+            mask(message)
+        best = min(best, time.perf_counter() - start)
+    return len(messages) / best
+
+
+def detection_errors(mask, samples):
+    """DetectionErrors(false_positives, missed): the clean messages mask() flags and the contact messages it lets through."""
+    false_positives, missed = [], []
+    for sample in samples:
+        if mask(sample.text)[1] != sample.has_contact:
+            (missed if sample.has_contact else false_positives).append(sample.text)
+    return DetectionErrors(false_positives, missed)
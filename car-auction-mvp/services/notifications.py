@@ -0,0 +1,58 @@
+from collections import Counter, namedtuple
+from datetime import datetime
+from sqlalchemy import insert
+from extensions import db, socketio
+from models.notification import Notification, notification_url
+from services.unread_counters import adjust_unread_counters, get_unread_notification_counts
+
+# One notification to send: who gets it, what it says and where it points (without a notification_id).
+NotificationItem = namedtuple('NotificationItem', ['user_id', 'message', 'link'])
+# A notification that has been written and is waiting to be emitted once the transaction commits.
+PendingNotification = namedtuple('PendingNotification', ['id', 'user_id', 'message', 'url', 'timestamp'])
+
+
+def add_notifications(items):
+    """
+    Writes a batch of notifications in the current transaction, without committing.
+
+    All rows go in with one multi-row INSERT ... RETURNING, and the recipients'
+    unread counters are bumped with one UPDATE per user. Links are stored as
+    given and the notification_id is added when they are read (Notification.url),
+    so there is no flush-then-patch round trip. Pass the result to
+    emit_notifications() after the caller commits.
+    """
+    items = [item for item in items if item.user_id is not None]
+    if not items:
+        return []
+
+    now = datetime.utcnow()
+    # The inserted rows come back whole, so nothing depends on RETURNING preserving the input order.
+    rows = db.session.execute(
+        insert(Notification).returning(Notification.id, Notification.user_id, Notification.message, Notification.link),
+        [{'user_id': item.user_id, 'message': item.message, 'link': item.link, 'is_read': False, 'timestamp': now} for item in items]
+    ).all()
+    adjust_unread_counters(db.session, 'unread_notification_count', Counter(item.user_id for item in items))
+
+    return [PendingNotification(row.id, row.user_id, row.message, notification_url(row.link, row.id), now) for row in rows]
+
+
+def emit_notifications(pending):
+    """Emits new_notification for committed notifications, reading every recipient's unread count in one query."""
+    if not pending:
+        return
+    unread_counts = get_unread_notification_counts({notification.user_id for notification in pending})
+    for notification in pending:
+        socketio.emit('new_notification', {
+            'message': notification.message,
+            'link': notification.url,
+            'timestamp': notification.timestamp.isoformat() + 'Z',
+            'count': unread_counts.get(notification.user_id, 0)
+        }, room=str(notification.user_id))
+
+
+def notify(items):
+    """Writes, commits and emits a batch of notifications in one transaction."""
+    pending = add_notifications(items)
+    db.session.commit()
+    emit_notifications(pending)
+    return pending
@@ -0,0 +1,24 @@
+import base64
+
+
+def encode_cursor(*values):
+    """Opaque, URL-safe token for the sort key of the last row on a page."""
+    raw = '|'.join(str(value) for value in values)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, *types):
+    """
+    Reverses encode_cursor(), converting each part with the matching callable
+    in `types` (e.g. int, datetime.fromisoformat). Raises ValueError if the
+    cursor is malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        parts = raw.split('|')
+        if len(parts) != len(types):
+            raise ValueError(f"expected {len(types)} parts, got {len(parts)}")
+        values = tuple(convert(part) for convert, part in zip(types, parts))
+    except (TypeError, UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+    return values[0] if len(values) == 1 else values
@@ -0,0 +1,76 @@
+import json
+from datetime import datetime
+from sqlalchemy import func, select
+from models.auction import Auction
+from models.car import Car
+from models.car_request import CarRequest
+from models.chat_message import ChatMessage
+from models.conversation import Conversation
+from models.notification import Notification
+
+
+def canonical_queries():
+    """
+    [(name, statement)] for the access paths behind the listing feeds,
+    dashboards and unread counts, with representative parameter values.
+    """
+    now = datetime.utcnow()
+    listed = (Car.is_approved == True, Car.is_active == True)
+    return [
+        ('all listings feed', select(Car.id).where(*listed, Car.listing_type != 'rental').order_by(Car.id.desc()).limit(24)),
+        ('listings of one type', select(Car.id).where(*listed, Car.listing_type == 'sale').order_by(Car.id.desc()).limit(24)),
+        ('listings by body type', select(Car.id).where(*listed, Car.body_type == 'SUV').order_by(Car.id.desc()).limit(24)),
+        ('featured listings', select(Car.id).where(Car.is_featured == True, *listed)),
+        ('make and model lookup', select(Car.id).where(Car.make == 'Toyota', Car.model == 'Corolla')),
+        ('seller inventory', select(Car.id).where(Car.owner_id == 1).order_by(Car.id.desc())),
+        ('admin approval queue', select(Car.id).where(Car.is_approved == False).order_by(Car.id.desc())),
+        ('admin listing counts', select(func.count(Car.id)).where(Car.listing_type == 'sale', Car.is_approved == True)),
+        ('running auctions', select(Auction.id).where(Auction.end_time > now).order_by(Auction.end_time)),
+        ('auctions due to close', select(Auction.id).where(Auction.closed_at.is_(None), Auction.end_time <= now)),
+        ('unread notifications', select(Notification.id).where(Notification.user_id == 1, Notification.is_read == False)),
+        ('notification list', select(Notification.id).where(Notification.user_id == 1).order_by(Notification.timestamp.desc()).limit(50)),
+        ('unread messages in a conversation', select(func.count(ChatMessage.id)).where(
+            ChatMessage.conversation_id == 1, ChatMessage.is_read == False, ChatMessage.sender_id != 1)),
+        ('chat history page', select(ChatMessage.id).where(ChatMessage.conversation_id == 1, ChatMessage.id < 1000)
+            .order_by(ChatMessage.id.desc()).limit(31)),
+        ('chat catch-up', select(ChatMessage.id).where(ChatMessage.conversation_id == 1, ChatMessage.id > 1000).order_by(ChatMessage.id)),
+        ('buyer conversation about a car', select(Conversation.id).where(Conversation.car_id == 1, Conversation.buyer_id == 1)),
+        ('buyer inbox', select(Conversation.id).where(Conversation.buyer_id == 1).order_by(Conversation.created_at.desc())),
+        ('dealer inbox', select(Conversation.id).where(Conversation.dealer_id == 1).order_by(Conversation.created_at.desc())),
+        ('dealer request feed', select(CarRequest.id).where(CarRequest.status == 'active')
+            .order_by(CarRequest.created_at.desc(), CarRequest.id.desc()).limit(20)),
+        ('customer requests', select(CarRequest.id).where(CarRequest.user_id == 1).order_by(CarRequest.created_at.desc())),
+    ]
+
+
+def _explain(connection, statement, prefix):
+    compiled = statement.compile(dialect=connection.dialect)
+    params = compiled.construct_params()
+    if compiled.positional:
+        params = tuple(params[name] for name in compiled.positiontup)
+    return connection.exec_driver_sql(f"{prefix} {compiled}", params).all()
+
+
+def _sequential_scans(plan):
+    """Relations a PostgreSQL JSON plan reads with a Seq Scan."""
+    scans = [plan['Relation Name']] if plan.get('Node Type') == 'Seq Scan' else []
+    for child in plan.get('Plans', ()):
+        scans += _sequential_scans(child)
+    return scans
+
+
+def full_scans(connection, statement):
+    """
+    Tables the database would read in full to run statement. SQLite reports a
+    plain SCAN without an index; PostgreSQL a Seq Scan (which it also picks for
+    tables too small for an index to pay off, so check against real data).
+    """
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        details = [row[-1] for row in _explain(connection, statement, 'EXPLAIN QUERY PLAN')]
+        return [detail.split()[1] for detail in details if detail.startswith('SCAN ') and ' USING ' not in detail]
+    if dialect == 'postgresql':
+        plan = _explain(connection, statement, 'EXPLAIN (FORMAT JSON)')[0][0]
+        plan = json.loads(plan) if isinstance(plan, str) else plan
+        return _sequential_scans(plan[0]['Plan'])
+    raise NotImplementedError(f"Query plans are not supported on {dialect}.")
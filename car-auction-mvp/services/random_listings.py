@@ -0,0 +1,86 @@
+import math
+import random
+from sqlalchemy import func
+from services.pagination import decode_cursor, encode_cursor
+from services.response_cache import LRUCacheBackend, response_cache
+
+# Most ids a pool holds; when more listings qualify, a random contiguous id range of this size is pooled.
+RANDOM_POOL_SIZE = 5000
+# Seconds a pool is reused for; pools are also rebuilt as soon as their cache tags are invalidated.
+RANDOM_POOL_TTL = 60
+RANDOM_POOL_MAX_ENTRIES = 64
+# Request parameters that choose among the random results rather than filter them.
+SAMPLING_PARAMS = ('random', 'seed', 'cursor', 'limit')
+
+_pools = LRUCacheBackend(RANDOM_POOL_MAX_ENTRIES)
+
+
+def _pool_key(name, tags, params):
+    filters = params.copy()
+    for param in SAMPLING_PARAMS:
+        filters.poplist(param)
+    return response_cache.key(name, tags, filters)
+
+
+def _load_pool(query, id_column, key):
+    """The ids matching query, shuffled in an order that depends only on the ids and the filters."""
+    ids_query = query.with_entities(id_column).order_by(None).limit(None)
+    ids = [row[0] for row in ids_query.order_by(id_column).limit(RANDOM_POOL_SIZE + 1).all()]
+    if len(ids) > RANDOM_POOL_SIZE:
+        # Too many to pool: take a window starting at a random id instead, wrapping past the top.
+        pivot = random.randint(ids[0], ids_query.with_entities(func.max(id_column)).scalar())
+        ids = [row[0] for row in ids_query.filter(id_column >= pivot).order_by(id_column).limit(RANDOM_POOL_SIZE).all()]
+        if len(ids) < RANDOM_POOL_SIZE:
+            ids += [row[0] for row in ids_query.filter(id_column < pivot).order_by(id_column).limit(RANDOM_POOL_SIZE - len(ids)).all()]
+        ids.sort()
+    random.Random(key).shuffle(ids)
+    return ids
+
+
+def _permutation(seed, size):
+    """An affine permutation i -> (a*i + b) mod size of the pool positions, fixed by seed."""
+    rng = random.Random(seed)
+    stride = rng.randrange(1, size) if size > 1 else 1
+    while math.gcd(stride, size) != 1:
+        stride = rng.randrange(1, size)
+    return stride, rng.randrange(size)
+
+
+def random_listings(query, id_column, pool_name, tags, params, limit, seed=None, cursor=None):
+    """
+    `limit` random rows of a listing query, without sorting the table.
+
+    The ids matching each filter set are pooled in memory (at most
+    RANDOM_POOL_SIZE of them) and drawn from, so a request costs one query for
+    the chosen rows however many listings qualify. Pools are rebuilt after
+    RANDOM_POOL_TTL seconds or once the response cache tags they depend on
+    are invalidated.
+
+    Without a seed every call is a fresh draw and next_cursor is None. With a
+    seed, the pool is walked in an order fixed by that seed, so a visitor
+    paging with the returned cursor sees no listing twice.
+
+    Returns (rows, next_cursor). Raises ValueError for a malformed cursor.
+    """
+    key = _pool_key(pool_name, tags, params)
+    pool = _pools.get(key)
+    if pool is None:
+        pool = _load_pool(query, id_column, key)
+        _pools.set(key, pool, RANDOM_POOL_TTL)
+    if not pool:
+        return [], None
+
+    if seed is None:
+        ids, next_cursor = random.sample(pool, min(limit, len(pool))), None
+    else:
+        start = decode_cursor(cursor, int) if cursor else 0
+        end = min(start + limit, len(pool))
+        stride, offset = _permutation(seed, len(pool))
+        ids = [pool[(stride * position + offset) % len(pool)] for position in range(start, end)]
+        next_cursor = encode_cursor(end) if end < len(pool) else None
+
+    # The query is applied again, so listings unlisted since the pool was built drop out.
+    rows = query.filter(id_column.in_(ids)).order_by(None).all() if ids else []
+    order = {row_id: position for position, row_id in enumerate(ids)}
+    rows.sort(key=lambda row: order[getattr(row, id_column.key)])
+    return rows, next_cursor
@@ -0,0 +1,93 @@
+import os
+import subprocess
+import sys
+import socketio as python_socketio
+from extensions import socketio
+
+# How often a file spool is checked for messages published by other processes, in seconds.
+SPOOL_POLL_INTERVAL = 0.05
+
+
+class SpoolFileManager(python_socketio.PubSubManager):
+    """
+    A Socket.IO message queue over an append-only file in a local folder
+    (SOCKETIO_MESSAGE_QUEUE=file:///path/to/folder), which every process on
+    the host publishes to and follows. It stands in for Redis in tests and
+    local multi-worker runs; the file only grows, so it is not for production.
+    """
+    name = 'file'
+
+    def __init__(self, url, channel='socketio', write_only=False, logger=None, json=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger, json=json)
+        folder = url[len('file://'):]
+        os.makedirs(folder, exist_ok=True)
+        self.path = os.path.join(folder, f'{channel}.jsonl')
+
+    def _publish(self, data):
+        # One O_APPEND write per message, so lines from concurrent publishers never interleave.
+        descriptor = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        try:
+            os.write(descriptor, self.json.dumps(data).encode() + b'\n')
+        finally:
+            os.close(descriptor)
+
+    def _listen(self):
+        open(self.path, 'ab').close()
+        with open(self.path, 'rb') as spool:
+            spool.seek(0, os.SEEK_END)
+            pending = b''
+            while True:
+                chunk = spool.read()
+                if not chunk:
+                    self.server.sleep(SPOOL_POLL_INTERVAL)
+                    continue
+                *lines, pending = (pending + chunk).split(b'\n')
+                yield from lines
+
+
+def message_queue_manager(url, channel, write_only=False):
+    """The Socket.IO client manager for a message queue URL: file:// spools, Redis, Kafka, ZeroMQ or any Kombu broker."""
+    if url.startswith('file://'):
+        return SpoolFileManager(url, channel=channel, write_only=write_only)
+    if url.startswith(('redis://', 'rediss://')):
+        return python_socketio.RedisManager(url, channel=channel, write_only=write_only)
+    if url.startswith('kafka://'):
+        return python_socketio.KafkaManager(url, channel=channel, write_only=write_only)
+    if url.startswith('zmq'):
+        return python_socketio.ZmqManager(url, channel=channel, write_only=write_only)
+    return python_socketio.KombuManager(url, channel=channel, write_only=write_only)
+
+
+def socketio_options(config, write_only=False):
+    """
+    Options for socketio.init_app(). With SOCKETIO_MESSAGE_QUEUE set, every
+    emit goes through the queue, so it reaches clients connected to any
+    worker; without it emits only reach this process's clients.
+    """
+    url = config.get('SOCKETIO_MESSAGE_QUEUE')
+    if not url:
+        return {}
+    return {'client_manager': message_queue_manager(url, config.get('SOCKETIO_CHANNEL', 'mekina-socketio'), write_only)}
+
+
+def use_emit_only_client(app):
+    """
+    Turns this process's socketio into a write-only client of the message
+    queue, for processes that emit to browsers (background jobs, the auction
+    scheduler) but serve none. Call it before the first emit. Returns False
+    if no queue is configured, in which case emits from here reach no one.
+    """
+    options = socketio_options(app.config, write_only=True)
+    if not options:
+        return False
+    socketio.init_app(app, **options)
+    return True
+
+
+def start_worker(root_path, host, port, **environ):
+    """Starts app.py as one server process on host:port (see `flask run-workers`), with extra environment variables."""
+    # Without the reloader, which would fork a second server per worker.
+    env = {**os.environ, 'HOST': host, 'PORT': str(port), 'FLASK_DEBUG': 'False', **environ}
+    # Set by the `flask` command this is started from; Flask refuses to run a server under it.
+    env.pop('FLASK_RUN_FROM_CLI', None)
+    return subprocess.Popen([sys.executable, 'app.py'], cwd=root_path, env=env)
@@ -0,0 +1,67 @@
+import json
+import socket
+import time
+import urllib.error
+import urllib.request
+import simple_websocket
+
+
+def free_port():
+    """A TCP port nothing is listening on right now."""
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+def wait_until_serving(host, port, timeout):
+    """Waits until a worker answers Socket.IO requests; returns False if it doesn't within timeout seconds."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f'http://{host}:{port}/socket.io/?EIO=4&transport=polling', timeout=1):
+                return True
+        except (urllib.error.URLError, ConnectionError, TimeoutError):
+            time.sleep(0.2)
+    return False
+
+
+class SocketIOProbe:
+    """
+    A bare Socket.IO client over one WebSocket (simple-websocket is already a
+    dependency of the server), enough to join a room and wait for an event.
+    """
+
+    def __init__(self, host, port, timeout=10):
+        self._timeout = timeout
+        self._ws = simple_websocket.Client.connect(f'ws://{host}:{port}/socket.io/?EIO=4&transport=websocket')
+        # Engine.IO open packet, then a connect to the default namespace
+        if self._expect(lambda packet: packet.startswith('0')) is None:
+            raise RuntimeError(f'No Engine.IO handshake from {host}:{port}.')
+        self._ws.send('40')
+        if self._expect(lambda packet: packet.startswith('40')) is None:
+            raise RuntimeError(f'{host}:{port} did not accept the Socket.IO connection.')
+
+    def call(self, event, data):
+        """Sends an event and waits for the server to acknowledge it; returns False if it doesn't."""
+        self._ws.send('421' + json.dumps([event, data]))
+        return self._expect(lambda packet: packet.startswith('431')) is not None
+
+    def wait_for(self, event):
+        """The data of the next `event` received, or None if none arrives within the timeout."""
+        packet = self._expect(lambda packet: packet.startswith('42[') and json.loads(packet[2:])[0] == event)
+        return json.loads(packet[2:])[1] if packet else None
+
+    def close(self):
+        self._ws.close()
+
+    def _expect(self, predicate):
+        deadline = time.monotonic() + self._timeout
+        while (remaining := deadline - time.monotonic()) > 0:
+            packet = self._ws.receive(timeout=remaining)
+            if packet is None:
+                break
+            if packet == '2': # Engine.IO ping
+                self._ws.send('3')
+            elif predicate(packet):
+                return packet
+        return None
@@ -0,0 +1,118 @@
+from datetime import datetime
+from flask import url_for
+from sqlalchemy import event, func, inspect, select, tuple_, update
+from sqlalchemy.orm import Session
+from extensions import db
+from models.car_request import CarRequest
+from models.dealer_bid import DealerBid
+from models.dealer_request_view import DealerRequestView
+from services.pagination import decode_cursor, encode_cursor
+
+FEED_PAGE_SIZE = 20
+MAX_FEED_PAGE_SIZE = 100
+FEED_VIEWS = ('all', 'new', 'viewed')
+
+
+def feed_cursor(car_request):
+    """Cursor pointing just after car_request in the feed's (created_at, id) order."""
+    return encode_cursor(car_request.created_at.isoformat(), car_request.id)
+
+
+def request_feed(dealer_id, cursor=None, view='all', limit=FEED_PAGE_SIZE):
+    """
+    One page of active customer requests for a dealer, newest first.
+
+    Returns ([(car_request, has_been_viewed), ...], next_cursor); next_cursor is
+    None on the last page. Pages are read by seeking the (status, created_at, id)
+    index past the cursor, and offer stats come from the maintained columns on
+    CarRequest, so a page costs the same however many requests and bids exist.
+    """
+    viewed = DealerRequestView.id.isnot(None)
+    query = (
+        select(CarRequest, viewed.label('has_been_viewed'))
+        .outerjoin(DealerRequestView, (DealerRequestView.request_id == CarRequest.id) & (DealerRequestView.dealer_id == dealer_id))
+        .where(CarRequest.status == 'active')
+    )
+    if view == 'new':
+        query = query.where(DealerRequestView.id.is_(None))
+    elif view == 'viewed':
+        query = query.where(viewed)
+    if cursor:
+        query = query.where(tuple_(CarRequest.created_at, CarRequest.id) < decode_cursor(cursor, datetime.fromisoformat, int))
+
+    rows = db.session.execute(
+        query.order_by(CarRequest.created_at.desc(), CarRequest.id.desc()).limit(limit + 1)
+    ).all()
+    page = [(car_request, bool(has_been_viewed)) for car_request, has_been_viewed in rows[:limit]]
+    next_cursor = feed_cursor(page[-1][0]) if len(rows) > limit else None
+    return page, next_cursor
+
+
+def count_new_requests(dealer_id, cap=MAX_FEED_PAGE_SIZE):
+    """Number of active requests the dealer has not opened yet, counted up to `cap`."""
+    unseen = (
+        select(CarRequest.id)
+        .outerjoin(DealerRequestView, (DealerRequestView.request_id == CarRequest.id) & (DealerRequestView.dealer_id == dealer_id))
+        .where(CarRequest.status == 'active', DealerRequestView.id.is_(None))
+        .limit(cap)
+        .subquery()
+    )
+    return db.session.execute(select(func.count()).select_from(unseen)).scalar()
+
+
+def feed_item(car_request, has_been_viewed):
+    """Serializes a feed row for the dashboard's JSON feed."""
+    return {
+        'id': car_request.id,
+        'make': car_request.make,
+        'model': car_request.model,
+        'min_year': car_request.min_year,
+        'max_mileage': car_request.max_mileage,
+        'notes': car_request.notes,
+        'created_at': car_request.created_at.isoformat() + 'Z',
+        'bid_count': car_request.bid_count,
+        'lowest_offer': car_request.lowest_offer,
+        'has_been_viewed': has_been_viewed,
+        'link': url_for('dealer.place_bid', request_id=car_request.id)
+    }
+
+
+def _offer_stats_changed(bid):
+    """True if a flush changes which request a bid counts towards or its price."""
+    state = inspect(bid)
+    return state.attrs.price.history.has_changes() or state.attrs.request_id.history.has_changes()
+
+
+@event.listens_for(Session, 'after_flush')
+def _maintain_request_stats(session, flush_context):
+    """
+    Keeps CarRequest.bid_count/lowest_offer in step with every DealerBid insert,
+    price edit and delete, in the same transaction. Only the requests touched by
+    the flush are recomputed, each from the (request_id, price) index.
+    """
+    request_ids = set()
+    for obj in session.new:
+        if isinstance(obj, DealerBid):
+            request_ids.add(obj.request_id)
+    for obj in session.dirty:
+        if isinstance(obj, DealerBid) and _offer_stats_changed(obj):
+            request_ids.add(obj.request_id)
+            request_ids.update(inspect(obj).attrs.request_id.history.deleted)
+    for obj in session.deleted:
+        if isinstance(obj, DealerBid):
+            request_ids.add(obj.request_id)
+
+    request_ids.discard(None)
+    if request_ids:
+        refresh_request_stats(session, request_ids)
+
+
+def refresh_request_stats(session, request_ids=None):
+    """Recomputes bid_count/lowest_offer from the bid table for the given requests (or all of them)."""
+    statement = update(CarRequest).values(
+        bid_count=select(func.count(DealerBid.id)).where(DealerBid.request_id == CarRequest.id).scalar_subquery(),
+        lowest_offer=select(func.min(DealerBid.price)).where(DealerBid.request_id == CarRequest.id).scalar_subquery()
+    ).execution_options(synchronize_session=False)
+    if request_ids is not None:
+        statement = statement.where(CarRequest.id.in_(request_ids))
+    return session.execute(statement).rowcount
@@ -0,0 +1,201 @@
+import hashlib
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, request
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from models.auction import Auction
+from models.bid import Bid
+from models.car import Car
+from models.car_image import CarImage
+from models.rental_listing import RentalListing
+
+# Cache tags: every cached response carries the tags of the data it shows.
+LISTING_TYPE_TAGS = {'auction': 'auctions', 'sale': 'sales', 'rental': 'rentals'}
+FEATURED_TAG = 'featured'
+ALL_TAGS = (*LISTING_TYPE_TAGS.values(), FEATURED_TAG)
+
+
+class LRUCacheBackend:
+    """In-process cache: at most max_entries responses, least recently used evicted first."""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict() # key -> (expires_at, value)
+        self._tag_versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def tag_versions(self, tags):
+        with self._lock:
+            return [self._tag_versions.get(tag, 0) for tag in tags]
+
+    def bump_tags(self, tags):
+        with self._lock:
+            for tag in tags:
+                self._tag_versions[tag] = self._tag_versions.get(tag, 0) + 1
+
+
+class RedisCacheBackend:
+    """Cache shared by every worker through Redis, so an invalidation in one reaches all of them."""
+
+    def __init__(self, url, prefix='mekina:response-cache:'):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("RESPONSE_CACHE_URL points at Redis but the 'redis' package is not installed.") from e
+        self._redis = redis.Redis.from_url(url)
+        self._prefix = prefix
+
+    def get(self, key):
+        value = self._redis.get(self._prefix + key)
+        return pickle.loads(value) if value is not None else None
+
+    def set(self, key, value, ttl):
+        self._redis.set(self._prefix + key, pickle.dumps(value), ex=max(int(ttl), 1))
+
+    def tag_versions(self, tags):
+        return [int(version or 0) for version in self._redis.mget([f"{self._prefix}tag:{tag}" for tag in tags])]
+
+    def bump_tags(self, tags):
+        pipeline = self._redis.pipeline()
+        for tag in tags:
+            pipeline.incr(f"{self._prefix}tag:{tag}")
+        pipeline.execute()
+
+
+class ResponseCache:
+    """
+    Caches whole GET responses keyed by endpoint and normalized query string.
+
+    Invalidation is by tag: each key embeds the current version of its tags,
+    and invalidate() bumps those versions, so every response built from the
+    old data stops being found at once, whichever backend holds it.
+    """
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.default_ttl = 30
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        url = app.config.get('RESPONSE_CACHE_URL')
+        self.backend = RedisCacheBackend(url) if url else LRUCacheBackend(app.config.get('RESPONSE_CACHE_MAX_ENTRIES', 1024))
+        self.default_ttl = app.config.get('RESPONSE_CACHE_TTL', 30)
+        app.extensions['response_cache'] = self
+
+    def key(self, endpoint, tags, params):
+        """Cache key for an endpoint, its tags' current versions and its (unordered, blank-free) parameters."""
+        normalized = sorted((name, value.strip()) for name, values in params.lists() for value in values if value.strip())
+        versions = self.backend.tag_versions(tags)
+        digest = hashlib.sha1(repr(normalized).encode()).hexdigest()
+        return f"{endpoint}:{'.'.join(map(str, versions))}:{digest}"
+
+    def invalidate(self, tags):
+        if self.backend is not None and tags:
+            self.backend.bump_tags(sorted(tags))
+
+
+response_cache = ResponseCache()
+
+
+def cached_response(*tags, ttl=None, bypass=None):
+    """
+    Serves a GET view from the response cache, filling it on a miss. Only 200
+    responses are stored; `bypass` is a callable that skips the cache for
+    requests that must not be shared (e.g. random picks).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if response_cache.backend is None or request.method != 'GET' or (bypass and bypass()):
+                return view(*args, **kwargs)
+
+            key = response_cache.key(request.endpoint, tags, request.args)
+            cached = response_cache.backend.get(key)
+            if cached is not None:
+                body, mimetype = cached
+                response = current_app.response_class(body, mimetype=mimetype)
+                response.headers['X-Cache'] = 'HIT'
+                return response
+
+            response = current_app.make_response(view(*args, **kwargs))
+            if response.status_code == 200 and not response.direct_passthrough:
+                response_cache.backend.set(key, (response.get_data(), response.mimetype), ttl or response_cache.default_ttl)
+                response.headers['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
+
+
+def mark_listings_changed(session, tags=ALL_TAGS):
+    """Invalidates `tags` once the session commits; for changes made with bulk UPDATEs the ORM can't see."""
+    session.info.setdefault('response_cache_tags', set()).update(tags)
+
+
+def _previous_value(obj, name):
+    history = inspect(obj).attrs[name].load_history()
+    return history.deleted[0] if history.deleted else getattr(obj, name)
+
+
+def _car_tags(car):
+    """The tags a car's listing shows up under, before and after this flush."""
+    tags = set()
+    for listing_type, is_featured in ((car.listing_type, car.is_featured), (_previous_value(car, 'listing_type'), _previous_value(car, 'is_featured'))):
+        tags.add(LISTING_TYPE_TAGS.get(listing_type or 'auction', 'auctions'))
+        if is_featured:
+            tags.add(FEATURED_TAG)
+    return tags
+
+
+@event.listens_for(Session, 'before_flush')
+def _collect_listing_changes(session, flush_context, instances):
+    """
+    Records which cached feeds a flush affects: car creates, edits, approvals,
+    visibility toggles and deletes, auction changes and new bids, rental
+    listings and images. They are invalidated only once the transaction commits.
+    """
+    tags = set()
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Car):
+            tags |= _car_tags(obj)
+        elif isinstance(obj, (Auction, Bid)):
+            tags.update(('auctions', FEATURED_TAG))
+        elif isinstance(obj, RentalListing):
+            tags.update(('rentals', FEATURED_TAG))
+        elif isinstance(obj, CarImage):
+            tags.update(ALL_TAGS)
+    if tags:
+        mark_listings_changed(session, tags)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed_changes(session):
+    if tags := session.info.pop('response_cache_tags', None):
+        response_cache.invalidate(tags)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_listing_changes(session):
+    session.info.pop('response_cache_tags', None)
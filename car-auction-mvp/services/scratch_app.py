@@ -0,0 +1,49 @@
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from extensions import db
+
+
+@contextmanager
+def scratch_app(**config):
+    """
+    Runs the body in the app context of a second copy of the app, on a fresh
+    SQLite database in a temporary folder that is deleted afterwards, so checks
+    can create rows without touching the configured database. Its response
+    cache is switched off and jobs and image variants run inline; config
+    overrides any other setting.
+
+    Creating the copy rebinds the shared extensions (socketio, the response
+    cache, the job queue) to it, so only use this from one-shot commands.
+    """
+    from app import create_app
+    from config import Config
+    from services.response_cache import response_cache
+    from services.search import rebuild_search_index
+
+    folder = tempfile.mkdtemp(prefix='mekina-check-')
+    settings = {
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(folder, 'check.db'),
+        'RESPONSE_CACHE_URL': None,
+        'JOB_QUEUE_URL': None,
+        'JOB_WORKERS': 0,
+        'IMAGE_WORKERS': 0,
+        'SOCKETIO_MESSAGE_QUEUE': None,
+        **config,
+    }
+    app = create_app(type('ScratchConfig', (Config,), settings))
+    try:
+        with app.app_context():
+            # Every request runs its own queries rather than being answered from the cache.
+            response_cache.backend = None
+            db.create_all()
+            rebuild_search_index(db.session)
+            db.session.commit()
+            try:
+                yield app
+            finally:
+                db.session.remove()
+                db.engine.dispose()
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
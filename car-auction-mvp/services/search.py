@@ -0,0 +1,125 @@
+import re
+from sqlalchemy import and_, column, delete, event, func, insert, inspect, or_, select, table, text
+from sqlalchemy.orm import Session, selectinload
+from extensions import db
+from models.car import Car
+from models.car_search import CarSearch
+
+# Attributes that feed a car's search document; changing any of them reindexes the car.
+INDEXED_ATTRIBUTES = ('make', 'model', 'year', 'body_type', 'description', 'equipment')
+MAX_SEARCH_TOKENS = 8
+REINDEX_BATCH_SIZE = 500
+
+# The FTS5 table shadowing car_search on SQLite (rowid is the car id).
+car_search_fts = table('car_search_fts', column('rowid'), column('document'))
+
+SQLITE_SEARCH_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS car_search_fts USING fts5("
+    "document, content='car_search', content_rowid='car_id', "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "CREATE TRIGGER IF NOT EXISTS car_search_ai AFTER INSERT ON car_search BEGIN "
+    "INSERT INTO car_search_fts(rowid, document) VALUES (new.car_id, new.document); END",
+    "CREATE TRIGGER IF NOT EXISTS car_search_ad AFTER DELETE ON car_search BEGIN "
+    "INSERT INTO car_search_fts(car_search_fts, rowid, document) VALUES ('delete', old.car_id, old.document); END",
+    "CREATE TRIGGER IF NOT EXISTS car_search_au AFTER UPDATE ON car_search BEGIN "
+    "INSERT INTO car_search_fts(car_search_fts, rowid, document) VALUES ('delete', old.car_id, old.document); "
+    "INSERT INTO car_search_fts(rowid, document) VALUES (new.car_id, new.document); END",
+)
+POSTGRESQL_SEARCH_DDL = (
+    "CREATE INDEX IF NOT EXISTS ix_car_search_document_tsv ON car_search USING gin (to_tsvector('simple', document))",
+)
+
+
+def search_tokens(query_text):
+    """Splits a search box query into lowercase word tokens (punctuation and operators are dropped)."""
+    return re.findall(r'[^\W_]+', (query_text or '').lower())[:MAX_SEARCH_TOKENS]
+
+
+def car_search_filter(query_text):
+    """
+    A WHERE clause matching cars whose search document contains every token of
+    query_text, each as a word prefix ("toy cor" matches a Toyota Corolla).
+    Returns None if the query has no searchable tokens.
+    """
+    tokens = search_tokens(query_text)
+    if not tokens:
+        return None
+
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        match = ' '.join(f'"{token}"*' for token in tokens)
+        matching_ids = select(car_search_fts.c.rowid).where(car_search_fts.c.document.op('MATCH')(match))
+    elif dialect == 'postgresql':
+        tsquery = func.to_tsquery('simple', ' & '.join(f'{token}:*' for token in tokens))
+        matching_ids = select(CarSearch.car_id).where(func.to_tsvector('simple', CarSearch.document).op('@@')(tsquery))
+    else:
+        # No full-text index on this backend: fall back to word-prefix LIKEs on the maintained document.
+        matching_ids = select(CarSearch.car_id).where(and_(*(
+            or_(CarSearch.document.like(f'{token}%'), CarSearch.document.like(f'% {token}%')) for token in tokens
+        )))
+    return Car.id.in_(matching_ids)
+
+
+def apply_car_search(query, query_text):
+    """Restricts a query over Car (or joined to Car) to the cars matching query_text."""
+    condition = car_search_filter(query_text)
+    return query if condition is None else query.filter(condition)
+
+
+def search_document(car):
+    """The lowercased text a car is searchable by."""
+    parts = [car.make, car.model, str(car.year) if car.year else None, car.body_type, car.description]
+    parts += [equipment.name.replace('_', ' ') for equipment in car.equipment]
+    return ' '.join(part.strip() for part in parts if part and part.strip()).lower()
+
+
+def index_cars(session, cars):
+    """Writes (or rewrites) the search documents of the given persisted cars."""
+    rows = [{'car_id': car.id, 'document': search_document(car)} for car in cars]
+    if not rows:
+        return
+    session.execute(delete(CarSearch).where(CarSearch.car_id.in_([row['car_id'] for row in rows])))
+    session.execute(insert(CarSearch), rows)
+
+
+def ensure_search_index(connection):
+    """Creates the backend's full-text structures over car_search if they are missing."""
+    statements = {'sqlite': SQLITE_SEARCH_DDL, 'postgresql': POSTGRESQL_SEARCH_DDL}.get(connection.dialect.name, ())
+    for statement in statements:
+        connection.execute(text(statement))
+
+
+def rebuild_search_index(session):
+    """Reindexes every car in batches. Returns the number of cars indexed."""
+    ensure_search_index(session.connection())
+    indexed, last_id = 0, 0
+    cars_with_equipment = Car.query.options(selectinload(Car.equipment)).order_by(Car.id)
+    while cars := cars_with_equipment.filter(Car.id > last_id).limit(REINDEX_BATCH_SIZE).all():
+        index_cars(session, cars)
+        indexed += len(cars)
+        last_id = cars[-1].id
+    return indexed
+
+
+def _needs_reindex(car):
+    state = inspect(car)
+    return any(state.attrs[name].history.has_changes() for name in INDEXED_ATTRIBUTES)
+
+
+@event.listens_for(Session, 'before_flush')
+def _remove_deleted_cars(session, flush_context, instances):
+    """Drops the search documents of cars being deleted, before their rows go."""
+    car_ids = [obj.id for obj in session.deleted if isinstance(obj, Car) and obj.id is not None]
+    if car_ids:
+        session.execute(delete(CarSearch).where(CarSearch.car_id.in_(car_ids)))
+
+
+@event.listens_for(Session, 'after_flush')
+def _index_changed_cars(session, flush_context):
+    """
+    Keeps car_search in step with every car create and edit in the same
+    transaction, so listings are searchable as soon as they are saved.
+    """
+    cars = [obj for obj in session.new if isinstance(obj, Car)]
+    cars += [obj for obj in session.dirty if isinstance(obj, Car) and _needs_reindex(obj)]
+    index_cars(session, cars)
@@ -0,0 +1,323 @@
+import bisect
+import heapq
+import math
+from collections import defaultdict, namedtuple
+from sqlalchemy import and_, case, delete, event, func, insert, inspect, or_, select, tuple_
+from sqlalchemy.orm import Session
+from models.auction import Auction
+from models.car import Car, car_equipment_association
+from models.rental_listing import RentalListing
+from models.similar_car import SimilarCar
+from services.listing_loader import car_listing_options
+
+SIMILAR_CARS_SHOWN = 4
+# Kept per car, so a few neighbours can be unlisted before a detail page runs short.
+SIMILAR_CARS_STORED = 8
+# Cars sharing neither make nor body type are only considered when too few do; then the nearest in year.
+FILL_CANDIDATES = 4 * SIMILAR_CARS_STORED
+# Cars sharing make or body type scored per changed car, the most alike first, so a write to a popular
+# make or body type doesn't load most of the inventory.
+SHARING_CANDIDATES = 16 * SIMILAR_CARS_STORED
+YEAR_WINDOW = 5           # Years apart at which the year term reaches zero
+PRICE_BAND_RATIO = 1.25   # Each price band is 25% above the last
+PRICE_BAND_WINDOW = 3     # Bands apart at which the price term reaches zero
+REBUILD_BATCH_SIZE = 1000
+
+# What a car's neighbours depend on; changing any of them recomputes them.
+SIMILARITY_ATTRIBUTES = ('make', 'model', 'year', 'body_type', 'fixed_price', 'listing_type', 'is_approved', 'is_active', 'equipment')
+
+CarProfile = namedtuple('CarProfile', 'id listing_type make model body_type year price_band equipment is_listed')
+
+
+def price_band(price):
+    """Logarithmic price band, so 'close in price' means the same at 300k and at 3M."""
+    return math.floor(math.log(price, PRICE_BAND_RATIO)) if price and price > 0 else None
+
+
+def similarity(a, b):
+    """
+    How alike two cars are: make (4) and model (3) matches, body type (2),
+    then closeness in year (up to 1), price band (up to 1.5) and the overlap
+    of their equipment (up to 1).
+    """
+    score = 0.0
+    if a.make == b.make:
+        score += 4.0 + (3.0 if a.model == b.model else 0.0)
+    if a.body_type and a.body_type == b.body_type:
+        score += 2.0
+    if a.year and b.year:
+        score += max(0.0, 1 - abs(a.year - b.year) / YEAR_WINDOW)
+    if a.price_band is not None and b.price_band is not None:
+        score += 1.5 * max(0.0, 1 - abs(a.price_band - b.price_band) / PRICE_BAND_WINDOW)
+    if a.equipment and b.equipment:
+        score += len(a.equipment & b.equipment) / len(a.equipment | b.equipment)
+    return round(score, 4)
+
+
+def _listing_price():
+    """The price a car is listed at: fixed price, auction starting price or daily rental rate."""
+    return case(
+        (Car.listing_type == 'sale', Car.fixed_price),
+        (Car.listing_type == 'rental', RentalListing.price_per_day),
+        else_=Auction.start_price
+    )
+
+
+def load_profiles(session, *conditions, order_by=None, limit=None, listed_only=True):
+    """CarProfiles of the cars matching conditions (only approved, active ones unless listed_only is False)."""
+    is_listed = and_(Car.is_approved == True, Car.is_active == True)
+    query = (
+        select(Car.id, Car.listing_type, Car.make, Car.model, Car.body_type, Car.year, _listing_price(), is_listed)
+        .outerjoin(Auction, Auction.car_id == Car.id)
+        .outerjoin(RentalListing, RentalListing.car_id == Car.id)
+        .where(*conditions)
+    )
+    if listed_only:
+        query = query.where(is_listed)
+    if order_by is not None:
+        query = query.order_by(*order_by)
+    rows = session.execute(query.limit(limit)).all()
+    if not rows:
+        return []
+
+    equipment = defaultdict(set)
+    association = car_equipment_association.c
+    car_ids = [row[0] for row in rows] if limit else query.with_only_columns(Car.id).order_by(None)
+    for car_id, equipment_id in session.execute(select(association.car_id, association.equipment_id).where(association.car_id.in_(car_ids))):
+        equipment[car_id].add(equipment_id)
+
+    return [
+        CarProfile(car_id, listing_type or 'auction', (make or '').lower(), (model or '').lower(), (body_type or '').lower(),
+                   year, price_band(price), frozenset(equipment[car_id]), bool(listed))
+        for car_id, listing_type, make, model, body_type, year, price, listed in rows
+    ]
+
+
+class _Candidates:
+    """Listed cars to pick neighbours from, grouped by listing type, make and body type."""
+
+    def __init__(self, profiles=()):
+        self._by_make = defaultdict(dict)
+        self._by_body_type = defaultdict(dict)
+        self._by_type = defaultdict(dict)
+        self._by_year = {}
+        self.add(profiles)
+
+    def add(self, profiles):
+        for profile in profiles:
+            self._by_make[profile.listing_type, profile.make][profile.id] = profile
+            if profile.body_type:
+                self._by_body_type[profile.listing_type, profile.body_type][profile.id] = profile
+            self._by_type[profile.listing_type][profile.id] = profile
+            self._by_year.pop(profile.listing_type, None)
+
+    def sharing(self, profile):
+        """Candidates sharing the car's make or body type (the ones worth scoring)."""
+        pool = dict(self._by_make.get((profile.listing_type, profile.make), {}))
+        if profile.body_type:
+            pool.update(self._by_body_type.get((profile.listing_type, profile.body_type), {}))
+        pool.pop(profile.id, None)
+        return pool
+
+    def nearest_in_year(self, profile, count=FILL_CANDIDATES):
+        if profile.listing_type not in self._by_year:
+            ranked = sorted(self._by_type[profile.listing_type].values(), key=lambda candidate: candidate.year or 0)
+            self._by_year[profile.listing_type] = ([candidate.year or 0 for candidate in ranked], ranked)
+        years, ranked = self._by_year[profile.listing_type]
+        start = bisect.bisect_left(years, profile.year or 0)
+        window = ranked[max(start - count, 0):start + count]
+        return heapq.nsmallest(count, (c for c in window if c.id != profile.id), key=lambda c: abs((c.year or 0) - (profile.year or 0)))
+
+    def top_similar(self, profile, limit=SIMILAR_CARS_STORED):
+        """[(score, car_id)] of the car's `limit` closest neighbours, best first."""
+        pool = self.sharing(profile)
+        if len(pool) < limit:
+            pool.update((candidate.id, candidate) for candidate in self.nearest_in_year(profile))
+        return heapq.nlargest(limit, ((similarity(profile, candidate), candidate.id) for candidate in pool.values()))
+
+
+def _rows(profile, neighbours):
+    return [{'car_id': profile.id, 'similar_car_id': car_id, 'score': score} for score, car_id in neighbours]
+
+
+def rebuild_similar_cars(session):
+    """Recomputes every car's neighbours from scratch. Returns the number of cars processed."""
+    profiles = load_profiles(session, listed_only=False)
+    candidates = _Candidates(profile for profile in profiles if profile.is_listed)
+    session.execute(delete(SimilarCar))
+    rows = []
+    for profile in profiles:
+        rows += _rows(profile, candidates.top_similar(profile))
+        if len(rows) >= REBUILD_BATCH_SIZE:
+            session.execute(insert(SimilarCar), rows)
+            rows = []
+    if rows:
+        session.execute(insert(SimilarCar), rows)
+    return len(profiles)
+
+
+def _trim(session, car_ids):
+    """Drops all but the best SIMILAR_CARS_STORED entries from the given cars' lists."""
+    ranked = (
+        select(
+            SimilarCar.car_id, SimilarCar.similar_car_id,
+            func.row_number().over(partition_by=SimilarCar.car_id, order_by=(SimilarCar.score.desc(), SimilarCar.similar_car_id.desc())).label('position')
+        )
+        .where(SimilarCar.car_id.in_(car_ids))
+        .subquery()
+    )
+    surplus = select(ranked.c.car_id, ranked.c.similar_car_id).where(ranked.c.position > SIMILAR_CARS_STORED)
+    session.execute(delete(SimilarCar).where(tuple_(SimilarCar.car_id, SimilarCar.similar_car_id).in_(surplus)))
+
+
+def _sharing_condition(profile):
+    """SQL for the listed cars _Candidates.sharing() would pick for this car."""
+    shares = [func.lower(Car.make) == profile.make]
+    if profile.body_type:
+        shares.append(func.lower(Car.body_type) == profile.body_type)
+    return and_(Car.listing_type == profile.listing_type, or_(*shares))
+
+
+def _closeness(profile):
+    """
+    SQL ordering that puts the cars most like this one first: by the make,
+    model and body type terms of similarity(), then by nearness in year.
+    """
+    same_make = func.lower(Car.make) == profile.make
+    shared = case((same_make, 4.0), else_=0.0) + case((and_(same_make, func.lower(Car.model) == profile.model), 3.0), else_=0.0)
+    if profile.body_type:
+        shared = shared + case((func.lower(Car.body_type) == profile.body_type, 2.0), else_=0.0)
+    return (shared.desc(), func.abs(Car.year - (profile.year or 0)), Car.id.desc())
+
+
+def refresh_similar_cars(session, changed_ids, stale_ids=()):
+    """
+    Brings the similarity lists up to date after the given cars were created,
+    edited or unlisted: their own lists, those of the cars that listed them and
+    any `stale_ids` are recomputed, and listed ones are slotted into the lists
+    of the cars sharing their make or body type where they now rank among the best.
+
+    Each car is only scored against its SHARING_CANDIDATES most alike cars.
+    A changed car therefore only enters the lists of those cars, which are
+    the ones it is likeliest to rank on; `flask rebuild-similar-cars`
+    recomputes every list exactly.
+    """
+    changed_ids = set(changed_ids)
+    stale_ids = set(stale_ids) | changed_ids
+    stale_ids.update(session.scalars(select(SimilarCar.car_id).where(SimilarCar.similar_car_id.in_(changed_ids))))
+    session.execute(delete(SimilarCar).where(or_(SimilarCar.car_id.in_(stale_ids), SimilarCar.similar_car_id.in_(changed_ids))))
+
+    targets = load_profiles(session, Car.id.in_(stale_ids), listed_only=False)
+    if not targets:
+        return
+    candidates = _Candidates()
+    for profile in targets:
+        candidates.add(load_profiles(
+            session, _sharing_condition(profile), Car.id != profile.id,
+            order_by=_closeness(profile), limit=SHARING_CANDIDATES
+        ))
+        if len(candidates.sharing(profile)) < SIMILAR_CARS_STORED:
+            candidates.add(load_profiles(
+                session, Car.listing_type == profile.listing_type, Car.id != profile.id,
+                order_by=(func.abs(Car.year - (profile.year or 0)), Car.id.desc()), limit=FILL_CANDIDATES
+            ))
+
+    rows = []
+    for profile in targets:
+        rows += _rows(profile, candidates.top_similar(profile))
+
+    # A changed car also belongs in the lists of unchanged cars it now ranks among the best for.
+    entering = {}
+    for profile in targets:
+        if profile.id in changed_ids and profile.is_listed:
+            for candidate in candidates.sharing(profile).values():
+                if candidate.id not in stale_ids:
+                    entering[candidate.id, profile.id] = similarity(candidate, profile)
+    if entering:
+        full_lists = dict(session.execute(
+            select(SimilarCar.car_id, func.min(SimilarCar.score))
+            .where(SimilarCar.car_id.in_({car_id for car_id, _ in entering}))
+            .group_by(SimilarCar.car_id)
+            .having(func.count() >= SIMILAR_CARS_STORED)
+        ).all())
+        entering = {pair: score for pair, score in entering.items() if score >= full_lists.get(pair[0], -1)}
+        rows += [{'car_id': car_id, 'similar_car_id': similar_car_id, 'score': score} for (car_id, similar_car_id), score in entering.items()]
+
+    if rows:
+        session.execute(insert(SimilarCar), rows)
+    if entering:
+        _trim(session, list({car_id for car_id, _ in entering}))
+
+
+def similar_cars(car, listing_type, limit=SIMILAR_CARS_SHOWN):
+    """The car's closest listed neighbours of the given listing type, best first, in one indexed query."""
+    return (
+        Car.query
+        .join(SimilarCar, SimilarCar.similar_car_id == Car.id)
+        .filter(SimilarCar.car_id == car.id, Car.is_approved == True, Car.is_active == True, Car.listing_type == listing_type)
+        .options(*car_listing_options())
+        .order_by(SimilarCar.score.desc(), SimilarCar.similar_car_id.desc())
+        .limit(limit)
+        .all()
+    )
+
+
+def similarity_reason(car, cars):
+    """The heading for a set of similar cars: the closest match they all share."""
+    def same(attribute, other):
+        return (getattr(car, attribute) or '').lower() == (getattr(other, attribute) or '').lower()
+
+    if cars and all(same('make', other) for other in cars):
+        if all(same('model', other) for other in cars):
+            return f"More {car.make} {car.model} Models"
+        if car.body_type and all(same('body_type', other) for other in cars):
+            return f"More {car.make} {car.body_type}s"
+        return f"More from {car.make}"
+    return "Other Available Listings"
+
+
+def _similarity_changed(car):
+    state = inspect(car)
+    return any(state.attrs[name].history.has_changes() for name in SIMILARITY_ATTRIBUTES)
+
+
+def _price_changed(listing, attribute):
+    return inspect(listing).attrs[attribute].history.has_changes()
+
+
+@event.listens_for(Session, 'before_flush')
+def _remove_deleted_cars(session, flush_context, instances):
+    """Takes cars being deleted out of every list, and marks the lists they were on for recomputing."""
+    car_ids = [obj.id for obj in session.deleted if isinstance(obj, Car) and obj.id is not None]
+    if not car_ids:
+        return
+    listed_on = session.scalars(select(SimilarCar.car_id).where(SimilarCar.similar_car_id.in_(car_ids))).all()
+    session.execute(delete(SimilarCar).where(or_(SimilarCar.car_id.in_(car_ids), SimilarCar.similar_car_id.in_(car_ids))))
+    session.info.setdefault('similar_cars_stale', set()).update(set(listed_on) - set(car_ids))
+
+
+@event.listens_for(Session, 'after_flush')
+def _refresh_changed_cars(session, flush_context):
+    """
+    Keeps the similarity lists in step with car creates, edits, approvals,
+    visibility toggles and deletes, and with price changes on auctions and
+    rental listings, in the same transaction.
+    """
+    changed_ids = set()
+    for obj in session.new:
+        if isinstance(obj, Car):
+            changed_ids.add(obj.id)
+        elif isinstance(obj, (Auction, RentalListing)):
+            changed_ids.add(obj.car_id)
+    for obj in session.dirty:
+        if isinstance(obj, Car) and _similarity_changed(obj):
+            changed_ids.add(obj.id)
+        elif isinstance(obj, Auction) and _price_changed(obj, 'start_price'):
+            changed_ids.add(obj.car_id)
+        elif isinstance(obj, RentalListing) and _price_changed(obj, 'price_per_day'):
+            changed_ids.add(obj.car_id)
+
+    changed_ids.discard(None)
+    stale_ids = session.info.pop('similar_cars_stale', set())
+    if changed_ids or stale_ids:
+        refresh_similar_cars(session, changed_ids, stale_ids)
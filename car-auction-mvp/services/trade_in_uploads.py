@@ -0,0 +1,187 @@
+import binascii
+import os
+import secrets
+from datetime import datetime, timedelta
+from flask import current_app
+from PIL import Image, UnidentifiedImageError
+from sqlalchemy import func, select
+from werkzeug.exceptions import ClientDisconnected
+from extensions import db
+from models.trade_in import TradeInPhoto, TradeInUpload
+from services.file_storage import CHUNK_SIZE, Base64DecodingStream
+from services.images import save_image
+
+TRADE_IN_MAX_PHOTOS = 10
+MAX_PHOTO_BYTES = 15 * 1024 * 1024
+# Largest request body one chunk may arrive in, checked against Content-Length before anything is read.
+MAX_CHUNK_BYTES = 4 * 1024 * 1024
+# Uploads not claimed by a submission within this time are deleted by `flask gc-uploads`.
+UPLOAD_EXPIRY = timedelta(hours=24)
+# Unexpired uploads (in progress, or complete but not yet submitted) a user may hold at once.
+MAX_OPEN_UPLOADS = TRADE_IN_MAX_PHOTOS
+# Leading bytes of the image types accepted (WebP is checked separately), and the extension each is stored with.
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+)
+IMAGE_TYPE_EXTENSIONS = {'image/jpeg': '.jpg', 'image/png': '.png', 'image/gif': '.gif', 'image/webp': '.webp'}
+SNIFF_BYTES = 12
+
+
+class UploadError(ValueError):
+    """A rejected upload request; status is the HTTP status to answer with."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def sniff_image_type(head):
+    """The content type of an image from its first SNIFF_BYTES bytes, or None if it isn't one we accept."""
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    for signature, content_type in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return content_type
+    return None
+
+
+def _part_path(upload):
+    return os.path.join(current_app.instance_path, 'trade_in_uploads', f'{upload.token}.part')
+
+
+def _discard(upload):
+    db.session.delete(upload)
+    if os.path.exists(_part_path(upload)):
+        os.remove(_part_path(upload))
+
+
+def start_upload(user_id, size):
+    """
+    Opens an upload of size bytes for a trade-in photo. Raises UploadError if
+    size is out of bounds, or (429) if the user already holds MAX_OPEN_UPLOADS
+    unexpired uploads.
+    """
+    if not isinstance(size, int) or isinstance(size, bool) or size <= 0:
+        raise UploadError('size must be a positive number of bytes.')
+    if size > MAX_PHOTO_BYTES:
+        raise UploadError(f'Photos can be at most {MAX_PHOTO_BYTES // (1024 * 1024)} MB.', 413)
+    open_uploads = db.session.scalar(
+        select(func.count(TradeInUpload.id))
+        .where(TradeInUpload.user_id == user_id, TradeInUpload.created_at >= datetime.utcnow() - UPLOAD_EXPIRY)
+    )
+    if open_uploads >= MAX_OPEN_UPLOADS:
+        raise UploadError(
+            f'You already have {open_uploads} photo uploads that are not submitted; '
+            'submit your trade-in request or wait for them to expire.', 429
+        )
+
+    upload = TradeInUpload(token=secrets.token_urlsafe(24), user_id=user_id, size=size, received=0)
+    os.makedirs(os.path.dirname(_part_path(upload)), exist_ok=True)
+    open(_part_path(upload), 'wb').close()
+    db.session.add(upload)
+    return upload
+
+
+def append_chunk(upload, stream, offset, base64_encoded=False):
+    """
+    Writes the chunk read from stream at byte offset of the upload, decoding
+    base64 on the fly if asked to; offsets always count decoded bytes. The
+    chunk is copied CHUNK_SIZE bytes at a time, and the image type is checked
+    from the first bytes that arrive. Once every byte is in, the photo is
+    stored and image_url set.
+
+    Progress is kept even if the chunk is cut short, so the client can resume
+    from upload.received. Raises UploadError for a chunk that doesn't fit;
+    an upload that turns out not to be an image is discarded.
+    """
+    if upload.is_complete:
+        raise UploadError('This upload is already complete.', 409)
+    if offset != upload.received:
+        raise UploadError(f'Expected the chunk at offset {upload.received}.', 409)
+
+    source = Base64DecodingStream(stream) if base64_encoded else stream
+    try:
+        with open(_part_path(upload), 'r+b') as part:
+            part.seek(offset)
+            part.truncate() # Bytes past the recorded offset belong to a chunk that didn't finish
+            try:
+                for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+                    if part.tell() + len(chunk) > upload.size:
+                        raise UploadError(f'The upload is larger than the {upload.size} bytes declared.', 413)
+                    part.write(chunk)
+                    if upload.content_type is None and part.tell() >= min(SNIFF_BYTES, upload.size):
+                        part.flush()
+                        _check_image_type(upload)
+            except binascii.Error:
+                raise UploadError('The chunk is not valid base64.')
+            except ClientDisconnected:
+                raise UploadError('The chunk was cut short; resume from the returned offset.')
+            finally:
+                upload.received = part.tell()
+    except UploadError as e:
+        if e.status == 415:
+            _discard(upload)
+        raise
+
+    if upload.received == upload.size:
+        _finish(upload)
+
+
+def _check_image_type(upload):
+    with open(_part_path(upload), 'rb') as part:
+        upload.content_type = sniff_image_type(part.read(SNIFF_BYTES))
+    if upload.content_type is None:
+        raise UploadError('Only JPEG, PNG, WebP and GIF photos are accepted.', 415)
+
+
+def _finish(upload):
+    """Stores the completed photo content-addressed and queues its variants."""
+    path = _part_path(upload)
+    try:
+        with Image.open(path) as image:
+            image.verify()
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError):
+        _discard(upload)
+        raise UploadError('The photo could not be read as an image.', 415)
+
+    with open(path, 'rb') as part:
+        upload.image_url = save_image(part, IMAGE_TYPE_EXTENSIONS[upload.content_type])
+    os.remove(path)
+
+
+def attach_uploads(trade_in_request, user_id, tokens):
+    """
+    Adds the user's completed uploads named by tokens to a trade-in request as
+    its photos and removes the uploads. Raises UploadError, attaching nothing,
+    if a token is unknown, someone else's, or still uploading.
+    """
+    if not isinstance(tokens, list) or not all(isinstance(token, str) for token in tokens):
+        raise UploadError('photos must be a list of upload tokens.')
+    if len(tokens) > TRADE_IN_MAX_PHOTOS:
+        raise UploadError(f'At most {TRADE_IN_MAX_PHOTOS} photos can be submitted.')
+
+    uploads = db.session.scalars(
+        select(TradeInUpload).where(TradeInUpload.token.in_(tokens), TradeInUpload.user_id == user_id)
+    ).all()
+    uploads_by_token = {upload.token: upload for upload in uploads}
+    if any(token not in uploads_by_token or not uploads_by_token[token].is_complete for token in tokens):
+        raise UploadError('Every photo must be fully uploaded before the trade-in is submitted.')
+
+    # The photos are added before the uploads are deleted, so the stored files never lose their last reference.
+    for token in dict.fromkeys(tokens):
+        trade_in_request.photos.append(TradeInPhoto(image_url=uploads_by_token[token].image_url))
+    for upload in uploads:
+        db.session.delete(upload)
+
+
+def expire_uploads(now=None):
+    """Deletes the uploads older than UPLOAD_EXPIRY (releasing their stored files) and their partial data."""
+    cutoff = (now or datetime.utcnow()) - UPLOAD_EXPIRY
+    expired = db.session.scalars(select(TradeInUpload).where(TradeInUpload.created_at < cutoff)).all()
+    for upload in expired:
+        _discard(upload)
+    db.session.commit()
+    return len(expired)
@@ -0,0 +1,114 @@
+from collections import Counter, defaultdict
+from sqlalchemy import case, event, select, update
+from sqlalchemy.orm import Session
+from extensions import db
+from models.chat_message import ChatMessage
+from models.conversation import Conversation
+from models.notification import Notification
+from models.user import User
+
+
+def get_unread_counts(user_id):
+    """Returns (unread_notifications, unread_messages) for a user from their counter columns."""
+    counts = db.session.execute(
+        select(User.unread_notification_count, User.unread_message_count).where(User.id == user_id)
+    ).one_or_none()
+    return tuple(counts) if counts else (0, 0)
+
+
+def get_unread_notification_counts(user_ids):
+    """Returns {user_id: unread notification count} for several users with one primary-key lookup."""
+    return dict(db.session.execute(
+        select(User.id, User.unread_notification_count).where(User.id.in_(user_ids))
+    ).all())
+
+
+def _message_recipient_id(session, message):
+    """The participant of the message's conversation who did not send it."""
+    conversation = message.conversation
+    if conversation is None and message.conversation_id is not None:
+        conversation = session.get(Conversation, message.conversation_id)
+    if conversation is None:
+        return None
+    return conversation.dealer_id if message.sender_id == conversation.buyer_id else conversation.buyer_id
+
+
+def mark_notifications_read(user_id, notification_ids=None):
+    """
+    Marks the user's unread notifications (or only those in notification_ids)
+    read and lowers their counter by the rows the UPDATE actually changed, so
+    two requests marking the same notification read count it once. Returns
+    how many were marked.
+    """
+    statement = update(Notification).where(Notification.user_id == user_id, Notification.is_read == False)
+    if notification_ids is not None:
+        statement = statement.where(Notification.id.in_(notification_ids))
+    marked = db.session.execute(statement.values(is_read=True)).rowcount
+    adjust_unread_counters(db.session, 'unread_notification_count', {user_id: -marked})
+    return marked
+
+
+def mark_messages_read(conversation, reader_id):
+    """
+    Marks the messages the other participant sent reader_id in a conversation
+    read and lowers reader_id's counter by the rows actually changed. Returns
+    how many were marked.
+    """
+    sender_id = conversation.dealer_id if reader_id == conversation.buyer_id else conversation.buyer_id
+    marked = db.session.execute(
+        update(ChatMessage)
+        .where(ChatMessage.conversation_id == conversation.id, ChatMessage.is_read == False, ChatMessage.sender_id == sender_id)
+        .values(is_read=True)
+    ).rowcount
+    adjust_unread_counters(db.session, 'unread_message_count', {reader_id: -marked})
+    return marked
+
+
+@event.listens_for(Session, 'before_flush')
+def _maintain_unread_counters(session, flush_context, instances):
+    """
+    Keeps User.unread_notification_count/unread_message_count in step with every
+    Notification and ChatMessage insert and delete, in the same transaction.
+    Changes are summed per user, so a flush issues a handful of UPDATEs however
+    many rows it inserts. Rows are marked read with mark_notifications_read()
+    and mark_messages_read() rather than through the ORM, which can't tell
+    whether another request marked the same row read first.
+    """
+    notification_deltas = Counter()
+    message_deltas = Counter()
+
+    for obj in session.new:
+        if isinstance(obj, Notification) and not obj.is_read:
+            notification_deltas[obj.user_id] += 1
+        elif isinstance(obj, ChatMessage) and not obj.is_read:
+            message_deltas[_message_recipient_id(session, obj)] += 1
+
+    for obj in session.deleted:
+        if isinstance(obj, Notification) and not obj.is_read:
+            notification_deltas[obj.user_id] -= 1
+        elif isinstance(obj, ChatMessage) and not obj.is_read:
+            message_deltas[_message_recipient_id(session, obj)] -= 1
+
+    adjust_unread_counters(session, 'unread_notification_count', notification_deltas)
+    adjust_unread_counters(session, 'unread_message_count', message_deltas)
+
+
+def adjust_unread_counters(session, column, deltas):
+    """
+    Applies {user_id: delta} to one of the counter columns, never taking it
+    below zero. Users sharing the same delta are updated together, so a
+    fan-out to many users is one UPDATE.
+    """
+    users_by_delta = defaultdict(list)
+    for user_id, delta in deltas.items():
+        if user_id is not None and delta:
+            users_by_delta[delta].append(user_id)
+
+    for delta, user_ids in users_by_delta.items():
+        counter = getattr(User, column)
+        session.execute(
+            update(User)
+            .where(User.id.in_(user_ids))
+            .values({column: case((counter + delta < 0, 0), else_=counter + delta)})
+            .execution_options(synchronize_session=False)
+        )